@@ -0,0 +1,78 @@
+"""
+Process-local write buffer for tracked analytics events.
+
+Durability trade-off: accepted events only live in this worker's memory until the
+buffer is flushed with a single bulk_create. That happens when it holds
+ANALYTICS_BUFFER_SIZE events, when its oldest event is ANALYTICS_BUFFER_MAX_AGE
+seconds old (a timer thread fires then, so a worker that goes quiet still
+writes), or when the process exits cleanly. A crashed or killed worker loses at most one unflushed buffer, which is
+fine for page views and funnels but not for anything that must be audited.
+"""
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections
+
+from .models import AnalyticsEvent
+
+logger = logging.getLogger(__name__)
+
+
+class EventBuffer:
+    def __init__(self, max_size, max_age):
+        self.max_size = max_size
+        self.max_age = max_age
+        self._events = []
+        self._oldest = None
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def add(self, events):
+        if not events:
+            # A batch with nothing valid in it must not start the age timer
+            return
+        with self._lock:
+            if not self._events:
+                self._oldest = time.monotonic()
+                # Started on the first event rather than at import, so it runs in the forked worker
+                self._timer = threading.Timer(self.max_age, self._flush_on_timer)
+                self._timer.daemon = True
+                self._timer.start()
+            self._events.extend(events)
+            due = (
+                len(self._events) >= self.max_size
+                or time.monotonic() - self._oldest >= self.max_age
+            )
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            events, self._events = self._events, []
+            self._oldest = None
+            timer, self._timer = self._timer, None
+        if timer is not None:
+            timer.cancel()
+        if not events:
+            return 0
+        
+        try:
+            AnalyticsEvent.objects.bulk_create(events, batch_size=max(self.max_size, 1))
+        except Exception:
+            logger.exception('Dropped %d buffered analytics events', len(events))
+            return 0
+        return len(events)
+
+    def _flush_on_timer(self):
+        try:
+            self.flush()
+        finally:
+            # The timer thread opened its own database connection; don't leave it behind
+            connections.close_all()
+
+
+buffer = EventBuffer(settings.ANALYTICS_BUFFER_SIZE, settings.ANALYTICS_BUFFER_MAX_AGE)
+atexit.register(buffer.flush)
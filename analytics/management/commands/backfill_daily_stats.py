@@ -0,0 +1,14 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from analytics import rollups
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the DailyStat dashboard rollups from payments, reservations, users and events'
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        written = rollups.rebuild()
+        self.stdout.write(f'Wrote {written} daily rollup rows in {time.monotonic() - started:.2f}s')
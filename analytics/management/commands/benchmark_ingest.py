@@ -0,0 +1,95 @@
+import time
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from analytics import views
+from analytics.buffer import EventBuffer
+from analytics.models import AnalyticsEvent
+
+
+class InsertCounter:
+    """Database execute wrapper counting INSERT statements."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        if sql.lstrip()[:6].upper() == 'INSERT':
+            self.count += 1
+        return execute(sql, params, many, context)
+
+
+class Command(BaseCommand):
+    help = (
+        'Post N analytics events inside a transaction that is rolled back: once as one track_event '
+        'request per event, once as track_events batches through the write buffer. Reports '
+        'events/s and INSERT statements for each path.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--events', type=int, default=10_000,
+                            help='Events to post down each path')
+        parser.add_argument('--batch-size', type=int, default=100,
+                            help=f'Events per track_events request (at most {views.MAX_TRACKED_BATCH})')
+        parser.add_argument('--buffer-size', type=int, default=500,
+                            help='Events the buffer holds before one bulk_create')
+
+    def handle(self, *args, **options):
+        total = options['events']
+        if not 0 < options['batch_size'] <= views.MAX_TRACKED_BATCH:
+            raise CommandError(f'--batch-size must be between 1 and {views.MAX_TRACKED_BATCH}')
+
+        with transaction.atomic():
+            self.user = get_user_model().objects.create_user(
+                email=f'ingest-benchmark-{time.time_ns()}@example.com', password=None, full_name='Ingest benchmark'
+            )
+            before = AnalyticsEvent.objects.count()
+            single = self.post_one_by_one(total)
+            batched = self.post_in_batches(total, options['batch_size'], options['buffer_size'])
+            written = AnalyticsEvent.objects.count() - before
+            # Nothing generated here outlives the benchmark
+            transaction.set_rollback(True)
+
+        if written != 2 * total:
+            raise CommandError(f'Expected {2 * total} events written, found {written}')
+        for label, (elapsed, inserts) in (('track_event', single), ('track_events', batched)):
+            self.stdout.write(
+                f'{label}: {total} events in {elapsed:.2f}s, {total / elapsed:.0f} events/s, {inserts} INSERTs'
+            )
+
+    def post(self, action, body):
+        request = APIRequestFactory().post(f'/api/analytics/analytics/events/{action}/', body, format='json')
+        force_authenticate(request, self.user)
+        response = views.AnalyticsEventViewSet.as_view({'post': action})(request)
+        if response.status_code not in (201, 202):
+            raise CommandError(f'{action} answered {response.status_code}: {response.data}')
+        return response
+
+    def post_one_by_one(self, total):
+        inserts = InsertCounter()
+        with connection.execute_wrapper(inserts):
+            started = time.perf_counter()
+            for index in range(total):
+                self.post('track_event', {'event_type': 'page_view', 'payload': {'index': index}})
+            elapsed = time.perf_counter() - started
+        return elapsed, inserts.count
+
+    def post_in_batches(self, total, batch_size, buffer_size):
+        # A private buffer whose timer cannot fire mid-run and write from another connection,
+        # outside the transaction that is rolled back
+        buffer = EventBuffer(buffer_size, max_age=3600)
+        inserts = InsertCounter()
+        with mock.patch.object(views, 'event_buffer', buffer), connection.execute_wrapper(inserts):
+            started = time.perf_counter()
+            for offset in range(0, total, batch_size):
+                self.post('track_events', [
+                    {'event_type': 'page_view', 'payload': {'index': index}}
+                    for index in range(offset, min(offset + batch_size, total))
+                ])
+            buffer.flush()
+            elapsed = time.perf_counter() - started
+        return elapsed, inserts.count
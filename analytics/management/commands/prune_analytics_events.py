@@ -0,0 +1,65 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Min
+from django.utils import timezone
+
+from analytics import partitions, rollups
+from analytics.models import AnalyticsEvent
+
+
+class Command(BaseCommand):
+    help = (
+        'Roll up analytics events older than the retention window into DailyStat and drop them. '
+        'On partitioned PostgreSQL storage whole monthly partitions are dropped; '
+        'elsewhere rows are deleted in batches.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep-months', type=int, default=settings.ANALYTICS_RETENTION_MONTHS,
+                            help='Whole months of events to keep, not counting the current one')
+        parser.add_argument('--ahead', type=int, default=3,
+                            help='Future monthly partitions to keep created')
+        parser.add_argument('--convert', action='store_true',
+                            help='First convert the plain table to monthly partitions (PostgreSQL only)')
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Rows deleted per statement on unpartitioned storage')
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        cutoff = partitions.add_months(partitions.month_floor(now), -options['keep_months'])
+
+        if options['convert']:
+            if not partitions.is_supported():
+                raise CommandError('Partitioning needs PostgreSQL')
+            if not partitions.is_partitioned():
+                partitions.convert(now, options['ahead'])
+                self.stdout.write('Converted analytics events to monthly partitions')
+
+        partitioned = partitions.is_partitioned()
+        if partitioned:
+            partitions.ensure_partitions(now, options['ahead'])
+
+        first = AnalyticsEvent.objects.filter(timestamp__lt=cutoff).aggregate(first=Min('timestamp'))['first']
+        if first is None:
+            self.stdout.write(f'Nothing older than {cutoff:%Y-%m-%d} to prune')
+            return
+
+        rolled = rollups.roll_up_analytics(partitions.month_floor(first), cutoff)
+        self.stdout.write(f'Rolled up {rolled} daily rows for events before {cutoff:%Y-%m-%d}')
+
+        if partitioned:
+            dropped = partitions.drop_partitions_before(cutoff)
+            months = ', '.join(f'{month:%Y-%m}' for month in dropped) or 'none'
+            self.stdout.write(f'Dropped partitions: {months}')
+            return
+
+        deleted = 0
+        while True:
+            batch = list(
+                AnalyticsEvent.objects.filter(timestamp__lt=cutoff).values_list('pk', flat=True)[:options['batch_size']]
+            )
+            if not batch:
+                break
+            AnalyticsEvent.objects.filter(pk__in=batch).delete()
+            deleted += len(batch)
+        self.stdout.write(f'Deleted {deleted} rows')
@@ -0,0 +1,84 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+from collections import Counter
+
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Runs in a fresh interpreter: what a cold gunicorn worker does before its first request
+BOOT = '''
+import json, time
+t0 = time.perf_counter()
+import django
+django.setup(set_prefix=False)
+t1 = time.perf_counter()
+from django.urls import get_resolver
+get_resolver().url_patterns
+t2 = time.perf_counter()
+print(json.dumps({"apps": (t1 - t0) * 1000, "urls": (t2 - t1) * 1000}))
+'''
+
+
+def parse_importtime(stderr):
+    """Map module name -> (self_us, cumulative_us) from `python -X importtime` output."""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or line.rstrip().endswith('imported package'):
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        modules[name.strip()] = (int(self_us), int(cumulative_us))
+    return modules
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure cold worker boot (django.setup() plus URLconf loading) in fresh interpreters '
+        'under `python -X importtime`, list the packages with the most import time, '
+        'and fail if the median boot exceeds STARTUP_BUDGET_MS.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5,
+                            help='Fresh interpreters to boot; the median is compared to the budget')
+        parser.add_argument('--budget', type=int, default=settings.STARTUP_BUDGET_MS,
+                            help='Milliseconds allowed for a cold boot')
+        parser.add_argument('--top', type=int, default=15,
+                            help='Packages with the most import time to list')
+
+    def handle(self, *args, **options):
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': settings.SETTINGS_MODULE}
+        boots, modules = [], {}
+        for _ in range(options['runs']):
+            result = subprocess.run(
+                [sys.executable, '-X', 'importtime', '-c', BOOT],
+                capture_output=True, text=True, env=env, cwd=settings.BASE_DIR,
+            )
+            if result.returncode != 0:
+                raise CommandError(f'Boot failed:\n{result.stderr[-2000:]}')
+            boots.append(json.loads(result.stdout.strip().splitlines()[-1]))
+            modules = parse_importtime(result.stderr)
+
+        app_loading = statistics.median(boot['apps'] for boot in boots)
+        urls = statistics.median(boot['urls'] for boot in boots)
+        total = statistics.median(boot['apps'] + boot['urls'] for boot in boots)
+        self.stdout.write(f'App loading {app_loading:.0f}ms, URLconf {urls:.0f}ms, total {total:.0f}ms '
+                          f'(median of {len(boots)}; budget {options["budget"]}ms)')
+
+        # 1. Where the import time goes, by top-level package (first-party ones marked)
+        first_party = {app.name.split('.')[0] for app in apps.get_app_configs()
+                       if app.path.startswith(str(settings.BASE_DIR))} | {'config'}
+        by_package = Counter()
+        for name, (self_us, _) in modules.items():
+            by_package[name.split('.')[0]] += self_us
+        for package, self_us in by_package.most_common(options['top']):
+            marker = '*' if package in first_party else ' '
+            self.stdout.write(f'{marker} {self_us / 1000:8.1f}ms  {package}')
+
+        # 2. The budget itself
+        if total > options['budget']:
+            raise CommandError(f'Cold boot took {total:.0f}ms, over the {options["budget"]}ms budget')
+        self.stdout.write(self.style.SUCCESS(f'Within budget ({options["budget"] - total:.0f}ms to spare)'))
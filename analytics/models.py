@@ -1,4 +1,10 @@
 from django.db import models
+from django.utils import timezone
+
+class AnalyticsEventQuerySet(models.QuerySet):
+    def between(self, start, end):
+        # Bounding on timestamp lets partitioned storage skip months outside [start, end)
+        return self.filter(timestamp__gte=start, timestamp__lt=end)
 
 class AnalyticsEvent(models.Model):
     EVENT_TYPES = [
@@ -12,14 +18,20 @@ class AnalyticsEvent(models.Model):
     user = models.ForeignKey('users.User', on_delete=models.SET_NULL, null=True, blank=True)
     reservation = models.ForeignKey('reservations.Reservation', on_delete=models.SET_NULL, null=True, blank=True)
     payload = models.JSONField(default=dict)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Set when the event is tracked, not when a buffered batch is written
+    timestamp = models.DateTimeField(default=timezone.now, editable=False)
     ip_address = models.GenericIPAddressField(null=True, blank=True)
     user_agent = models.TextField(blank=True)
     
+    # On PostgreSQL the table can be partitioned by month, see analytics/partitions.py
+    objects = AnalyticsEventQuerySet.as_manager()
+    
     class Meta:
         indexes = [
             models.Index(fields=['event_type', 'timestamp']),
             models.Index(fields=['user', 'timestamp']),
+            # Keyset pagination seeks on (timestamp, id)
+            models.Index(fields=['timestamp', 'id']),
         ]
     
     def __str__(self):
@@ -49,6 +61,34 @@ class NotificationLog(models.Model):
     subject = models.CharField(max_length=255, blank=True)
     content = models.TextField(blank=True)
     
+    class Meta:
+        indexes = [
+            # Keyset pagination seeks on (sent_at, id)
+            models.Index(fields=['sent_at', 'id']),
+        ]
+    
     def __str__(self):
         email = self.recipient_email or (self.user.email if self.user else 'Unknown')
-        return f"{self.type} to {email} - {self.sent_at}"
\ No newline at end of file
+        return f"{self.type} to {email} - {self.sent_at}"
+
+class DailyStat(models.Model):
+    METRIC_CHOICES = [
+        ('payments', 'Completed Payments'), # key: payment method
+        ('reservations', 'Reservations'), # key: current status, dated by reserved_at
+        ('users', 'New Users'),
+        ('events', 'New Events'),
+        ('analytics', 'Analytics Events'), # key: event type, only written for pruned months
+    ]
+    
+    date = models.DateField()
+    metric = models.CharField(max_length=20, choices=METRIC_CHOICES)
+    key = models.CharField(max_length=50, blank=True)
+    total_count = models.IntegerField(default=0)
+    total_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    
+    class Meta:
+        # Leading metric column also serves the dashboard's per-metric range scans
+        unique_together = ('metric', 'date', 'key')
+    
+    def __str__(self):
+        return f"{self.metric}:{self.key} {self.date} - {self.total_count}"
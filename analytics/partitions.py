@@ -0,0 +1,189 @@
+"""
+Monthly range partitioning of AnalyticsEvent on PostgreSQL.
+
+The parent table keeps Django's table name, so the ORM reads and writes it as
+usual. Each calendar month (UTC) lives in its own child table
+(analytics_analyticsevent_y2025m01, ...). Queries bounded on `timestamp` (see
+AnalyticsEventQuerySet.between) only scan the months they can match, and retention
+drops whole months instead of deleting rows. A DEFAULT partition catches rows
+outside every month created so far (the retention job did not run, or a clock
+is off), so inserts never fail; creating that month's partition later moves them
+out of it. Other databases keep a single table and callers fall back to batched
+deletes.
+"""
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import connection, transaction
+
+from .models import AnalyticsEvent
+
+TABLE = AnalyticsEvent._meta.db_table
+SEQUENCE = f'{TABLE}_partitioned_id_seq'
+DEFAULT = f'{TABLE}_default'
+
+
+def month_floor(value):
+    value = value.astimezone(dt_timezone.utc)
+    return datetime(value.year, value.month, 1, tzinfo=dt_timezone.utc)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=dt_timezone.utc)
+
+
+def partition_name(month):
+    return f'{TABLE}_y{month.year}m{month.month:02d}'
+
+
+def is_supported():
+    return connection.vendor == 'postgresql'
+
+
+def is_partitioned():
+    if not is_supported():
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid '
+            'WHERE c.relname = %s', [TABLE]
+        )
+        return cursor.fetchone() is not None
+
+
+def partition_months():
+    """Months that currently have a partition, oldest first."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT child.relname FROM pg_inherits '
+            'JOIN pg_class parent ON parent.oid = pg_inherits.inhparent '
+            'JOIN pg_class child ON child.oid = pg_inherits.inhrelid '
+            'WHERE parent.relname = %s', [TABLE]
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    
+    prefix = f'{TABLE}_y'
+    months = []
+    for name in names:
+        if name.startswith(prefix):
+            year, month = name[len(prefix):].split('m')
+            months.append(datetime(int(year), int(month), 1, tzinfo=dt_timezone.utc))
+    return sorted(months)
+
+
+def create_default_partition():
+    qn = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(f'CREATE TABLE IF NOT EXISTS {qn(DEFAULT)} PARTITION OF {qn(TABLE)} DEFAULT')
+
+
+def create_partition(month):
+    """
+    Create the month's partition. Rows the DEFAULT partition caught for that month
+    are moved into it first, since PostgreSQL refuses a partition that would leave
+    matching rows behind in the default one.
+    """
+    qn = connection.ops.quote_name
+    name = partition_name(month)
+    bounds = f"FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+    
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute('SELECT to_regclass(%s)', [DEFAULT])
+        if cursor.fetchone()[0] is None:
+            cursor.execute(f'CREATE TABLE IF NOT EXISTS {qn(name)} PARTITION OF {qn(TABLE)} FOR VALUES {bounds}')
+            return
+        
+        # 1. Hold off inserts into the default partition, then check nobody created the month meanwhile
+        cursor.execute(f'LOCK TABLE {qn(DEFAULT)} IN ACCESS EXCLUSIVE MODE')
+        cursor.execute('SELECT to_regclass(%s)', [name])
+        if cursor.fetchone()[0] is not None:
+            return
+        
+        # 2. Build the month as a plain table holding the rows the default partition caught
+        cursor.execute(f'CREATE TABLE {qn(name)} (LIKE {qn(TABLE)} INCLUDING DEFAULTS)')
+        cursor.execute(
+            f'WITH moved AS (DELETE FROM {qn(DEFAULT)} '
+            f'WHERE "timestamp" >= %s AND "timestamp" < %s RETURNING *) '
+            f'INSERT INTO {qn(name)} SELECT * FROM moved',
+            [month, add_months(month, 1)]
+        )
+        
+        # 3. Attaching creates the parent's indexes and keys on it
+        cursor.execute(f'ALTER TABLE {qn(TABLE)} ATTACH PARTITION {qn(name)} FOR VALUES {bounds}')
+
+
+def ensure_partitions(now, ahead):
+    """Create the DEFAULT partition, the current month's and `ahead` months after it."""
+    create_default_partition()
+    current = month_floor(now)
+    for offset in range(ahead + 1):
+        create_partition(add_months(current, offset))
+
+
+def drop_partitions_before(cutoff):
+    """
+    Drop every partition whose whole month ends on or before `cutoff`, and delete the
+    DEFAULT partition's rows before it. Returns the months dropped.
+    """
+    qn = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT to_regclass(%s)', [DEFAULT])
+        if cursor.fetchone()[0] is not None:
+            cursor.execute(f'DELETE FROM {qn(DEFAULT)} WHERE "timestamp" < %s', [cutoff])
+    
+    dropped = []
+    for month in partition_months():
+        if add_months(month, 1) > cutoff:
+            continue
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE {qn(partition_name(month))}')
+        dropped.append(month)
+    return dropped
+
+
+def convert(now, ahead):
+    """
+    One-off conversion of the plain table into a partitioned parent.
+
+    Rows are copied into monthly partitions inside one transaction that holds an
+    exclusive lock on the table, so run it in a maintenance window.
+    """
+    qn = connection.ops.quote_name
+    legacy = f'{TABLE}_unpartitioned'
+    
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'LOCK TABLE {qn(TABLE)} IN ACCESS EXCLUSIVE MODE')
+        cursor.execute(f'SELECT MIN("timestamp"), MAX(id) FROM {qn(TABLE)}')
+        first, max_id = cursor.fetchone()
+        
+        cursor.execute(f'ALTER TABLE {qn(TABLE)} RENAME TO {qn(legacy)}')
+        cursor.execute(
+            f'CREATE TABLE {qn(TABLE)} (LIKE {qn(legacy)} INCLUDING DEFAULTS) '
+            f'PARTITION BY RANGE ("timestamp")'
+        )
+        # Identity columns need PostgreSQL 17 on partitioned tables; a plain sequence works everywhere
+        cursor.execute(f'CREATE SEQUENCE {qn(SEQUENCE)} START WITH {(max_id or 0) + 1}')
+        cursor.execute(f"ALTER TABLE {qn(TABLE)} ALTER COLUMN id SET DEFAULT nextval('{SEQUENCE}')")
+        cursor.execute(f'ALTER SEQUENCE {qn(SEQUENCE)} OWNED BY {qn(TABLE)}.id')
+        # Unique constraints on a partitioned table must include the partition key
+        cursor.execute(f'ALTER TABLE {qn(TABLE)} ADD PRIMARY KEY (id, "timestamp")')
+        
+        month = month_floor(first or now)
+        last = add_months(month_floor(now), ahead)
+        while month <= last:
+            create_partition(month)
+            month = add_months(month, 1)
+        # Rows dated past the last month created (clock skew, bad client timestamps) land here
+        create_default_partition()
+        
+        cursor.execute(f'INSERT INTO {qn(TABLE)} SELECT * FROM {qn(legacy)}')
+        cursor.execute(f'DROP TABLE {qn(legacy)}')
+        
+        # Recreate the model's indexes and foreign keys on the new parent
+        with connection.schema_editor(atomic=False) as editor:
+            for field in AnalyticsEvent._meta.concrete_fields:
+                if field.remote_field and field.db_constraint:
+                    editor.execute(editor._create_index_sql(AnalyticsEvent, fields=[field]))
+                    editor.execute(editor._create_fk_sql(AnalyticsEvent, field, '_fk_%(to_table)s_%(to_column)s'))
+            for index in AnalyticsEvent._meta.indexes:
+                editor.add_index(AnalyticsEvent, index)
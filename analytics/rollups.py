@@ -0,0 +1,90 @@
+"""
+Incremental maintenance of the DailyStat rollups behind the admin dashboard.
+
+Signals apply +/- deltas, for single-row saves and for set-based status UPDATEs
+(expiry sweeps, ledger recalculation, check-ins) alike, which report each row's old
+and new status. Deltas run after the change they describe commits, outside its
+transaction, so a rolled back change never reaches the rollups and bookings never
+wait on them. Only rebuild() re-counts, from scratch.
+"""
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from events.models import Event
+from payments.models import Payment
+from reservations.models import Reservation
+from .models import AnalyticsEvent, DailyStat
+
+
+def day_of(value):
+    return timezone.localdate(value) if timezone.is_aware(value) else value.date()
+
+
+def bump(date, metric, key='', count=0, amount=0):
+    if not count and not amount:
+        return
+    # Applied once the caller commits: every booking of the day shares this row, and locking it
+    # inside the caller's transaction would queue them all behind each other
+    transaction.on_commit(lambda: apply_delta(date, metric, key, count, amount), robust=True)
+
+
+def apply_delta(date, metric, key, count, amount):
+    stat, _ = DailyStat.objects.get_or_create(date=date, metric=metric, key=key or '')
+    DailyStat.objects.filter(pk=stat.pk).update(
+        total_count=F('total_count') + count,
+        total_amount=F('total_amount') + amount,
+    )
+
+
+def rebuild():
+    """Recompute every rollup from the source tables. Returns the number of rows written."""
+    User = get_user_model()
+    sources = [
+        ('payments', Payment.objects.filter(status='completed').annotate(
+            date=TruncDate(Coalesce('paid_at', 'created_at')), key=F('payment_method'))),
+        ('reservations', Reservation.objects.annotate(date=TruncDate('reserved_at'), key=F('status'))),
+        ('users', User.objects.annotate(date=TruncDate('date_joined'))),
+        ('events', Event.objects.annotate(date=TruncDate('created_at'))),
+    ]
+    
+    rows = []
+    for metric, queryset in sources:
+        group_by = ('date', 'key') if metric in ('payments', 'reservations') else ('date',)
+        aggregates = {'count': Count('id')}
+        if metric == 'payments':
+            aggregates['amount'] = Sum('amount')
+        for row in queryset.values(*group_by).annotate(**aggregates).order_by():
+            rows.append(DailyStat(
+                date=row['date'],
+                metric=metric,
+                key=row.get('key', ''),
+                total_count=row['count'],
+                total_amount=row.get('amount') or 0,
+            ))
+    
+    with transaction.atomic():
+        # Analytics rollups summarise pruned months whose source rows no longer exist
+        DailyStat.objects.exclude(metric='analytics').delete()
+        DailyStat.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def roll_up_analytics(start, end):
+    """Store per-day, per-type counts of the analytics events in [start, end) before they are pruned."""
+    rows = AnalyticsEvent.objects.between(start, end).annotate(
+        date=TruncDate('timestamp')
+    ).values('date', 'event_type').annotate(count=Count('id')).order_by()
+    
+    written = 0
+    with transaction.atomic():
+        for row in rows:
+            DailyStat.objects.update_or_create(
+                date=row['date'], metric='analytics', key=row['event_type'],
+                defaults={'total_count': row['count']},
+            )
+            written += 1
+    return written
@@ -0,0 +1,133 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from events.models import Event
+from payments.models import Payment
+from payments.signals import payments_created
+from reservations.models import Reservation
+from reservations.signals import statuses_changed
+from config import metrics
+from . import rollups
+
+User = get_user_model()
+
+
+def _payment_contribution(state):
+    if not state or state['status'] != 'completed':
+        return None
+    paid_at = state['paid_at'] or state['created_at']
+    return rollups.day_of(paid_at), state['payment_method'], Decimal(str(state['amount']))
+
+
+def _state_of(payment):
+    return {
+        'status': payment.status,
+        'amount': payment.amount,
+        'payment_method': payment.payment_method,
+        'paid_at': payment.paid_at,
+        'created_at': payment.created_at,
+    }
+
+
+@receiver(post_save, sender=Payment)
+def roll_up_payment(sender, instance, created, **kwargs):
+    before = _payment_contribution(getattr(instance, '_previous_state', None))
+    after = _payment_contribution(_state_of(instance))
+    if before == after:
+        return
+    if before:
+        date, method, amount = before
+        rollups.bump(date, 'payments', method, count=-1, amount=-amount)
+    if after:
+        date, method, amount = after
+        rollups.bump(date, 'payments', method, count=1, amount=amount)
+
+
+@receiver(post_save, sender=Payment)
+def count_completed_payment(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_previous_state', None)
+    if instance.status == 'completed' and (not previous or previous['status'] != 'completed'):
+        method = instance.payment_method
+        transaction.on_commit(lambda: metrics.PAYMENTS_COMPLETED.labels(method).inc())
+
+
+@receiver(post_delete, sender=Payment)
+def roll_up_payment_delete(sender, instance, **kwargs):
+    contribution = _payment_contribution(_state_of(instance))
+    if contribution:
+        date, method, amount = contribution
+        rollups.bump(date, 'payments', method, count=-1, amount=-amount)
+
+
+@receiver(payments_created)
+def roll_up_bulk_payments(sender, payments, **kwargs):
+    # One bump per (day, method) rather than one per payment
+    totals = defaultdict(lambda: [0, Decimal('0')])
+    for payment in payments:
+        contribution = _payment_contribution(_state_of(payment))
+        if contribution:
+            date, method, amount = contribution
+            totals[date, method][0] += 1
+            totals[date, method][1] += amount
+    for (date, method), (count, amount) in totals.items():
+        rollups.bump(date, 'payments', method, count=count, amount=amount)
+        transaction.on_commit(lambda method=method, count=count: metrics.PAYMENTS_COMPLETED.labels(method).inc(count))
+
+
+@receiver(post_save, sender=Reservation)
+def roll_up_reservation(sender, instance, created, **kwargs):
+    date = rollups.day_of(instance.reserved_at)
+    # Set by Reservation.from_db; instances built in memory have nothing to move away from
+    previous = getattr(instance, '_loaded_status', None)
+    if created:
+        rollups.bump(date, 'reservations', instance.status, count=1)
+        transaction.on_commit(metrics.RESERVATIONS_CREATED.inc)
+    elif previous and previous != instance.status:
+        rollups.bump(date, 'reservations', previous, count=-1)
+        rollups.bump(date, 'reservations', instance.status, count=1)
+    instance._loaded_status = instance.status
+
+
+@receiver(post_delete, sender=Reservation)
+def roll_up_reservation_delete(sender, instance, **kwargs):
+    rollups.bump(rollups.day_of(instance.reserved_at), 'reservations', instance.status, count=-1)
+
+
+@receiver(statuses_changed)
+def roll_up_status_changes(sender, changes, **kwargs):
+    # Deltas like single saves: re-counting the day here would also count bookings
+    # whose own delta has not been applied yet
+    totals = defaultdict(int)
+    for reserved_at, previous, current in changes:
+        date = rollups.day_of(reserved_at)
+        totals[date, previous] -= 1
+        totals[date, current] += 1
+    for (date, status), count in totals.items():
+        rollups.bump(date, 'reservations', status, count=count)
+
+
+@receiver(post_save, sender=User)
+def roll_up_user(sender, instance, created, **kwargs):
+    if created:
+        rollups.bump(rollups.day_of(instance.date_joined), 'users', count=1)
+
+
+@receiver(post_delete, sender=User)
+def roll_up_user_delete(sender, instance, **kwargs):
+    rollups.bump(rollups.day_of(instance.date_joined), 'users', count=-1)
+
+
+@receiver(post_save, sender=Event)
+def roll_up_event(sender, instance, created, **kwargs):
+    if created:
+        rollups.bump(rollups.day_of(instance.created_at), 'events', count=1)
+
+
+@receiver(post_delete, sender=Event)
+def roll_up_event_delete(sender, instance, **kwargs):
+    rollups.bump(rollups.day_of(instance.created_at), 'events', count=-1)
@@ -1,3 +1,181 @@
-from django.test import TestCase
+import time
+import unittest
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from reservations.checkin import CheckInService
+from reservations.models import Reservation
+from reservations.tests import make_event
+from . import partitions
+from .buffer import EventBuffer
+from .models import AnalyticsEvent, DailyStat, NotificationLog
+
+
+class QueryBudgetTests(TestCase):
+    """NotificationLogViewSet joins the user and the reservation up front: one query per page or row."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = None
+        for index in range(3):
+            admin, _, ticket_type = make_event(title=f'Gala {index}')
+            cls.admin = cls.admin or admin
+            reservation = Reservation.objects.create(ticket_type=ticket_type, quantity=1, total_amount=100,
+                                                     user=admin, guest_email=f'guest{index}@example.com')
+            cls.log = NotificationLog.objects.create(user=admin, reservation=reservation,
+                                                     type='reservation_confirmation')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_notification_log_list_and_retrieve(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(len(self.client.get('/api/analytics/analytics/notifications/').data['results']), 3)
+        with self.assertNumQueries(2):
+            self.client.get('/api/analytics/analytics/notifications/?page=1')
+        with self.assertNumQueries(1):
+            self.client.get(f'/api/analytics/analytics/notifications/{self.log.pk}/')
+
+
+class RollupTests(TestCase):
+    def test_deltas_wait_for_the_commit(self):
+        _, _, ticket_type = make_event()
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            Reservation.objects.create(ticket_type=ticket_type, quantity=1, total_amount=100,
+                                       guest_email='guest@example.com')
+            # Nothing touches the shared day row while the booking's transaction is open
+            self.assertFalse(DailyStat.objects.filter(metric='reservations').exists())
+
+        self.assertTrue(callbacks)
+        stat = DailyStat.objects.get(date=timezone.localdate(), metric='reservations', key='reserved')
+        self.assertEqual(stat.total_count, 1)
+
+    def counts(self):
+        return dict(DailyStat.objects.filter(date=timezone.localdate(), metric='reservations')
+                    .exclude(total_count=0).values_list('key', 'total_count'))
+
+    def test_set_based_changes_do_not_count_a_pending_booking_twice(self):
+        _, event, ticket_type = make_event()
+        with self.captureOnCommitCallbacks(execute=True):
+            confirmed = Reservation.objects.create(ticket_type=ticket_type, quantity=1, total_amount=100,
+                                                   guest_email='a@example.com', status='confirmed')
+        # Committed a moment ago, its delta not yet applied
+        with self.captureOnCommitCallbacks() as pending:
+            Reservation.objects.create(ticket_type=ticket_type, quantity=1, total_amount=100,
+                                       guest_email='b@example.com')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            CheckInService.check_in(event.pk, [confirmed.reference_code])
+        for callback in pending:
+            callback()
+
+        self.assertEqual(self.counts(), {'attended': 1, 'reserved': 1})
+
+    def test_save_moves_the_loaded_status_without_reading_it_again(self):
+        _, _, ticket_type = make_event()
+        with self.captureOnCommitCallbacks(execute=True):
+            created = Reservation.objects.create(ticket_type=ticket_type, quantity=1, total_amount=100,
+                                                 guest_email='a@example.com')
+        reservation = Reservation.objects.get(pk=created.pk)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            reservation.status = 'cancelled'
+            with self.assertNumQueries(1):
+                reservation.save()
+            reservation.status = 'reserved'
+            reservation.save()
+
+        self.assertEqual(self.counts(), {'reserved': 1})
+
+
+@unittest.skipUnless(connection.vendor == 'postgresql', 'Partitioning needs PostgreSQL')
+class PartitionTests(TestCase):
+    def test_rows_past_the_last_partition_are_kept_and_moved_later(self):
+        now = timezone.now()
+        partitions.convert(now, ahead=0)
+        later = partitions.add_months(partitions.month_floor(now), 5)
+
+        # No partition for that month yet: the DEFAULT partition takes the row instead of failing the insert
+        event = AnalyticsEvent.objects.create(event_type='page_view', timestamp=later)
+        self.assertNotIn(later, partitions.partition_months())
+
+        partitions.ensure_partitions(now, ahead=5)
+
+        self.assertIn(later, partitions.partition_months())
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT id FROM {partitions.partition_name(later)}')
+            self.assertEqual(cursor.fetchall(), [(event.pk,)])
+            cursor.execute(f'SELECT COUNT(*) FROM {partitions.DEFAULT}')
+            self.assertEqual(cursor.fetchone()[0], 0)
+        self.assertEqual(AnalyticsEvent.objects.get(pk=event.pk).timestamp, later)
+
+
+@override_settings(DEBUG=False, METRICS_TOKEN='')
+class MetricsEndpointTests(TestCase):
+    def test_closed_without_a_token_unless_staff(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+
+        admin, _, _ = make_event()
+        self.client.force_login(admin)
+        self.assertEqual(self.client.get('/metrics').status_code, 200)
+
+    @override_settings(METRICS_TOKEN='scrape-secret')
+    def test_token_required_when_set(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 401)
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer scrape-secret')
+        self.assertEqual(response.status_code, 200)
+
+
+class RequestTimingTests(TestCase):
+    def setUp(self):
+        self.admin, _, _ = make_event()
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    @override_settings(SLOW_REQUEST_QUERIES=0)
+    def test_staff_see_serializer_time_apart_from_db_and_render(self):
+        with self.assertLogs('config.middleware', 'WARNING') as logs:
+            response = self.client.get('/api/events/events/')
+
+        names = [part.split(';', 1)[0] for part in response['Server-Timing'].split(', ')]
+        self.assertEqual(names, ['db', 'serialize', 'render', 'total'])
+        self.assertIn('ms serializing', logs.output[0])
+
+
+class EventBufferTests(TestCase):
+    def test_quiet_buffer_flushes_on_its_own(self):
+        buffer = EventBuffer(max_size=100, max_age=0.05)
+        with mock.patch.object(buffer, 'flush', wraps=buffer.flush) as flush, \
+                mock.patch('analytics.buffer.AnalyticsEvent.objects.bulk_create') as bulk_create:
+            buffer.add([AnalyticsEvent(event_type='page_view')])
+            # No further events arrive, yet the buffer is written once its age is up
+            deadline = time.monotonic() + 2
+            while not bulk_create.called and time.monotonic() < deadline:
+                time.sleep(0.01)
+
+        self.assertTrue(flush.called)
+        self.assertEqual(len(bulk_create.call_args.args[0]), 1)
+        self.assertIsNone(buffer._timer)
+
+    def test_empty_batch_starts_no_timer(self):
+        buffer = EventBuffer(max_size=100, max_age=0.05)
+        buffer.add([])
+        self.assertIsNone(buffer._timer)
+        self.assertIsNone(buffer._oldest)
+
+    def test_ingest_benchmark(self):
+        # The full run is `manage.py benchmark_ingest` (10k events down each path by default)
+        out = StringIO()
+        call_command('benchmark_ingest', events=300, batch_size=100, buffer_size=100, stdout=out)
+        single, batched = out.getvalue().splitlines()
+        self.assertRegex(single, r'^track_event: 300 events .* 300 INSERTs$')
+        # One bulk_create each time the buffer fills
+        self.assertRegex(batched, r'^track_events: 300 events .* 3 INSERTs$')
+        self.assertFalse(AnalyticsEvent.objects.exists())
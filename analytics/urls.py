@@ -19,6 +19,10 @@ urlpatterns = [
         'post': 'track_event'
     }), name='analytics-track-event'),
     
+    path('analytics/events/track-events/', views.AnalyticsEventViewSet.as_view({
+        'post': 'track_events'
+    }), name='analytics-track-events'),
+    
     path('analytics/events/dashboard-stats/', views.AnalyticsEventViewSet.as_view({
         'get': 'dashboard_stats'
     }), name='analytics-dashboard-stats'),
@@ -26,6 +30,10 @@ urlpatterns = [
     path('dashboard/', views.AnalyticsEventViewSet.as_view({
         'get': 'unified_dashboard_stats'
     }), name='unified-dashboard-stats'),
+
+    path('requests/', views.AnalyticsEventViewSet.as_view({
+        'get': 'request_stats'
+    }), name='request-stats'),
     
     # Notification logs endpoints
     path('analytics/notifications/', views.NotificationLogViewSet.as_view({
@@ -1,27 +1,53 @@
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from django.db.models import Count, Q, Sum
-from django.db.models.functions import TruncDate
+from django.db.models import Count, F, Q, Sum
 from django.utils import timezone
-from datetime import timedelta
+from django.utils.dateparse import parse_datetime
+from datetime import datetime, timedelta, timezone as dt_timezone
+from rest_framework.exceptions import ValidationError
 from django.http import JsonResponse
-from .models import AnalyticsEvent, NotificationLog
+from .models import AnalyticsEvent, NotificationLog, DailyStat
 from .serializers import AnalyticsEventSerializer, NotificationLogSerializer
+from .buffer import buffer as event_buffer
+from config.pagination import KeysetPagination
+from config.middleware import route_stats
 
-from reservations.models import Reservation, PaymentProof 
-from payments.models import Payment, Refund
-from users.models import User
+from reservations.models import PaymentProof 
 from events.models import Event
 
+VALID_EVENT_TYPES = {choice for choice, _ in AnalyticsEvent.EVENT_TYPES}
+MAX_TRACKED_BATCH = 1000
+
 class AnalyticsEventViewSet(viewsets.ModelViewSet):
     serializer_class = AnalyticsEventSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
+    cursor_ordering = ('-timestamp', '-id')
     
     def get_queryset(self):
-        if self.request.user.is_staff:
-            return AnalyticsEvent.objects.all()
-        return AnalyticsEvent.objects.filter(user=self.request.user)
+        queryset = AnalyticsEvent.objects.all()
+        if not self.request.user.is_staff:
+            queryset = queryset.filter(user=self.request.user)
+        
+        # Optional time window; on partitioned storage only the matching months are scanned
+        since = self.request.query_params.get('since')
+        until = self.request.query_params.get('until')
+        if since or until:
+            queryset = queryset.between(
+                self.parse_moment('since', since, datetime.min),
+                self.parse_moment('until', until, datetime.max),
+            )
+        return queryset
+    
+    @staticmethod
+    def parse_moment(name, value, default):
+        if not value:
+            return timezone.make_aware(default, dt_timezone.utc)
+        moment = parse_datetime(value)
+        if moment is None:
+            raise ValidationError({name: 'Expected an ISO 8601 datetime.'})
+        return timezone.make_aware(moment) if timezone.is_naive(moment) else moment
     
     queryset = AnalyticsEvent.objects.all()
     
@@ -44,6 +70,56 @@ class AnalyticsEventViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(event)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
     
+    @action(detail=False, methods=['post'])
+    def track_events(self, request):
+        """
+        Track a batch of events in one call. Accepts a list or {"events": [...]}.
+        Valid events are buffered and written with bulk_create (see analytics.buffer).
+        """
+        items = request.data.get('events') if isinstance(request.data, dict) else request.data
+        if not isinstance(items, list):
+            return Response({'error': 'Expected a list of events'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > MAX_TRACKED_BATCH:
+            return Response(
+                {'error': f'At most {MAX_TRACKED_BATCH} events per request'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        # Request-level fields are resolved once for the whole batch
+        user = request.user if request.user.is_authenticated else None
+        ip_address = self.get_client_ip(request)
+        user_agent = request.META.get('HTTP_USER_AGENT', '')
+        now = timezone.now()
+        
+        events = []
+        rejected = []
+        for index, item in enumerate(items):
+            if not isinstance(item, dict):
+                rejected.append({'index': index, 'error': 'Expected an object'})
+                continue
+            event_type = item.get('event_type')
+            payload = item.get('payload', {})
+            if event_type not in VALID_EVENT_TYPES:
+                rejected.append({'index': index, 'error': f'Unknown event_type: {event_type}'})
+                continue
+            if not isinstance(payload, dict):
+                rejected.append({'index': index, 'error': 'payload must be an object'})
+                continue
+            events.append(AnalyticsEvent(
+                event_type=event_type,
+                user=user,
+                payload=payload,
+                timestamp=now,
+                ip_address=ip_address,
+                user_agent=user_agent
+            ))
+        
+        event_buffer.add(events)
+        return Response(
+            {'accepted': len(events), 'rejected': rejected},
+            status=status.HTTP_202_ACCEPTED
+        )
+    
     def get_client_ip(self, request):
         x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
         if x_forwarded_for:
@@ -53,10 +129,15 @@ class AnalyticsEventViewSet(viewsets.ModelViewSet):
         return ip
     
     def get_total_stats(self, request):
-        # 1. Total Revenue (Lifetime)
-        total_revenue = Payment.objects.filter(status='completed').aggregate(
-            total=Sum('amount')
-        )['total'] or 0
+        # Lifetime totals and trends come from the DailyStat rollups (see analytics.rollups),
+        # so the cost of a dashboard load no longer grows with history.
+        
+        # 1. Lifetime totals per metric (one grouped query over the rollups)
+        totals = {
+            row['metric']: row for row in DailyStat.objects.values('metric').annotate(
+                count=Sum('total_count'), amount=Sum('total_amount')
+            ).order_by()
+        }
 
         # 2. Pending Approvals Count
         pending_approvals = PaymentProof.objects.filter(verification_status='pending').count()
@@ -72,42 +153,41 @@ class AnalyticsEventViewSet(viewsets.ModelViewSet):
             'id', 'title', 'start_datetime', 'capacity', 'location', 'slug'
         )[:5])
 
-        # 4. Total Users
-        total_users = User.objects.count()
-        
-        # 5. Date Calculations
+        # 4. Date Calculations
         today = timezone.now().date()
         # Extended lookback to ensure test data appears
         start_date = today - timedelta(days=365) 
         
-        # 6. Revenue Trend
-        # Group payments by date and sum amount
-        revenue_trend = list(Payment.objects.filter(
-            status='completed',
-            paid_at__date__gte=start_date
-        ).annotate(
-            date=TruncDate('paid_at')
+        # 5. Revenue Trend
+        revenue_trend = list(DailyStat.objects.filter(
+            metric='payments',
+            date__gte=start_date
         ).values('date').annotate(
-            total=Sum('amount')
+            total=Sum('total_amount')
         ).order_by('date'))
 
-        # 7. Reservation Status Breakdown
-        reservation_status_breakdown = list(Reservation.objects.values('status').annotate(
-            count=Count('id')
-        ).order_by('-count'))
+        # 6. Reservation Status Breakdown
+        reservation_status_breakdown = list(DailyStat.objects.filter(
+            metric='reservations'
+        ).values(status=F('key')).annotate(
+            count=Sum('total_count')
+        ).filter(count__gt=0).order_by('-count'))
         
-        # 8. Pending Proofs List (Snippet)
+        # 7. Pending Proofs List (Snippet)
         pending_proofs_data = list(PaymentProof.objects.filter(
             verification_status='pending'
         ).select_related('reservation').values(
             'id', 'uploaded_at', 'reservation__reference_code', 'reservation__total_amount', 'amount'
         )[:5]) 
         
+        def total(metric, field='count'):
+            return totals.get(metric, {}).get(field) or 0
+        
         return {
-            'total_events': Event.objects.count(),
-            'total_reservations': Reservation.objects.count(),
-            'total_revenue': total_revenue,
-            'total_users': total_users,
+            'total_events': total('events'),
+            'total_reservations': total('reservations'),
+            'total_revenue': total('payments', 'amount'),
+            'total_users': total('users'),
             'pending_approvals_count': pending_approvals,
             'upcoming_events_count': upcoming_events_count,
             'upcoming_events_list': upcoming_events_list,
@@ -128,14 +208,29 @@ class AnalyticsEventViewSet(viewsets.ModelViewSet):
     def dashboard_stats(self, request):
         return self.unified_dashboard_stats(request)
 
+    @action(detail=False, methods=['get'])
+    def request_stats(self, request):
+        """Latency percentiles, query counts and DB time per route, merged across workers."""
+        if not request.user.is_staff:
+            return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
+        
+        return Response({'routes': route_stats.report()})
+
 class NotificationLogViewSet(viewsets.ModelViewSet):
+    """
+    Query budget: list 1 (one joined keyset page; 2 with ?page=), retrieve 1.
+    NotificationLogSerializer reads user.email and reservation.reference_code.
+    """
     serializer_class = NotificationLogSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
+    cursor_ordering = ('-sent_at', '-id')
     
     def get_queryset(self):
+        queryset = NotificationLog.objects.select_related('user', 'reservation').order_by('-sent_at')
         if self.request.user.is_staff:
-            return NotificationLog.objects.all().order_by('-sent_at')
-        return NotificationLog.objects.filter(user=self.request.user).order_by('-sent_at')
+            return queryset
+        return queryset.filter(user=self.request.user)
     
     @action(detail=False, methods=['get'])
     def notification_stats(self, request):
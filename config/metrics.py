@@ -0,0 +1,107 @@
+"""
+Prometheus metrics, served at /metrics.
+
+Request metrics are fed by RequestTimingMiddleware, the domain counters by the
+analytics signals and EmailService. Under gunicorn every worker writes its
+samples to memory-mapped files in PROMETHEUS_MULTIPROC_DIR (set up in
+gunicorn.conf.py) and a scrape of any worker sums all of them; without that
+variable, as under runserver, the metrics stay in this process.
+"""
+import hmac
+import os
+
+from django.conf import settings
+from django.http import HttpResponse
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest,
+)
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client.multiprocess import MultiProcessCollector
+
+# Requests
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds', 'Time spent serving a request', ['method', 'view'],
+)
+REQUESTS = Counter(
+    'http_requests', 'Requests served', ['method', 'view', 'status'],
+)
+IN_FLIGHT = Gauge(
+    'http_requests_in_progress', 'Requests being served right now', multiprocess_mode='livesum',
+)
+DB_QUERIES = Histogram(
+    'http_request_db_queries', 'SQL queries run by a request', ['method', 'view'],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, 200),
+)
+DB_DURATION = Histogram(
+    'http_request_db_duration_seconds', 'Time a request spent in SQL queries', ['method', 'view'],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+
+# Domain
+RESERVATIONS_CREATED = Counter(
+    'reservations_created', 'Reservations created',
+)
+PAYMENTS_COMPLETED = Counter(
+    'payments_completed', 'Payments that reached the completed status', ['method'],
+)
+NOTIFICATIONS_SENT = Counter(
+    'notifications_sent', 'Notifications delivered or attempted', ['type', 'channel', 'status'],
+)
+
+
+MULTIPROCESS = 'PROMETHEUS_MULTIPROC_DIR' in os.environ
+
+
+class PendingProofsCollector:
+    """Pending payment proofs, counted from the database at scrape time rather than tracked per worker."""
+
+    def describe(self):
+        # Lets the registry learn the metric name without running the query at registration
+        yield GaugeMetricFamily('payment_proofs_pending', 'Payment proofs awaiting review')
+
+    def collect(self):
+        from reservations.models import PaymentProof
+
+        gauge = GaugeMetricFamily('payment_proofs_pending', 'Payment proofs awaiting review')
+        gauge.add_metric([], PaymentProof.objects.filter(verification_status='pending').count())
+        yield gauge
+
+
+if not MULTIPROCESS:
+    REGISTRY.register(PendingProofsCollector())
+
+
+def request_started():
+    if settings.METRICS_ENABLED:
+        IN_FLIGHT.inc()
+
+
+def request_finished(method, view, status, timing):
+    if not settings.METRICS_ENABLED:
+        return
+    IN_FLIGHT.dec()
+    REQUEST_LATENCY.labels(method, view).observe(timing.total / 1000)
+    REQUESTS.labels(method, view, status).inc()
+    DB_QUERIES.labels(method, view).observe(timing.queries)
+    DB_DURATION.labels(method, view).observe(timing.db / 1000)
+
+
+def metrics_view(request):
+    # 1. Scrapers send METRICS_TOKEN as a bearer token; without one configured only
+    #    staff sessions may look, unless DEBUG is on for local development
+    token = settings.METRICS_TOKEN
+    if token:
+        supplied = request.headers.get('Authorization', '').removeprefix('Bearer ')
+        if not hmac.compare_digest(supplied.encode(), token.encode()):
+            return HttpResponse(status=401)
+    elif not settings.DEBUG and not request.user.is_staff:
+        return HttpResponse(status=403)
+
+    # 2. In multiprocess mode a fresh registry per scrape sums every worker's files
+    registry = REGISTRY
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        MultiProcessCollector(registry)
+        registry.register(PendingProofsCollector())
+
+    return HttpResponse(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,312 @@
+"""
+Per-request instrumentation.
+
+RequestTimingMiddleware records, for every request, how many SQL queries ran
+and how long they took (through a database execute wrapper), how long DRF
+serializers took to build their .data, how long the response took to render
+and the total time. Staff responses carry the numbers
+in a Server-Timing header, requests over SLOW_REQUEST_MS or SLOW_REQUEST_QUERIES
+are logged with their slowest and most repeated SQL, and every request feeds a
+per-route latency histogram that the staff analytics endpoint reports as
+percentiles, as well as the Prometheus metrics in config/metrics.py.
+"""
+import bisect
+import contextvars
+import copy
+import heapq
+import logging
+import os
+import socket
+import threading
+import time
+from collections import Counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.utils.functional import SimpleLazyObject
+from rest_framework.serializers import BaseSerializer
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (ms) of the latency histogram buckets: 0.5ms to about a minute, each 25% wider
+BUCKETS = [0.5 * 1.25 ** i for i in range(53)]
+# Statements listed per slow request, slowest and most repeated
+SLOW_SQL_SHOWN = 5
+
+INDEX_KEY = 'requests:stats:workers'
+
+_current = contextvars.ContextVar('request_timing', default=None)
+
+
+class RequestTiming:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db = 0.0
+        # Serializer .data time, including any queries it triggers; nested serializers count once
+        self.serialize = 0.0
+        self.serializing = False
+        self.render = None
+        self.render_started = None
+        self.total = None
+        self._slowest = []
+        self._statements = Counter()
+
+    def record_query(self, sql, duration):
+        self.queries += 1
+        self.db += duration
+        self._statements[sql] += 1
+        # Min-heap of the slowest statements seen so far
+        if len(self._slowest) < SLOW_SQL_SHOWN:
+            heapq.heappush(self._slowest, (duration, sql))
+        else:
+            heapq.heappushpop(self._slowest, (duration, sql))
+
+    def slowest(self):
+        return sorted(self._slowest, reverse=True)
+
+    def repeated(self):
+        return [(sql, count) for sql, count in self._statements.most_common(SLOW_SQL_SHOWN) if count > 1]
+
+    def server_timing(self):
+        parts = [f'db;dur={self.db:.1f};desc="{self.queries} queries"']
+        if self.serialize:
+            parts.append(f'serialize;dur={self.serialize:.1f}')
+        if self.render is not None:
+            parts.append(f'render;dur={self.render:.1f}')
+        parts.append(f'total;dur={self.total:.1f}')
+        return ', '.join(parts)
+
+
+def record_query(execute, sql, params, many, context):
+    """Execute wrapper on every connection; only measures while a request is being timed."""
+    timing = _current.get()
+    if timing is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timing.record_query(sql, (time.perf_counter() - started) * 1000)
+
+
+def install_query_recorder(connection, **kwargs):
+    # Connections are per thread (async views query from a worker thread), so the
+    # wrapper goes on each one as it connects rather than around the request
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+_serializer_data = BaseSerializer.data
+
+
+def timed_serializer_data(serializer):
+    """Replaces BaseSerializer.data, the step every serializer's .data goes through."""
+    timing = _current.get()
+    if timing is None or timing.serializing:
+        return _serializer_data.fget(serializer)
+    timing.serializing = True
+    started = time.perf_counter()
+    try:
+        return _serializer_data.fget(serializer)
+    finally:
+        timing.serializing = False
+        timing.serialize += (time.perf_counter() - started) * 1000
+
+
+def install_serializer_timer():
+    # DRF has no hook around building .data, so the property itself is swapped, once per process
+    if BaseSerializer.data is _serializer_data:
+        BaseSerializer.data = property(timed_serializer_data)
+
+
+def percentile(buckets, count, q):
+    """Estimate the q-th quantile (0-1) from histogram counts, interpolating inside the bucket."""
+    rank = q * count
+    seen = 0
+    for index, bucket_count in enumerate(buckets):
+        if bucket_count and seen + bucket_count >= rank:
+            if index == len(BUCKETS):
+                return BUCKETS[-1]
+            lower = BUCKETS[index - 1] if index else 0.0
+            return lower + (BUCKETS[index] - lower) * (rank - seen) / bucket_count
+        seen += bucket_count
+    return 0.0
+
+
+class RouteStats:
+    """
+    Per-route latency histograms for this process. Each worker publishes its
+    cumulative histograms under its own cache key every REQUEST_STATS_FLUSH_INTERVAL
+    seconds, so any worker can report on all of them without write races.
+    """
+
+    def __init__(self, flush_interval):
+        self.flush_interval = flush_interval
+        self.key = f'requests:stats:{socket.gethostname()}:{os.getpid()}'
+        self._routes = {}
+        self._flushed = time.monotonic()
+        self._lock = threading.Lock()
+
+    def record(self, route, timing):
+        with self._lock:
+            stats = self._routes.get(route)
+            if stats is None:
+                stats = self._routes[route] = {
+                    'count': 0, 'total': 0.0, 'queries': 0, 'db': 0.0, 'buckets': [0] * (len(BUCKETS) + 1),
+                }
+            stats['count'] += 1
+            stats['total'] += timing.total
+            stats['queries'] += timing.queries
+            stats['db'] += timing.db
+            stats['buckets'][bisect.bisect_left(BUCKETS, timing.total)] += 1
+            due = time.monotonic() - self._flushed >= self.flush_interval
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            snapshot = copy.deepcopy(self._routes)
+            self._flushed = time.monotonic()
+        try:
+            # A dead worker's histograms age out; live ones are rewritten well before that
+            cache.set(self.key, snapshot, max(self.flush_interval * 30, 300))
+            workers = cache.get(INDEX_KEY) or set()
+            if self.key not in workers:
+                cache.set(INDEX_KEY, workers | {self.key}, None)
+        except Exception:
+            logger.exception('Could not publish request stats')
+
+    def report(self):
+        """Merge every live worker's histograms into per-route percentiles, slowest routes first."""
+        self.flush()
+        workers = cache.get(INDEX_KEY) or set()
+        published = cache.get_many(list(workers))
+        if set(published) != workers:
+            cache.set(INDEX_KEY, set(published), None)
+
+        merged = {}
+        for routes in published.values():
+            for route, stats in routes.items():
+                total = merged.setdefault(route, {
+                    'count': 0, 'total': 0.0, 'queries': 0, 'db': 0.0, 'buckets': [0] * (len(BUCKETS) + 1),
+                })
+                for field in ('count', 'total', 'queries', 'db'):
+                    total[field] += stats[field]
+                total['buckets'] = [a + b for a, b in zip(total['buckets'], stats['buckets'])]
+
+        rows = [
+            {
+                'route': route,
+                'count': stats['count'],
+                'p50_ms': round(percentile(stats['buckets'], stats['count'], 0.50), 1),
+                'p90_ms': round(percentile(stats['buckets'], stats['count'], 0.90), 1),
+                'p99_ms': round(percentile(stats['buckets'], stats['count'], 0.99), 1),
+                'mean_ms': round(stats['total'] / stats['count'], 1),
+                'mean_queries': round(stats['queries'] / stats['count'], 1),
+                'mean_db_ms': round(stats['db'] / stats['count'], 1),
+            }
+            for route, stats in merged.items() if stats['count']
+        ]
+        return sorted(rows, key=lambda row: row['mean_ms'] * row['count'], reverse=True)
+
+
+route_stats = RouteStats(settings.REQUEST_STATS_FLUSH_INTERVAL)
+
+
+def view_of(request):
+    """URL name of the matched pattern (its route when unnamed)."""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return '<unresolved>'
+    return match.view_name or match.route
+
+
+def is_staff(request):
+    user = getattr(request, 'user', None)
+    return bool(user and user.is_staff)
+
+
+async def ais_staff(request):
+    user = getattr(request, 'user', None)
+    if isinstance(user, SimpleLazyObject):
+        # Still the lazy session user (no DRF authentication ran): resolve it without blocking
+        user = await request.auser()
+    return bool(user and user.is_staff)
+
+
+class RequestTimingMiddleware:
+    """Goes first in MIDDLEWARE so the total covers every other middleware too."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        connection_created.connect(install_query_recorder)
+        for connection in connections.all(initialized_only=True):
+            install_query_recorder(connection)
+        install_serializer_timer()
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timing = request.timing = RequestTiming()
+        metrics.request_started()
+        token = _current.set(timing)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.finish(request, response, timing, is_staff(request))
+        return response
+
+    async def __acall__(self, request):
+        timing = request.timing = RequestTiming()
+        metrics.request_started()
+        token = _current.set(timing)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.finish(request, response, timing, await ais_staff(request))
+        return response
+
+    def process_template_response(self, request, response):
+        # DRF responses render after the view returns: time that step on its own
+        timing = getattr(request, 'timing', None)
+        if timing is not None:
+            timing.render_started = time.perf_counter()
+            response.add_post_render_callback(lambda rendered: self.rendered(timing))
+        return response
+
+    @staticmethod
+    def rendered(timing):
+        timing.render = (time.perf_counter() - timing.render_started) * 1000
+
+    def finish(self, request, response, timing, staff):
+        timing.total = (time.perf_counter() - timing.started) * 1000
+        view = view_of(request)
+        route = f'{request.method} {view}'
+        route_stats.record(route, timing)
+        metrics.request_finished(request.method, view, response.status_code, timing)
+
+        if timing.total >= settings.SLOW_REQUEST_MS or timing.queries >= settings.SLOW_REQUEST_QUERIES:
+            slowest = '\n'.join(f'  {duration:8.1f}ms  {sql}' for duration, sql in timing.slowest())
+            repeated = '\n'.join(f'  {count:8d}x    {sql}' for sql, count in timing.repeated())
+            logger.warning(
+                'Slow request %s %s (%s): %s, %.0fms total, %d queries in %.0fms, %.0fms serializing\n'
+                'Slowest SQL:\n%s\nRepeated SQL:\n%s',
+                request.method, request.path, route, response.status_code,
+                timing.total, timing.queries, timing.db, timing.serialize,
+                slowest or '  none', repeated or '  none',
+            )
+
+        if staff:
+            response['Server-Timing'] = timing.server_timing()
@@ -0,0 +1,61 @@
+from django.conf import settings
+from django.http import Http404
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor pagination for large, append-mostly lists. Each page seeks on the
+    view's `cursor_ordering` (an indexed timestamp plus id as tie-breaker), so
+    there is no COUNT(*) and deep pages cost the same as the first one.
+
+    Passing `?page=N` opts back into the numbered PageNumberPagination pages.
+    """
+    ordering = ('-id',)
+
+    def get_ordering(self, request, queryset, view):
+        return getattr(view, 'cursor_ordering', self.ordering)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_number = None
+        if PageNumberPagination.page_query_param in request.query_params:
+            self.page_number = PageNumberPagination()
+            queryset = queryset.order_by(*self.get_ordering(request, queryset, view))
+            return self.page_number.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.page_number is not None:
+            return self.page_number.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+async def apaginate(request, queryset):
+    """
+    PageNumberPagination for the async views: returns (objects, links) where links
+    holds the same count/next/previous keys the DRF list responses carry.
+    Raises Http404 for a page that does not exist, as DRF does.
+    """
+    page_size = settings.REST_FRAMEWORK['PAGE_SIZE']
+    try:
+        page = int(request.GET.get('page', 1))
+    except ValueError:
+        raise Http404('Invalid page.')
+    count = await queryset.acount()
+    if page < 1 or (page > 1 and (page - 1) * page_size >= count):
+        raise Http404('Invalid page.')
+
+    offset = (page - 1) * page_size
+    objects = [obj async for obj in queryset[offset:offset + page_size]]
+    url = request.build_absolute_uri()
+    links = {
+        'count': count,
+        'next': replace_query_param(url, 'page', page + 1) if offset + page_size < count else None,
+        'previous': None,
+    }
+    if page == 2:
+        links['previous'] = remove_query_param(url, 'page')
+    elif page > 2:
+        links['previous'] = replace_query_param(url, 'page', page - 1)
+    return objects, links
@@ -0,0 +1,16 @@
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+
+class ICalendarRenderer(BaseRenderer):
+    """
+    Lets `Accept: text/calendar` (and `?format=ics`) through content negotiation.
+    Feed views return ready-made bytes; errors are still rendered as JSON.
+    """
+    media_type = 'text/calendar'
+    format = 'ics'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, bytes):
+            return data
+        return JSONRenderer().render(data, renderer_context=renderer_context)
@@ -43,6 +43,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'config.middleware.RequestTimingMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -83,6 +84,72 @@ DATABASES = {
     )
 }
 
+# The apps keep no migration files in the repo: `manage.py test` builds its database from the models,
+# contrib apps included, so the custom user table and auth's tables are created in one pass
+if sys.argv[1:2] == ['test']:
+    MIGRATION_MODULES = {
+        app: None for app in (
+            'admin', 'auth', 'contenttypes', 'sessions', 'users', 'events', 'reservations', 'payments', 'analytics',
+        )
+    }
+
+    # SQLite's in-memory test database shares one cache between threads and fails a second writer at
+    # once; a file makes concurrent writers wait on the busy timeout, so the booking race runs on SQLite too
+    if DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+        DATABASES['default']['TEST'] = {'NAME': BASE_DIR / 'test_db.sqlite3'}
+        DATABASES['default'].setdefault('OPTIONS', {})['timeout'] = 30
+
+# Cache
+# Local memory by default (per worker); set REDIS_URL to share cached responses between workers
+REDIS_URL = config('REDIS_URL', default='')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Seconds a public event list/detail response stays cached. Writes to events invalidate
+# immediately on a shared cache; with local memory other workers catch up within this window.
+EVENT_CACHE_TIMEOUT = config('EVENT_CACHE_TIMEOUT', default=60, cast=int)
+# Seconds the admin payment stats/report responses are cached
+PAYMENT_STATS_CACHE_TIMEOUT = config('PAYMENT_STATS_CACHE_TIMEOUT', default=30, cast=int)
+# Seconds a calendar feed URL keeps working; users fetch a new one (or rotate it) from calendar-feed-url
+CALENDAR_FEED_TOKEN_MAX_AGE = config('CALENDAR_FEED_TOKEN_MAX_AGE', default=180 * 24 * 3600, cast=int)
+# Seconds a JWT-authenticated user is served from cache instead of the users table (shared caches only)
+AUTH_USER_CACHE_TIMEOUT = config('AUTH_USER_CACHE_TIMEOUT', default=60, cast=int)
+
+# Batched analytics ingestion (see analytics/buffer.py for the durability trade-off)
+ANALYTICS_BUFFER_SIZE = config('ANALYTICS_BUFFER_SIZE', default=500, cast=int)
+ANALYTICS_BUFFER_MAX_AGE = config('ANALYTICS_BUFFER_MAX_AGE', default=5, cast=float)
+
+# Whole months of analytics events kept before prune_analytics_events rolls them up and drops them
+ANALYTICS_RETENTION_MONTHS = config('ANALYTICS_RETENTION_MONTHS', default=13, cast=int)
+
+# Events whose reference codes each worker keeps warm for door check-in
+CHECKIN_CACHE_EVENTS = config('CHECKIN_CACHE_EVENTS', default=8, cast=int)
+
+# Milliseconds a cold worker may spend on app loading and the URLconf; checked by startup_budget
+STARTUP_BUDGET_MS = config('STARTUP_BUDGET_MS', default=1500, cast=int)
+
+# Requests slower than this many milliseconds, or running this many queries, are logged with their SQL
+SLOW_REQUEST_MS = config('SLOW_REQUEST_MS', default=1000, cast=int)
+SLOW_REQUEST_QUERIES = config('SLOW_REQUEST_QUERIES', default=50, cast=int)
+# Seconds between each worker publishing its per-route latency histograms to the cache
+REQUEST_STATS_FLUSH_INTERVAL = config('REQUEST_STATS_FLUSH_INTERVAL', default=10, cast=float)
+
+# Prometheus metrics at /metrics (see config/metrics.py); scrapes must send METRICS_TOKEN as a bearer token,
+# and with no token set only staff sessions (or anyone, under DEBUG) can read them
+METRICS_ENABLED = config('METRICS_ENABLED', default=True, cast=bool)
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
@@ -101,7 +168,7 @@ ALLOWED_FILE_TYPES = ['image/jpeg', 'image/png', 'application/pdf']
 # DRF Configuration
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
@@ -126,7 +193,8 @@ SIMPLE_JWT = {
 CORS_ALLOWED_ORIGINS = config('CORS_ALLOWED_ORIGINS', cast=Csv())
 
 # Email Settings
-EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+# Any Django email backend, e.g. django.core.mail.backends.locmem.EmailBackend for local runs
+EMAIL_BACKEND = config('EMAIL_BACKEND', default='django.core.mail.backends.smtp.EmailBackend')
 EMAIL_HOST = config('EMAIL_HOST')
 EMAIL_PORT = config('EMAIL_PORT', cast=int)
 EMAIL_USE_TLS = config('EMAIL_USE_TLS', cast=bool)
@@ -0,0 +1,91 @@
+"""
+Async read-only views over the public event catalogue, for ASGI workers.
+
+They serve the same published-only data as EventViewSet.list/retrieve, from the
+same versioned catalogue cache, but await the database instead of holding a
+worker thread while it (or a slow client) is busy. Staff views and writes stay
+on the DRF viewset.
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Prefetch
+from django.http import Http404, JsonResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+from rest_framework.exceptions import ValidationError
+
+from config.pagination import apaginate
+from .cache import catalogue_key, build_entry
+from .models import Event, SubEvent, TicketType
+from .serializers import EventSerializer, EventListSerializer
+from .views import day_start
+
+
+@require_safe
+async def event_list(request):
+    async def render():
+        queryset = Event.objects.with_availability().filter(published=True)
+        # Same filters as EventViewSet: location, then half-open day bounds
+        if request.GET.get('location'):
+            queryset = queryset.filter(location=request.GET['location'])
+        start = day_start(request.GET, 'start_date')
+        end = day_start(request.GET, 'end_date', next_day=True)
+        if start:
+            queryset = queryset.filter(start_datetime__gte=start)
+        if end:
+            queryset = queryset.filter(end_datetime__lt=end)
+
+        events, links = await apaginate(request, queryset.order_by('start_datetime', 'id'))
+        data = {**links, 'results': EventListSerializer(events, many=True).data}
+        return data, max((event.updated_at for event in events), default=None)
+
+    return await catalogue_response(request, 'async-list', render)
+
+
+@require_safe
+async def event_detail(request, slug):
+    async def render():
+        ticket_types = TicketType.objects.with_availability()
+        queryset = Event.objects.with_availability().filter(published=True).prefetch_related(
+            Prefetch('sub_events', queryset=SubEvent.objects.prefetch_related(
+                Prefetch('ticket_types', queryset=ticket_types)
+            )),
+            Prefetch('ticket_types', queryset=ticket_types),
+        )
+        try:
+            event = await queryset.aget(slug=slug)
+        except Event.DoesNotExist:
+            raise Http404('Event not found')
+        # Everything EventSerializer reads is prefetched, so serializing never touches the database
+        return EventSerializer(event).data, event.updated_at
+
+    return await catalogue_response(request, 'async-retrieve', render, slug=slug)
+
+
+async def catalogue_response(request, name, render, **kwargs):
+    """Async counterpart of EventViewSet.catalogue_response for anonymous callers."""
+    key = await sync_to_async(catalogue_key)(name, request, **kwargs)
+    entry = await cache.aget(key)
+    if entry is None:
+        try:
+            entry = build_entry(*await render())
+        except ValidationError as exc:
+            return JsonResponse(exc.detail, status=400)
+        except Http404 as exc:
+            return JsonResponse({'error': str(exc)}, status=404)
+        await cache.aset(key, entry, settings.EVENT_CACHE_TIMEOUT)
+
+    response = JsonResponse(entry['data'])
+    response['ETag'] = f'"{entry["digest"][:32]}-json"'
+    if entry['last_modified'] is not None:
+        response['Last-Modified'] = http_date(entry['last_modified'])
+    patch_cache_control(response, public=True, max_age=0, must_revalidate=True)
+
+    return get_conditional_response(
+        request,
+        etag=response['ETag'],
+        last_modified=entry['last_modified'],
+        response=response,
+    )
@@ -0,0 +1,52 @@
+import hashlib
+import json
+import time
+
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+
+VERSION_KEY = 'events:catalogue:version'
+
+
+def catalogue_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # Seed from the clock so an evicted counter never reuses an old version
+        cache.add(VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def bump_catalogue_version():
+    """Orphan every cached catalogue response; they age out of the cache on their own."""
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, time.time_ns(), timeout=None)
+
+
+def catalogue_key(name, request, **kwargs):
+    # DRF requests expose query_params; plain Django requests (the async views) only GET
+    params = sorted(getattr(request, 'query_params', request.GET).lists())
+    raw = json.dumps([name, kwargs, params], sort_keys=True)
+    digest = hashlib.sha256(raw.encode()).hexdigest()
+    return f'events:catalogue:{catalogue_version()}:{digest}'
+
+
+def build_entry(data, last_modified):
+    body = json.dumps(data, cls=DjangoJSONEncoder, sort_keys=True).encode()
+    return {
+        'data': data,
+        'digest': hashlib.sha256(body).hexdigest(),
+        # HTTP dates have one-second resolution
+        'last_modified': int(last_modified.timestamp()) if last_modified else None,
+    }
+
+
+def build_feed_entry(body, last_modified):
+    """Like build_entry, for responses that are already rendered bytes (calendar feeds)."""
+    return {
+        'body': body,
+        'digest': hashlib.sha256(body).hexdigest(),
+        'last_modified': int(last_modified.timestamp()) if last_modified else None,
+    }
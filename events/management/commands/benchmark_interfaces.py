@@ -0,0 +1,132 @@
+import http.client
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from events.models import Event
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+class Command(BaseCommand):
+    help = (
+        'Start gunicorn from gunicorn.conf.py once per SERVER_INTERFACE on a free local port, '
+        'with the same worker count, and load each with the same number of keep-alive clients: '
+        'wsgi serves the DRF catalogue, asgi the async one. Reports req/s and p50/p95/p99 latency.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000,
+                            help='Requests per interface, after the warm-up')
+        parser.add_argument('--concurrency', type=int, default=16,
+                            help='Clients sending requests at the same time')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='WEB_CONCURRENCY for both servers')
+        parser.add_argument('--wsgi-path', default='/api/events/events/',
+                            help='Path requested from the wsgi server')
+        parser.add_argument('--asgi-path', default='/api/events/async/events/',
+                            help='Path requested from the asgi server')
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f'{Event.objects.filter(published=True).count()} published events, '
+            f'{options["workers"]} worker(s), {options["concurrency"]} clients'
+        )
+        for interface in ('wsgi', 'asgi'):
+            path = options[f'{interface}_path']
+            latencies, errors, elapsed = self.run(interface, path, options)
+            latencies.sort()
+            self.stdout.write(
+                f'{interface} {path}: {len(latencies)} ok, {errors} failed, {len(latencies) / elapsed:.0f} req/s, '
+                f'p50 {statistics.median(latencies) * 1000:.1f}ms, '
+                f'p95 {percentile(latencies, 0.95) * 1000:.1f}ms, p99 {percentile(latencies, 0.99) * 1000:.1f}ms'
+            )
+
+    def run(self, interface, path, options):
+        port = free_port()
+        env = {**os.environ, 'PORT': str(port), 'SERVER_INTERFACE': interface,
+               'WEB_CONCURRENCY': str(options['workers'])}
+        with tempfile.TemporaryFile() as log:
+            server = subprocess.Popen(
+                [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py'],
+                cwd=settings.BASE_DIR, env=env, stdout=log, stderr=subprocess.STDOUT,
+            )
+            try:
+                self.wait_until_up(server, port, path, log)
+                # Warm every worker's caches and connections before timing
+                self.load(port, path, options['concurrency'] * 4, options['concurrency'])
+                started = time.perf_counter()
+                latencies, errors = self.load(port, path, options['requests'], options['concurrency'])
+                return latencies, errors, time.perf_counter() - started
+            finally:
+                server.terminate()
+                server.wait(timeout=30)
+
+    def wait_until_up(self, server, port, path, log):
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                log.seek(0)
+                raise CommandError(f'gunicorn exited with {server.returncode}:\n{log.read().decode()[-2000:]}')
+            try:
+                connection = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+                connection.request('GET', path, headers={'Host': 'localhost'})
+                status = connection.getresponse().status
+                connection.close()
+            except OSError:
+                time.sleep(0.2)
+                continue
+            if status != 200:
+                raise CommandError(f'GET {path} answered {status}')
+            return
+        raise CommandError(f'gunicorn did not answer on port {port} within 30s')
+
+    def load(self, port, path, total, concurrency):
+        latencies = []
+        errors = []
+        remaining = iter(range(total))
+        lock = threading.Lock()
+
+        def client():
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+            while True:
+                with lock:
+                    if next(remaining, None) is None:
+                        break
+                started = time.perf_counter()
+                try:
+                    connection.request('GET', path, headers={'Host': 'localhost'})
+                    response = connection.getresponse()
+                    response.read()
+                    ok = response.status == 200
+                except (OSError, http.client.HTTPException):
+                    ok = False
+                    connection.close()
+                    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+                elapsed = time.perf_counter() - started
+                with lock:
+                    (latencies if ok else errors).append(elapsed)
+            connection.close()
+
+        threads = [threading.Thread(target=client) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return latencies, len(errors)
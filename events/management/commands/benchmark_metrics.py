@@ -0,0 +1,93 @@
+import statistics
+import time
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import Client
+from django.test.utils import override_settings
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import AccessToken
+
+from config import metrics
+from config.middleware import RequestTiming
+from events.models import Event
+
+URL = '/api/events/events/'
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure what the Prometheus request metrics add to the EventViewSet list. Generates events '
+        'inside a transaction that is rolled back, requests the staff list (never cached) in '
+        'alternating blocks with METRICS_ENABLED on and off, and times the metrics hooks on their '
+        'own. Fails when the hooks cost more than --max-overhead-percent of the median request.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--events', type=int, default=20,
+                            help='Events on the listed page')
+        parser.add_argument('--blocks', type=int, default=10,
+                            help='Blocks per setting, alternating which goes first')
+        parser.add_argument('--requests', type=int, default=300,
+                            help='Requests per block')
+        parser.add_argument('--max-overhead-percent', type=float, default=1.0,
+                            help='Largest hook cost allowed, relative to the median request with metrics off')
+
+    def handle(self, *args, **options):
+        with transaction.atomic(), override_settings(ALLOWED_HOSTS=['testserver']):
+            client = Client(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.generate(options["events"]))}')
+            durations = self.request_blocks(client, options['blocks'], options['requests'])
+            hook = self.hook_cost()
+            # Nothing generated here outlives the benchmark
+            transaction.set_rollback(True)
+
+        on = statistics.median(durations[True]) * 1000
+        off = statistics.median(durations[False]) * 1000
+        overhead = hook * 1000 / off * 100
+        self.stdout.write(f'GET {URL}: median {on:.2f}ms with metrics, {off:.2f}ms without '
+                          f'({len(durations[True])} requests each)')
+        self.stdout.write(f'Metrics hooks: {hook * 1_000_000:.1f}us per request, {overhead:.2f}% of the list')
+        if overhead > options['max_overhead_percent']:
+            raise CommandError(f'Metrics cost {overhead:.2f}%, over {options["max_overhead_percent"]}%')
+
+    def generate(self, count):
+        staff = get_user_model().objects.create_superuser(
+            email=f'metrics-benchmark-{time.time_ns()}@example.com', password=None, full_name='Metrics benchmark'
+        )
+        start = timezone.now() + timedelta(days=1)
+        Event.objects.bulk_create([
+            Event(title=f'Metrics benchmark {index}', slug=f'metrics-benchmark-{time.time_ns()}-{index}',
+                  description='-', location='-', address='-', capacity=10,
+                  start_datetime=start + timedelta(hours=index), end_datetime=start + timedelta(hours=index + 3),
+                  published=True, created_by=staff)
+            for index in range(count)
+        ])
+        return staff
+
+    def request_blocks(self, client, blocks, requests):
+        durations = {True: [], False: []}
+        for block in range(blocks):
+            # Alternate which setting goes first, so drift over the run hits both alike
+            for enabled in ((True, False) if block % 2 == 0 else (False, True)):
+                with override_settings(METRICS_ENABLED=enabled):
+                    for _ in range(requests):
+                        started = time.perf_counter()
+                        response = client.get(URL)
+                        durations[enabled].append(time.perf_counter() - started)
+                        if response.status_code != 200:
+                            raise CommandError(f'GET {URL} answered {response.status_code}')
+        return durations
+
+    @staticmethod
+    def hook_cost(calls=20000):
+        """Seconds per request spent in the two metrics hooks RequestTimingMiddleware calls."""
+        timing = RequestTiming()
+        timing.total, timing.queries, timing.db = 8.0, 3, 1.0
+        with override_settings(METRICS_ENABLED=True):
+            started = time.perf_counter()
+            for _ in range(calls):
+                metrics.request_started()
+                metrics.request_finished('GET', 'event-list', 200, timing)
+            return (time.perf_counter() - started) / calls
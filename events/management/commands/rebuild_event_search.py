@@ -0,0 +1,17 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from events import search
+
+
+class Command(BaseCommand):
+    help = 'Drop and rebuild the full-text event search index from the events table'
+
+    def handle(self, *args, **options):
+        if search.backend() is None:
+            self.stdout.write('This database has no full-text index; search falls back to icontains')
+            return
+        started = time.monotonic()
+        indexed = search.rebuild()
+        self.stdout.write(f'Indexed {indexed} events in {time.monotonic() - started:.2f}s')
@@ -1,6 +1,24 @@
 from django.db import models
+from django.db.models import F
+from django.db.models.functions import Greatest
 from django.utils.text import slugify
 
+
+class EventQuerySet(models.QuerySet):
+    def with_availability(self):
+        # Derived from the counters InventoryService keeps, the same numbers holds are checked against
+        return self.annotate(
+            available_tickets=Greatest(F('capacity') - F('seats_reserved'), 0,
+                                       output_field=models.IntegerField())
+        )
+
+class TicketTypeQuerySet(models.QuerySet):
+    def with_availability(self):
+        return self.annotate(
+            available_tickets=Greatest(F('quantity_available') - F('quantity_reserved'), 0,
+                                       output_field=models.IntegerField())
+        )
+
 class Event(models.Model):
     title = models.CharField(max_length=200)
     slug = models.SlugField(unique=True, blank=True)
@@ -8,6 +26,8 @@ class Event(models.Model):
     location = models.CharField(max_length=255)
     address = models.TextField()
     capacity = models.PositiveIntegerField()
+    # Seats currently held by active reservations, maintained by InventoryService
+    seats_reserved = models.PositiveIntegerField(default=0)
     start_datetime = models.DateTimeField()
     end_datetime = models.DateTimeField()
     currency = models.CharField(max_length=3, default='ZAR')
@@ -16,6 +36,16 @@ class Event(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = EventQuerySet.as_manager()
+    
+    class Meta:
+        indexes = [
+            # Public listing: published=True ORDER BY start_datetime, id
+            models.Index(fields=['published', 'start_datetime', 'id']),
+            # Staff listing and date-range filters without the published predicate
+            models.Index(fields=['start_datetime', 'id']),
+        ]
+    
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.title)
@@ -30,6 +60,7 @@ class SubEvent(models.Model):
     start_datetime = models.DateTimeField()
     end_datetime = models.DateTimeField()
     capacity = models.PositiveIntegerField()
+    seats_reserved = models.PositiveIntegerField(default=0)
     
     def __str__(self):
         return f"{self.event.title} - {self.title}"
@@ -41,6 +72,14 @@ class TicketType(models.Model):
     price = models.DecimalField(max_digits=10, decimal_places=2)
     reservation_fee = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     quantity_available = models.PositiveIntegerField()
+    # Tickets currently held by active reservations, maintained by InventoryService
+    quantity_reserved = models.PositiveIntegerField(default=0)
+    
+    objects = TicketTypeQuerySet.as_manager()
+    
+    @property
+    def quantity_remaining(self):
+        return max(self.quantity_available - self.quantity_reserved, 0)
     
     def __str__(self):
         return f"{self.name} - {self.event.title}"
\ No newline at end of file
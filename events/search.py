@@ -0,0 +1,241 @@
+"""
+Full-text search over event title, location and description.
+
+PostgreSQL keeps a side table of weighted tsvectors (title A, location B,
+description C) behind a GIN index, plus a pg_trgm index on the title for
+typo-tolerant matches when the extension is installed. SQLite keeps an FTS5
+virtual table keyed by the event id. Either index is created on first use
+(idempotently, under a lock) and filled from the events table, then kept in
+sync by the Event signals. Other
+databases fall back to icontains without ranking.
+"""
+import re
+
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils.html import escape
+
+from .models import Event
+
+TABLE = 'events_search'
+HIGHLIGHT_START = '<mark>'
+HIGHLIGHT_STOP = '</mark>'
+# What the database wraps matches in; the text around them is HTML-escaped before
+# they become HIGHLIGHT_START/STOP, so event text can never inject markup
+MATCH_START = '\x02'
+MATCH_STOP = '\x03'
+# Text search configuration used to stem both documents and queries
+CONFIG = 'english'
+# Weighted tsvector over an event's columns (or query parameters)
+DOCUMENT = (
+    f"setweight(to_tsvector('{CONFIG}', %(title)s), 'A') || "
+    f"setweight(to_tsvector('{CONFIG}', %(location)s), 'B') || "
+    f"setweight(to_tsvector('{CONFIG}', %(description)s), 'C')"
+)
+
+_ready = False
+
+
+def backend():
+    if connection.vendor == 'postgresql':
+        return 'postgresql'
+    if connection.vendor == 'sqlite':
+        return 'sqlite'
+    return None
+
+
+def _has_trigram(cursor):
+    cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+    return cursor.fetchone() is not None
+
+
+def _populate(cursor):
+    # One set-based INSERT ... SELECT rather than a round trip per event
+    qn = connection.ops.quote_name
+    events = qn(Event._meta.db_table)
+    if backend() == 'postgresql':
+        cursor.execute(
+            f'INSERT INTO {qn(TABLE)} (event_id, title, document) SELECT id, title, {DOCUMENT} FROM {events} '
+            f'ON CONFLICT (event_id) DO NOTHING'
+            % {'title': 'title', 'location': 'location', 'description': 'description'}
+        )
+    else:
+        cursor.execute(
+            f'INSERT INTO {TABLE} (rowid, title, location, description) '
+            f'SELECT id, title, location, description FROM {events} '
+            f'WHERE id NOT IN (SELECT rowid FROM {TABLE})'
+        )
+
+
+def _lock(cursor):
+    # Serialize index DDL across workers; SQLite already allows a single writer at a time
+    if backend() == 'postgresql':
+        cursor.execute('SELECT pg_advisory_xact_lock(hashtext(%s))', [TABLE])
+
+
+def ensure_index():
+    """Create the search table if it is missing and index any events not in it yet."""
+    if _ready or backend() is None:
+        return
+
+    qn = connection.ops.quote_name
+    with transaction.atomic(), connection.cursor() as cursor:
+        _lock(cursor)
+        if backend() == 'postgresql':
+            # No foreign key: Django does not know this table, so one would block TRUNCATE (flush).
+            # Searches join back to events, so a row left by a bulk delete is never returned.
+            cursor.execute(
+                f'CREATE TABLE IF NOT EXISTS {qn(TABLE)} ('
+                f'event_id bigint PRIMARY KEY, title text NOT NULL, document tsvector NOT NULL)'
+            )
+            cursor.execute(f'CREATE INDEX IF NOT EXISTS {TABLE}_document ON {qn(TABLE)} USING gin (document)')
+            try:
+                with transaction.atomic():
+                    cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+            except Exception:
+                # Needs extension privileges; full-text search works without it
+                pass
+            if _has_trigram(cursor):
+                cursor.execute(
+                    f'CREATE INDEX IF NOT EXISTS {TABLE}_title_trgm ON {qn(TABLE)} USING gin (title gin_trgm_ops)'
+                )
+        else:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5("
+                f"title, location, description, tokenize = 'porter unicode61')"
+            )
+        _populate(cursor)
+
+    def ready():
+        global _ready
+        _ready = True
+    # Only trust the table once it is committed; a rolled-back outer transaction takes it away again
+    transaction.on_commit(ready)
+
+
+def _index(cursor, rows):
+    qn = connection.ops.quote_name
+    rows = list(rows)
+    if not rows:
+        return
+    if backend() == 'postgresql':
+        document = DOCUMENT % {'title': '%s', 'location': '%s', 'description': '%s'}
+        cursor.executemany(
+            f'INSERT INTO {qn(TABLE)} (event_id, title, document) VALUES (%s, %s, {document}) '
+            f'ON CONFLICT (event_id) DO UPDATE SET title = EXCLUDED.title, document = EXCLUDED.document',
+            [(pk, title, title, location, description) for pk, title, location, description in rows]
+        )
+    else:
+        cursor.executemany(f'DELETE FROM {TABLE} WHERE rowid = %s', [(row[0],) for row in rows])
+        cursor.executemany(
+            f'INSERT INTO {TABLE} (rowid, title, location, description) VALUES (%s, %s, %s, %s)', rows
+        )
+
+
+def index_event(event):
+    if backend() is None:
+        return
+    ensure_index()
+    with connection.cursor() as cursor:
+        _index(cursor, [(event.pk, event.title, event.location, event.description)])
+
+
+def remove_event(event_id):
+    if backend() is None:
+        return
+    ensure_index()
+    column = 'event_id' if backend() == 'postgresql' else 'rowid'
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {connection.ops.quote_name(TABLE)} WHERE {column} = %s', [event_id])
+
+
+def rebuild():
+    """Repopulate the index from the events table in one transaction. Returns the number of events indexed."""
+    if backend() is None:
+        return 0
+    ensure_index()
+    with transaction.atomic(), connection.cursor() as cursor:
+        # Readers keep seeing the old rows until this commits; the table itself never goes away
+        _lock(cursor)
+        cursor.execute(f'DELETE FROM {connection.ops.quote_name(TABLE)}')
+        _populate(cursor)
+    return Event.objects.count()
+
+
+def _fts5_query(text):
+    # Every word must match, as a prefix; quoting keeps FTS5 operators in user input inert
+    words = re.findall(r'\w+', text)
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def search(text, limit=20, published_only=True):
+    """
+    Return up to `limit` (event_id, rank, highlight) tuples, best match first.
+    `highlight` maps title/description to text with matches wrapped in <mark>.
+    """
+    if not text.strip():
+        return []
+    if backend() is None:
+        return _fallback_search(text, limit, published_only)
+    ensure_index()
+
+    published = 'AND e.published' if published_only else ''
+    events = connection.ops.quote_name(Event._meta.db_table)
+    with connection.cursor() as cursor:
+        if backend() == 'postgresql':
+            trigram = _has_trigram(cursor)
+            similarity = 'similarity(s.title, %(text)s)' if trigram else '0'
+            fuzzy = 'OR s.title %% %(text)s' if trigram else ''
+            # 1. Rank and cut to `limit` on the index alone; 2. headline only those rows
+            cursor.execute(
+                f'SELECT ranked.event_id, ranked.rank, '
+                f"ts_headline('{CONFIG}', e.title, ranked.query, %(options)s), "
+                f"ts_headline('{CONFIG}', e.description, ranked.query, %(fragments)s) "
+                f'FROM ('
+                f'  SELECT s.event_id, ts_rank_cd(s.document, q.query) + {similarity} AS rank, q.query '
+                f"  FROM {TABLE} s, websearch_to_tsquery('{CONFIG}', %(text)s) q(query), {events} e "
+                f'  WHERE e.id = s.event_id AND (s.document @@ q.query {fuzzy}) {published} '
+                f'  ORDER BY rank DESC, s.event_id LIMIT %(limit)s'
+                f') ranked JOIN {events} e ON e.id = ranked.event_id '
+                f'ORDER BY ranked.rank DESC, ranked.event_id',
+                {
+                    'text': text,
+                    'limit': limit,
+                    'options': f'StartSel={MATCH_START}, StopSel={MATCH_STOP}, HighlightAll=true',
+                    'fragments': f'StartSel={MATCH_START}, StopSel={MATCH_STOP}, MaxFragments=2, MaxWords=20',
+                }
+            )
+        else:
+            query = _fts5_query(text)
+            if not query:
+                return []
+            # bm25 is lower-is-better; negate it so every backend ranks descending
+            # (named `score` because FTS5 reserves a hidden `rank` column)
+            cursor.execute(
+                f'SELECT {TABLE}.rowid, -bm25({TABLE}, 10.0, 4.0, 1.0) AS score, '
+                f'highlight({TABLE}, 0, %s, %s), '
+                f"snippet({TABLE}, 2, %s, %s, '...', 20) "
+                f'FROM {TABLE} JOIN {events} e ON e.id = {TABLE}.rowid '
+                f'WHERE {TABLE} MATCH %s {published} ORDER BY score DESC, {TABLE}.rowid LIMIT %s',
+                [MATCH_START, MATCH_STOP, MATCH_START, MATCH_STOP, query, limit]
+            )
+        return [
+            (event_id, float(rank), {'title': _highlight(title), 'description': _highlight(description)})
+            for event_id, rank, title, description in cursor.fetchall()
+        ]
+
+
+def _highlight(text):
+    # Escape the stored text first, then turn the match sentinels into tags
+    if text is None:
+        return None
+    return escape(text).replace(MATCH_START, HIGHLIGHT_START).replace(MATCH_STOP, HIGHLIGHT_STOP)
+
+
+def _fallback_search(text, limit, published_only):
+    queryset = Event.objects.filter(
+        Q(title__icontains=text) | Q(location__icontains=text) | Q(description__icontains=text)
+    )
+    if published_only:
+        queryset = queryset.filter(published=True)
+    return [(pk, 0.0, {}) for pk in queryset.order_by('start_datetime', 'id').values_list('pk', flat=True)[:limit]]
@@ -2,9 +2,13 @@ from rest_framework import serializers
 from .models import Event, SubEvent, TicketType
 
 class TicketTypeSerializer(serializers.ModelSerializer):
+    # Annotated by TicketType.objects.with_availability()
+    available_tickets = serializers.IntegerField(read_only=True)
+    
     class Meta:
         model = TicketType
         fields = '__all__'
+        read_only_fields = ('quantity_reserved',)
 
 class SubEventSerializer(serializers.ModelSerializer):
     ticket_types = TicketTypeSerializer(many=True, read_only=True)
@@ -12,21 +16,22 @@ class SubEventSerializer(serializers.ModelSerializer):
     class Meta:
         model = SubEvent
         fields = '__all__'
+        read_only_fields = ('seats_reserved',)
 
 class EventSerializer(serializers.ModelSerializer):
     sub_events = SubEventSerializer(many=True, read_only=True)
     ticket_types = TicketTypeSerializer(many=True, read_only=True)
+    # Annotated by Event.objects.with_availability()
     available_tickets = serializers.IntegerField(read_only=True)
     
     class Meta:
         model = Event
         fields = '__all__'
-        read_only_fields = ('created_by', 'slug')
-    
-    def get_available_tickets(self, obj):
-        return obj.capacity  # This would calculate actual availability
+        read_only_fields = ('created_by', 'slug', 'seats_reserved')
 
 class EventListSerializer(serializers.ModelSerializer):
+    available_tickets = serializers.IntegerField(read_only=True)
+    
     class Meta:
         model = Event
-        fields = ('id', 'title', 'slug', 'location', 'start_datetime', 'end_datetime', 'published')
\ No newline at end of file
+        fields = ('id', 'title', 'slug', 'location', 'start_datetime', 'end_datetime', 'published', 'available_tickets')
\ No newline at end of file
@@ -0,0 +1,28 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+from . import search
+from .cache import bump_catalogue_version
+from .models import Event, SubEvent, TicketType
+
+@receiver(post_save, sender=Event)
+@receiver(post_delete, sender=Event)
+def invalidate_event_catalogue(sender, instance, **kwargs):
+    bump_catalogue_version()
+
+@receiver(post_save, sender=Event)
+def index_event_for_search(sender, instance, **kwargs):
+    search.index_event(instance)
+
+@receiver(post_delete, sender=Event)
+def remove_event_from_search(sender, instance, **kwargs):
+    search.remove_event(instance.pk)
+
+@receiver(post_save, sender=SubEvent)
+@receiver(post_delete, sender=SubEvent)
+@receiver(post_save, sender=TicketType)
+@receiver(post_delete, sender=TicketType)
+def touch_parent_event(sender, instance, **kwargs):
+    # Nested rows are part of the event's representation, so they move its Last-Modified too
+    Event.objects.filter(pk=instance.event_id).update(updated_at=timezone.now())
+    bump_catalogue_version()
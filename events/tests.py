@@ -1,3 +1,87 @@
+import unittest
+from datetime import timedelta
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from reservations.tests import make_event
+from . import search
+from .models import Event
+
+
+@unittest.skipUnless(connection.vendor == 'postgresql', 'EXPLAIN output is PostgreSQL-specific')
+class ListingPlanTests(TestCase):
+    """The public listing and its date filters must page through a composite index, with no sort."""
+
+    # Enough events that the planner prefers an index on its own statistics
+    ROWS = 100_000
+
+    @classmethod
+    def setUpTestData(cls):
+        admin, _, _ = make_event()
+        start = timezone.now() + timedelta(days=1)
+        Event.objects.bulk_create((
+            Event(title=f'Event {index}', slug=f'event-{index}', description='-', location='Cape Town',
+                  address='1 Main', capacity=10, start_datetime=start + timedelta(minutes=5 * index),
+                  end_datetime=start + timedelta(minutes=5 * index + 180), published=bool(index % 4),
+                  created_by=admin)
+            for index in range(cls.ROWS)
+        ), batch_size=10000)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE events_event')
+
+    def plans(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as captured:
+            self.assertEqual(APIClient().get(url).status_code, 200)
+        plans = []
+        with connection.cursor() as cursor:
+            for query in captured.captured_queries:
+                cursor.execute('EXPLAIN ' + query['sql'])
+                plans.append('\n'.join(row[0] for row in cursor.fetchall()))
+        return plans
+
+    def test_listing_reads_an_index_in_order(self):
+        scans = [f'Index Scan using {index.name} ' for index in Event._meta.indexes]
+        day = (timezone.now() + timedelta(days=2)).date()
+        for url in ['/api/events/events/', f'/api/events/events/?start_date={day}&end_date={day + timedelta(days=3)}']:
+            count, page = self.plans(url)
+            self.assertEqual(count.count('Aggregate'), 1, count)
+            self.assertTrue(any(scan in page for scan in scans), page)
+            self.assertNotIn('Sort', page, page)
+            self.assertNotIn('HashAggregate', page, page)
+
+
+@unittest.skipIf(search.backend() is None, 'No full-text index on this database')
+class SearchHighlightTests(TestCase):
+    def test_highlights_escape_event_text(self):
+        admin, event, _ = make_event()
+        event.title = 'Jazz <script>alert(1)</script> night'
+        event.description = 'Fish & chips, then <b onmouseover="x()">jazz</b> until late'
+        event.save()
+
+        [(event_id, _, highlight)] = search.search('jazz')
+
+        self.assertEqual(event_id, event.pk)
+        self.assertIn('<mark>Jazz</mark>', highlight['title'])
+        for text in highlight.values():
+            markup = text.replace(search.HIGHLIGHT_START, '').replace(search.HIGHLIGHT_STOP, '')
+            self.assertNotIn('<', markup, text)
+            self.assertNotIn(search.MATCH_START, text)
+        self.assertIn('&amp;', highlight['description'])
+
 
-# Create your tests here.
+class MetricsOverheadTests(TestCase):
+    def test_metrics_benchmark(self):
+        # The full run is `manage.py benchmark_metrics` (10 blocks of 300 requests per setting)
+        out = StringIO()
+        call_command('benchmark_metrics', events=5, blocks=2, requests=10, max_overhead_percent=100, stdout=out)
+        self.assertIn('(20 requests each)', out.getvalue())
+        self.assertIn('Metrics hooks:', out.getvalue())
+        self.assertFalse(Event.objects.filter(title__startswith='Metrics benchmark').exists())
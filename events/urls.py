@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from . import views
+from . import async_views, views
 
 router = DefaultRouter()
 router.register(r'events', views.EventViewSet)
@@ -8,5 +8,9 @@ router.register(r'sub-events', views.SubEventViewSet)
 router.register(r'ticket-types', views.TicketTypeViewSet)
 
 urlpatterns = [
+    # Async (ASGI) read-only catalogue
+    path('async/events/', async_views.event_list, name='async-event-list'),
+    path('async/events/<slug:slug>/', async_views.event_detail, name='async-event-detail'),
+
     path('', include(router.urls)),
 ]
\ No newline at end of file
@@ -1,11 +1,44 @@
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.exceptions import ValidationError
+from rest_framework.renderers import JSONRenderer
 from django_filters.rest_framework import DjangoFilterBackend
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Prefetch
 from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.dateparse import parse_date
+from django.utils.http import http_date
+from datetime import datetime, time, timedelta
+from . import search as event_search
+from .cache import catalogue_key, build_entry, build_feed_entry
 from .models import Event, SubEvent, TicketType
 from .serializers import EventSerializer, EventListSerializer, SubEventSerializer, TicketTypeSerializer
 from users.permissions import IsAdminUserForCRUD
+from reservations.services import CalendarService
+from config.renderers import ICalendarRenderer
+
+# Upper bound on ?limit= for event search
+MAX_SEARCH_RESULTS = 100
+
+
+def day_start(params, name, next_day=False):
+    """Midnight (in the site timezone) starting the requested day, or the day after it."""
+    value = params.get(name)
+    if not value:
+        return None
+    try:
+        day = parse_date(value)
+    except ValueError:
+        day = None
+    if day is None:
+        raise ValidationError({name: 'Expected a date (YYYY-MM-DD).'})
+    if next_day:
+        day += timedelta(days=1)
+    return timezone.make_aware(datetime.combine(day, time.min))
+
 
 class EventViewSet(viewsets.ModelViewSet):
     queryset = Event.objects.filter(published=True)
@@ -16,41 +49,141 @@ class EventViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAdminUserForCRUD]
     
     def get_serializer_class(self):
-        if self.action == 'list':
+        if self.action in ('list', 'search'):
             return EventListSerializer
         return EventSerializer
     
     def get_queryset(self):
-        queryset = Event.objects.all()
+        # Availability is aggregated in the same query as the events themselves
+        queryset = Event.objects.with_availability()
+        if self.action == 'calendar_events':
+            # The feed only needs the sub-events, not availability
+            queryset = Event.objects.prefetch_related(
+                Prefetch('sub_events', queryset=SubEvent.objects.order_by('start_datetime', 'pk'))
+            )
+        elif self.action not in ('list', 'search'):
+            # Detail nests sub-events and ticket types: one query per level instead of per row
+            ticket_types = TicketType.objects.with_availability()
+            queryset = queryset.prefetch_related(
+                Prefetch('sub_events', queryset=SubEvent.objects.prefetch_related(
+                    Prefetch('ticket_types', queryset=ticket_types)
+                )),
+                Prefetch('ticket_types', queryset=ticket_types),
+            )
+        
         if not self.request.user.is_staff:
             queryset = queryset.filter(published=True)
         
-        # Filter by date range
-        start_date = self.request.query_params.get('start_date')
-        end_date = self.request.query_params.get('end_date')
+        # Filter by date range as half-open datetime bounds, so the column stays index-usable
+        start = self.day_start('start_date')
+        end = self.day_start('end_date', next_day=True)
+        
+        if start:
+            queryset = queryset.filter(start_datetime__gte=start)
+        if end:
+            queryset = queryset.filter(end_datetime__lt=end)
+        
+        return queryset.order_by('start_datetime', 'id')
+    
+    def day_start(self, name, next_day=False):
+        return day_start(self.request.query_params, name, next_day)
+    
+    def list(self, request, *args, **kwargs):
+        def render():
+            page = self.paginate_queryset(self.filter_queryset(self.get_queryset()))
+            data = self.get_paginated_response(self.get_serializer(page, many=True).data).data
+            return data, max((event.updated_at for event in page), default=None)
+        return self.catalogue_response(request, render)
+    
+    def retrieve(self, request, *args, **kwargs):
+        def render():
+            instance = self.get_object()
+            return self.get_serializer(instance).data, instance.updated_at
+        return self.catalogue_response(request, render)
+    
+    def catalogue_response(self, request, render):
+        """
+        Serve list/detail from the versioned catalogue cache with ETag and Last-Modified.
+        Staff see unpublished events, so their responses are never cached.
+        """
+        is_staff = request.user.is_staff
+        key = catalogue_key(self.action, request, **self.kwargs)
+        entry = None if is_staff else cache.get(key)
+        if entry is None:
+            entry = build_entry(*render())
+            if not is_staff:
+                cache.set(key, entry, settings.EVENT_CACHE_TIMEOUT)
         
-        if start_date:
-            queryset = queryset.filter(start_datetime__date__gte=start_date)
-        if end_date:
-            queryset = queryset.filter(end_datetime__date__lte=end_date)
+        response = Response(entry['data'])
+        # Strong ETag: the same data renders to the same bytes for a given renderer
+        response['ETag'] = f'"{entry["digest"][:32]}-{request.accepted_renderer.format}"'
+        if entry['last_modified'] is not None:
+            response['Last-Modified'] = http_date(entry['last_modified'])
+        patch_vary_headers(response, ('Accept', 'Authorization'))
+        if is_staff:
+            patch_cache_control(response, private=True, no_cache=True)
+        else:
+            patch_cache_control(response, public=True, max_age=0, must_revalidate=True)
         
-        return queryset
+        return get_conditional_response(
+            request,
+            etag=response['ETag'],
+            last_modified=entry['last_modified'],
+            response=response,
+        )
     
     def perform_create(self, serializer):
         serializer.save(created_by=self.request.user)
     
-    @action(detail=True, methods=['get'])
+    @action(detail=True, methods=['get'], renderer_classes=[JSONRenderer, ICalendarRenderer])
     def calendar_events(self, request, slug=None):
-        event = self.get_object()
-        # Generate ICS file or calendar links
-        return Response({'message': 'Calendar integration endpoint'})
+        """
+        Subscribable ICS feed of the event and all of its sub-events.
+        The rendered bytes sit in the versioned catalogue cache, so any Event/SubEvent change invalidates them.
+        """
+        is_staff = request.user.is_staff
+        key = catalogue_key(self.action, request, **self.kwargs)
+        entry = None if is_staff else cache.get(key)
+        if entry is None:
+            event = self.get_object()
+            entry = build_feed_entry(CalendarService.event_feed(event), event.updated_at)
+            if not is_staff:
+                cache.set(key, entry, settings.EVENT_CACHE_TIMEOUT)
+        return CalendarService.feed_response(request, entry, f'{slug}.ics', private=is_staff)
+
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """
+        Ranked full-text search over title, location and description: ?q=...&limit=20.
+        Each result carries its rank and a highlight with matches wrapped in <mark>.
+        """
+        text = request.query_params.get('q', '').strip()
+        if not text:
+            return Response({'error': 'q is required'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = min(max(int(request.query_params.get('limit', 20)), 1), MAX_SEARCH_RESULTS)
+        except ValueError:
+            return Response({'error': 'limit must be a number'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        hits = event_search.search(text, limit=limit, published_only=not request.user.is_staff)
+        events = self.get_queryset().in_bulk([event_id for event_id, _, _ in hits])
+        
+        results = []
+        for event_id, rank, highlight in hits:
+            if event_id in events:
+                data = self.get_serializer(events[event_id]).data
+                data.update(rank=rank, highlight=highlight)
+                results.append(data)
+        return Response({'count': len(results), 'results': results})
 
 class SubEventViewSet(viewsets.ModelViewSet):
-    queryset = SubEvent.objects.all()
+    queryset = SubEvent.objects.prefetch_related(
+        Prefetch('ticket_types', queryset=TicketType.objects.with_availability())
+    )
     serializer_class = SubEventSerializer
     permission_classes = [IsAdminUserForCRUD]
 
 class TicketTypeViewSet(viewsets.ModelViewSet):
-    queryset = TicketType.objects.all()
+    queryset = TicketType.objects.with_availability()
     serializer_class = TicketTypeSerializer
     permission_classes = [IsAdminUserForCRUD]
@@ -0,0 +1,65 @@
+"""
+Gunicorn settings for the Procfile's web process.
+
+SERVER_INTERFACE picks what that process serves:
+
+  wsgi (default)  config.wsgi on sync workers, for the DRF API
+  asgi            config.asgi on uvicorn event-loop workers, for the async read
+                  paths (the /async/ routes)
+
+Platforms like Heroku and Render only route public traffic to `web`, so run the
+ASGI interface as its own service with SERVER_INTERFACE=asgi and send the /async/
+paths to it from the proxy in front. Under ASGI every sync view in a process
+shares one thread, so the DRF API should stay on a wsgi service.
+"""
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+# Platform-provided port (Render/Heroku), 8000 locally
+port = os.environ.get('PORT', '8000')
+bind = f'0.0.0.0:{port}'
+
+# wsgi or asgi, see above
+interface = os.environ.get('SERVER_INTERFACE', 'wsgi')
+wsgi_app = f'config.{interface}:application'
+if interface == 'asgi':
+    worker_class = 'uvicorn_worker.UvicornWorker'
+
+# Process count. Without WEB_CONCURRENCY it follows the CPU count but is capped: in a container
+# cpu_count() reports the host's CPUs, not the limit, and every worker holds its own copy of the app.
+# One uvicorn worker holds thousands of idle connections on its own, so asgi needs fewer
+MAX_DEFAULT_WORKERS = {'wsgi': 4, 'asgi': 2}
+if 'WEB_CONCURRENCY' in os.environ:
+    workers = int(os.environ['WEB_CONCURRENCY'])
+else:
+    workers = min(multiprocessing.cpu_count() * 2 + 1, MAX_DEFAULT_WORKERS.get(interface, 4))
+
+# Seconds a worker may spend on one request before it is restarted
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '30'))
+
+# Seconds an idle keep-alive connection stays open
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', '5'))
+
+# Log to stdout/stderr for the platform's log collector
+accesslog = '-'
+errorlog = '-'
+
+# Workers write their Prometheus samples here and /metrics sums them (see config/metrics.py).
+# Set before the app is imported; one directory per port so a wsgi and an asgi service never share one.
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), f'prometheus-{port}'))
+
+
+def on_starting(server):
+    # Samples left by a previous master would be summed into this one's
+    path = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path, exist_ok=True)
+
+
+def child_exit(server, worker):
+    # Drop the dead worker's live gauges (in-flight requests); its counters keep counting
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
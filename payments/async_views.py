@@ -0,0 +1,16 @@
+"""Async read-only view of the active banking details shown on the public reservation page."""
+from django.http import Http404, JsonResponse
+from django.views.decorators.http import require_safe
+
+from config.pagination import apaginate
+from .models import BankingDetail
+from .serializers import BankingDetailSerializer
+
+
+@require_safe
+async def banking_details(request):
+    try:
+        details, links = await apaginate(request, BankingDetail.objects.filter(is_active=True).order_by('id'))
+    except Http404 as exc:
+        return JsonResponse({'error': str(exc)}, status=404)
+    return JsonResponse({**links, 'results': BankingDetailSerializer(details, many=True).data})
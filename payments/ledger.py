@@ -0,0 +1,114 @@
+"""
+Keeps Reservation.amount_paid and status in step with the reservation's completed payments.
+
+Single payment changes are applied as a delta in one UPDATE that also derives the new
+status, so concurrent approvals never read-modify-write the reservation row.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from decimal import Decimal
+
+from django.db import models, transaction
+from django.db.models import Case, F, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.db.models.lookups import GreaterThan, GreaterThanOrEqual
+
+from reservations.models import Reservation
+from reservations.signals import statuses_changed
+from .models import Payment
+
+# Reservation ids touched while updates are suspended; None when not suspended
+_deferred = ContextVar('payments_ledger_deferred', default=None)
+
+AMOUNT_FIELD = models.DecimalField(max_digits=10, decimal_places=2)
+
+
+def _status_for(paid):
+    # 1. Reservations that left the flow keep their status. An expired one gave its stock
+    #    back, so money alone must not make it a holding status again; it is re-held
+    #    explicitly (see ReservationViewSet.upload_payment_proof) before moving on
+    # 2. Fully paid -> completed
+    # 3. Anything paid -> confirmed (secures the spot even below the reservation fee)
+    # 4. Nothing paid -> back to reserved
+    return Case(
+        When(status__in=('cancelled', 'attended', 'expired'), then=F('status')),
+        When(GreaterThanOrEqual(paid, F('total_amount')), then=Value('completed')),
+        When(GreaterThan(paid, 0), then=Value('confirmed')),
+        default=Value('reserved'),
+    )
+
+
+def _locked_statuses(reservation_ids):
+    return {
+        pk: (reserved_at, status) for pk, reserved_at, status in Reservation.objects.select_for_update()
+        .filter(pk__in=reservation_ids).order_by('pk').values_list('pk', 'reserved_at', 'status')
+    }
+
+
+def _status_changes(before):
+    """(reserved_at, old status, new status) for every locked row whose status the UPDATEs moved."""
+    after = dict(Reservation.objects.filter(pk__in=before).values_list('pk', 'status'))
+    return [
+        (reserved_at, status, after[pk])
+        for pk, (reserved_at, status) in before.items() if after.get(pk, status) != status
+    ]
+
+
+def apply_payment_delta(reservation_id, delta):
+    if not delta:
+        return
+    
+    deferred = _deferred.get()
+    if deferred is not None:
+        deferred.add(reservation_id)
+        return
+    
+    # Both SET clauses see the pre-update amount_paid, so status follows the new balance
+    paid = F('amount_paid') + Value(Decimal(delta), output_field=AMOUNT_FIELD)
+    with transaction.atomic():
+        before = _locked_statuses([reservation_id])
+        Reservation.objects.filter(pk=reservation_id).update(
+            amount_paid=paid,
+            status=_status_for(paid),
+        )
+        changes = _status_changes(before)
+    if changes:
+        statuses_changed.send(sender=Reservation, changes=changes)
+
+
+def recalculate_balances(reservation_ids):
+    """Recompute amount_paid and status from scratch for many reservations in two UPDATEs."""
+    reservation_ids = list(set(reservation_ids))
+    if not reservation_ids:
+        return
+    
+    completed_total = Payment.objects.filter(
+        reservation=OuterRef('pk'), status='completed'
+    ).order_by().values('reservation').annotate(total=Sum('amount')).values('total')
+    
+    with transaction.atomic():
+        before = _locked_statuses(reservation_ids)
+        reservations = Reservation.objects.filter(pk__in=reservation_ids)
+        reservations.update(amount_paid=Coalesce(
+            Subquery(completed_total, output_field=AMOUNT_FIELD),
+            Value(Decimal('0.00'), output_field=AMOUNT_FIELD),
+        ))
+        reservations.update(status=_status_for(F('amount_paid')))
+        changes = _status_changes(before)
+    if changes:
+        statuses_changed.send(sender=Reservation, changes=changes)
+
+
+@contextmanager
+def suspended():
+    """
+    Defer ledger updates from Payment signals, e.g. while importing payments one save at a time.
+    Every reservation touched inside the block is recalculated in one set-based pass on exit.
+    """
+    affected = set()
+    token = _deferred.set(affected)
+    try:
+        yield affected
+    finally:
+        _deferred.reset(token)
+    recalculate_balances(affected)
@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
 
 class Payment(models.Model):
@@ -26,9 +26,24 @@ class Payment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    class Meta:
+        indexes = [
+            # Range scans for stats/reports: status='completed' AND paid_at in [from, to)
+            models.Index(fields=['status', 'paid_at']),
+            # Keyset pagination seeks on (created_at, id)
+            models.Index(fields=['created_at', 'id']),
+        ]
+    
     def __str__(self):
         return f"Payment {self.transaction_reference} - {self.amount} {self.currency}"
     
+    def save(self, *args, **kwargs):
+        # The row and the ledger delta its signals apply commit together, and the previous
+        # state is read under a row lock (payments.signals): concurrent saves of one payment
+        # take turns, each working from what the other wrote
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+    
     def mark_as_completed(self, transaction_ref=None):
         self.status = 'completed'
         self.paid_at = timezone.now()
@@ -1,39 +1,51 @@
-from django.db.models.signals import post_save, post_delete
-from django.dispatch import receiver
-from django.db.models import Sum
+from decimal import Decimal
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import Signal, receiver
+from . import ledger
 from .models import Payment
 
+# Sent with `payments` after Payment.objects.bulk_create, which skips post_save.
+# The sender is responsible for the ledger (ledger.recalculate_balances); receivers
+# only need to account for the new rows.
+payments_created = Signal()
+
+@receiver(pre_save, sender=Payment)
+def remember_previous_state(sender, instance, **kwargs):
+    # Lets post_save receivers work out what an update changed. Locked until Payment.save's
+    # transaction ends, so two saves can never both start from the same previous state
+    instance._previous_state = None
+    if not instance._state.adding:
+        instance._previous_state = Payment.objects.select_for_update().filter(pk=instance.pk).values(
+            'reservation_id', 'status', 'amount', 'payment_method', 'paid_at', 'created_at'
+        ).first()
+
+def _completed_amount(state):
+    if not state or state['status'] != 'completed':
+        return 0
+    return Decimal(str(state['amount']))
+
 @receiver(post_save, sender=Payment)
-@receiver(post_delete, sender=Payment)
 def update_reservation_payment_status(sender, instance, **kwargs):
-    reservation = instance.reservation
+    previous = getattr(instance, '_previous_state', None)
+    current = {
+        'reservation_id': instance.reservation_id,
+        'status': instance.status,
+        'amount': instance.amount,
+    }
     
-    # Calculate total paid amount from all COMPLETED payments
-    total_paid = reservation.payments.filter(status='completed').aggregate(
-        total=Sum('amount')
-    )['total'] or 0
-    
-    reservation.amount_paid = total_paid
-    
-    # Determine Status
-    # 1. If fully paid
-    if reservation.amount_paid >= reservation.total_amount:
-        reservation.status = 'completed'
-    
-    # 2. If partially paid (at least deposit coverage)
-    elif reservation.amount_paid > 0:
-        # Check if it meets reservation fee requirement
-        deposit_req = reservation.ticket_type.reservation_fee * reservation.quantity
-        if reservation.amount_paid >= deposit_req:
-            reservation.status = 'confirmed'
-        else:
-            # Paid something but less than deposit? Still technically confirmed as a spot holder?
-            # Or keep as 'reserved' but with money paid? 
-            # Let's stick to confirmed for any significant payment to secure spot
-            reservation.status = 'confirmed'
-            
-    # 3. If nothing paid (and not cancelled)
-    elif reservation.status not in ['cancelled', 'attended']:
-        reservation.status = 'reserved'
+    # Only the change in completed money moves the balance; no re-summing of every payment
+    if previous and previous['reservation_id'] != instance.reservation_id:
+        ledger.apply_payment_delta(previous['reservation_id'], -_completed_amount(previous))
+        ledger.apply_payment_delta(instance.reservation_id, _completed_amount(current))
+    else:
+        ledger.apply_payment_delta(
+            instance.reservation_id,
+            _completed_amount(current) - _completed_amount(previous),
+        )
 
-    reservation.save()
\ No newline at end of file
+@receiver(post_delete, sender=Payment)
+def release_deleted_payment(sender, instance, **kwargs):
+    ledger.apply_payment_delta(instance.reservation_id, -_completed_amount({
+        'status': instance.status,
+        'amount': instance.amount,
+    }))
@@ -1,3 +1,104 @@
-from django.test import TestCase
+import threading
+from datetime import timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from django.core.management import call_command
+from django.db import close_old_connections, connection
+from django.test import TestCase, TransactionTestCase, skipUnlessDBFeature
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from events.models import Event, TicketType
+from reservations.models import Reservation
+from reservations.tests import make_event
+from .models import Payment
+
+
+class ExpiredReservationPaymentTests(TestCase):
+    def book(self, ticket_type, index):
+        return APIClient().post('/api/reservations/reservations/', {
+            'ticket_type': ticket_type.pk, 'quantity': 1, 'guest_email': f'guest{index}@example.com',
+        })
+
+    def test_payment_does_not_revive_an_expired_reservation(self):
+        _, event, ticket_type = make_event(capacity=5)
+        for index in range(5):
+            self.assertEqual(self.book(ticket_type, index).status_code, 201)
+
+        reservation = Reservation.objects.filter(ticket_type=ticket_type).first()
+        Reservation.objects.filter(pk=reservation.pk).update(expires_at=timezone.now() - timedelta(minutes=1))
+        call_command('expire_reservations', stdout=open('/dev/null', 'w'))
+
+        Payment.objects.create(reservation=reservation, amount=reservation.total_amount, status='completed',
+                               payment_method='bank_transfer', paid_at=timezone.now())
+
+        reservation.refresh_from_db()
+        self.assertEqual(reservation.status, 'expired')
+        self.assertEqual(reservation.amount_paid, Decimal(reservation.total_amount))
+        self.assertEqual(TicketType.objects.get(pk=ticket_type.pk).quantity_reserved, 4)
+
+        # The freed seat can be sold exactly once more
+        self.assertEqual(self.book(ticket_type, 5).status_code, 201)
+        self.assertEqual(self.book(ticket_type, 6).status_code, 400)
+        holding = Reservation.objects.filter(ticket_type=ticket_type, status__in=Reservation.HOLDING_STATUSES)
+        self.assertEqual(sum(holding.values_list('quantity', flat=True)), 5)
+        self.assertEqual(Event.objects.get(pk=event.pk).seats_reserved, 5)
+
+
+class QueryBudgetTests(TestCase):
+    """PaymentViewSet joins the reservation, ticket type and event up front: one query per page or row."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = None
+        for index in range(3):
+            admin, _, ticket_type = make_event(title=f'Gala {index}')
+            cls.admin = cls.admin or admin
+            reservation = Reservation.objects.create(ticket_type=ticket_type, quantity=1, total_amount=100,
+                                                     guest_email=f'guest{index}@example.com')
+            cls.payment = Payment.objects.create(reservation=reservation, amount=100, status='completed',
+                                                 payment_method='cash', paid_at=timezone.now())
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_payment_list_and_retrieve(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(len(self.client.get('/api/payments/payments/').data['results']), 3)
+        with self.assertNumQueries(2):
+            self.client.get('/api/payments/payments/?page=1')
+        with self.assertNumQueries(1):
+            self.client.get(f'/api/payments/payments/{self.payment.pk}/')
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class ConcurrentPaymentTests(TransactionTestCase):
+    def test_racing_completions_credit_the_reservation_once(self):
+        admin, _, ticket_type = make_event()
+        reservation = Reservation.objects.create(ticket_type=ticket_type, quantity=2, total_amount=200,
+                                                 guest_email='guest@example.com')
+        payment = Payment.objects.create(reservation=reservation, amount=100, payment_method='cash')
+        start = threading.Barrier(8)
+        results = []
+
+        def complete():
+            try:
+                client = APIClient()
+                client.force_authenticate(admin)
+                start.wait()
+                results.append(client.post(f'/api/payments/payments/{payment.pk}/mark-completed/').status_code)
+            finally:
+                close_old_connections()
+                connection.close()
+
+        threads = [threading.Thread(target=complete) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        reservation.refresh_from_db()
+        self.assertEqual(results, [200] * 8)
+        self.assertEqual(reservation.amount_paid, Decimal('100.00'))
+        self.assertEqual(reservation.status, 'confirmed')
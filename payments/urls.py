@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import async_views, views
 
 urlpatterns = [
     # Payment endpoints
@@ -23,6 +23,10 @@ urlpatterns = [
         'get': 'stats'
     }), name='payment-stats'),
     
+    path('payments/export/', views.PaymentViewSet.as_view({
+        'get': 'export'
+    }), name='payment-export'),
+    
     # Refund endpoints
     path('refunds/', views.RefundViewSet.as_view({
         'get': 'list',
@@ -60,4 +64,7 @@ urlpatterns = [
         'patch': 'partial_update',
         'delete': 'destroy'
     }), name='banking-detail-detail'),
+
+    # Async (ASGI) read-only banking details
+    path('async/banking-details/', async_views.banking_details, name='async-banking-details'),
 ]
\ No newline at end of file
@@ -1,93 +1,76 @@
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.exceptions import ValidationError
 from django.conf import settings
-from django.core.files.storage import default_storage
-from django.core.files.base import ContentFile
-import os
-import uuid
+from django.core.cache import cache
+import hashlib
 
-from reservations.models import PaymentProof
+from reservations.models import PaymentProof, Reservation
+from reservations.uploads import UploadError, receive_payment_proof
 from reservations.serializers import PaymentProofSerializer
 
-from django.db.models import Sum, Count
+from django.db.models import Sum, Count, F, Q
+from django.db.models.functions import TruncDate, TruncWeek
 from django.utils import timezone
 from datetime import timedelta
+from analytics.models import DailyStat
 from .models import Payment, Refund, BankingDetail
 from .serializers import PaymentSerializer, RefundSerializer, BankingDetailSerializer
+from config.pagination import KeysetPagination
+from config.exports import filter_export, parse_bound, stream_export
 
 class PaymentProofViewSet(viewsets.ModelViewSet):
+    """
+    Query budget: list 2 (COUNT + page), retrieve 1.
+    PaymentProofSerializer only reads foreign key ids, so no joins are needed.
+    """
     serializer_class = PaymentProofSerializer
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
+        queryset = PaymentProof.objects.order_by('-uploaded_at')
         if self.request.user.is_staff:
-            return PaymentProof.objects.all()
-        return PaymentProof.objects.filter(uploaded_by=self.request.user)
+            return queryset
+        return queryset.filter(uploaded_by=self.request.user)
     
     def perform_create(self, serializer):
         serializer.save(uploaded_by=self.request.user)
     
     @action(detail=False, methods=['post'])
     def upload_for_reservation(self, request):
-        reservation_id = request.data.get('reservation_id')
-        file = request.FILES.get('file')
-        
-        if not file:
-            return Response(
-                {'error': 'No file provided'}, 
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        # Validate file type
-        allowed_types = settings.ALLOWED_FILE_TYPES
-        if file.content_type not in allowed_types:
-            return Response(
-                {'error': f'File type not allowed. Allowed types: {", ".join(allowed_types)}'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        # Validate file size
-        if file.size > settings.MAX_UPLOAD_SIZE:
-            return Response(
-                {'error': f'File too large. Maximum size: {settings.MAX_UPLOAD_SIZE / 1024 / 1024}MB'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
+        def fields(data):
+            reservation_id = data.get('reservation_id')
+            if not str(reservation_id).isdigit() or not Reservation.objects.filter(pk=reservation_id).exists():
+                raise UploadError('Reservation not found', status.HTTP_404_NOT_FOUND)
+            return {'reservation_id': int(reservation_id), 'uploaded_by': request.user}
         
         try:
-            # Generate unique filename
-            file_extension = os.path.splitext(file.name)[1]
-            filename = f"payment_proofs/{uuid.uuid4()}{file_extension}"
-            
-            # Save file
-            saved_path = default_storage.save(filename, ContentFile(file.read()))
-            file_url = default_storage.url(saved_path)
-            
-            # Create payment proof record
-            payment_proof = PaymentProof.objects.create(
-                reservation_id=reservation_id,
-                uploaded_by=request.user,
-                file=saved_path
-            )
-            
-            serializer = self.get_serializer(payment_proof)
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
-            
-        except Exception as e:
-            return Response(
-                {'error': str(e)},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
+            payment_proof, created = receive_payment_proof(request, fields)
+        except UploadError as e:
+            return Response({'error': e.message}, status=e.status_code)
+        
+        # The same bytes already sent for this reservation: hand back the proof under review
+        if not created:
+            return Response({**self.get_serializer(payment_proof).data, 'duplicate': True})
+        return Response(self.get_serializer(payment_proof).data, status=status.HTTP_201_CREATED)
 
 class PaymentViewSet(viewsets.ModelViewSet):
+    """
+    Query budget: list 1 (one joined keyset page; 2 with ?page=), retrieve 1.
+    PaymentSerializer reads reservation and reservation.ticket_type.event.
+    """
     serializer_class = PaymentSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
+    cursor_ordering = ('-created_at', '-id')
     
     def get_queryset(self):
+        queryset = Payment.objects.select_related('reservation__ticket_type__event').order_by('-created_at')
         if self.request.user.is_staff:
-            return Payment.objects.all()
+            return queryset
         # Users can only see payments for their own reservations
-        return Payment.objects.filter(reservation__user=self.request.user)
+        return queryset.filter(reservation__user=self.request.user)
     
     queryset = Payment.objects.all()
     
@@ -104,46 +87,109 @@ class PaymentViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(payment)
         return Response(serializer.data)
     
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """
+        Stream payments as CSV or NDJSON (admin only).
+        Filters: `event`, `status` (comma-separated), `from`/`to` on created_at, `type` (csv/ndjson).
+        """
+        if not request.user.is_staff:
+            return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
+        
+        queryset = filter_export(
+            Payment.objects.order_by('created_at', 'id'), request,
+            event_field='reservation__ticket_type__event_id', date_field='created_at'
+        )
+        return stream_export(request, queryset, [
+            ('id', 'id'),
+            ('reservation', 'reservation__reference_code'),
+            ('event', 'reservation__ticket_type__event__title'),
+            ('ticket_type', 'reservation__ticket_type__name'),
+            ('amount', 'amount'),
+            ('currency', 'currency'),
+            ('status', 'status'),
+            ('payment_method', 'payment_method'),
+            ('transaction_reference', 'transaction_reference'),
+            ('paid_at', 'paid_at'),
+            ('created_at', 'created_at'),
+        ], 'payments')
+    
     @action(detail=False, methods=['get'])
     def stats(self, request):
-        """Get payment statistics (admin only)"""
+        """
+        Get payment statistics (admin only).
+        Optional `from`/`to` (date or datetime) and `group_by` (day/week/method) add an ad-hoc report.
+        """
         if not request.user.is_staff:
             return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
         
-        # Today's stats
-        today = timezone.now().date()
-        today_payments = Payment.objects.filter(paid_at__date=today, status='completed')
+        params = sorted(request.query_params.lists())
+        cache_key = 'payments:stats:' + hashlib.sha256(repr(params).encode()).hexdigest()
+        stats = cache.get(cache_key)
+        if stats is None:
+            stats = self.build_stats(request)
+            cache.set(cache_key, stats, settings.PAYMENT_STATS_CACHE_TIMEOUT)
         
-        # This week stats
-        week_ago = today - timedelta(days=7)
-        week_payments = Payment.objects.filter(paid_at__date__gte=week_ago, status='completed')
+        return Response(stats)
+    
+    def build_stats(self, request):
+        today = timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0)
+        windows = {
+            'today': today,
+            'this_week': today - timedelta(days=7),
+            'this_month': today - timedelta(days=30),
+        }
         
-        # This month stats
-        month_ago = today - timedelta(days=30)
-        month_payments = Payment.objects.filter(paid_at__date__gte=month_ago, status='completed')
+        # One pass over the widest window; narrower windows are conditional aggregates
+        aggregates = {}
+        for name, start in windows.items():
+            aggregates[f'{name}_count'] = Count('id', filter=Q(paid_at__gte=start))
+            aggregates[f'{name}_amount'] = Sum('amount', filter=Q(paid_at__gte=start))
+        totals = Payment.objects.filter(
+            status='completed', paid_at__gte=windows['this_month']
+        ).aggregate(**aggregates)
         
         stats = {
-            'today': {
-                'count': today_payments.count(),
-                'amount': today_payments.aggregate(total=Sum('amount'))['total'] or 0
-            },
-            'this_week': {
-                'count': week_payments.count(),
-                'amount': week_payments.aggregate(total=Sum('amount'))['total'] or 0
-            },
-            'this_month': {
-                'count': month_payments.count(),
-                'amount': month_payments.aggregate(total=Sum('amount'))['total'] or 0
-            },
-            'payment_methods': Payment.objects.filter(status='completed').values(
-                'payment_method'
-            ).annotate(
-                count=Count('id'),
-                total=Sum('amount')
-            )
+            name: {
+                'count': totals[f'{name}_count'],
+                'amount': totals[f'{name}_amount'] or 0
+            }
+            for name in windows
         }
+        # Lifetime split by method comes from the daily rollups rather than a full table scan
+        stats['payment_methods'] = list(DailyStat.objects.filter(metric='payments').values(
+            payment_method=F('key')
+        ).annotate(
+            count=Sum('total_count'),
+            total=Sum('total_amount')
+        ).order_by('payment_method'))
         
-        return Response(stats)
+        if {'from', 'to', 'group_by'} & set(request.query_params):
+            stats['report'] = self.build_report(request, today)
+        return stats
+    
+    def build_report(self, request, today):
+        start = parse_bound(request, 'from') or today - timedelta(days=30)
+        end = parse_bound(request, 'to', end=True) or timezone.now()
+        if start >= end:
+            raise ValidationError({'from': '`from` must be earlier than `to`.'})
+        
+        group_by = request.query_params.get('group_by', 'day')
+        periods = {'day': TruncDate('paid_at'), 'week': TruncWeek('paid_at')}
+        queryset = Payment.objects.filter(status='completed', paid_at__gte=start, paid_at__lt=end)
+        if group_by == 'method':
+            queryset = queryset.values('payment_method').order_by('payment_method')
+        elif group_by in periods:
+            queryset = queryset.annotate(period=periods[group_by]).values('period').order_by('period')
+        else:
+            raise ValidationError({'group_by': 'Must be one of: day, week, method.'})
+        
+        return {
+            'from': start,
+            'to': end,
+            'group_by': group_by,
+            'rows': list(queryset.annotate(count=Count('id'), total=Sum('amount'))),
+        }
 
 class RefundViewSet(viewsets.ModelViewSet):
     serializer_class = RefundSerializer
@@ -0,0 +1,19 @@
+"""Async lookup of a single reservation by its reference code, for ASGI workers."""
+from django.http import JsonResponse
+from django.views.decorators.cache import never_cache
+from django.views.decorators.http import require_safe
+
+from .models import Reservation
+from .serializers import ReservationSerializer
+
+
+@require_safe
+@never_cache
+async def reservation_lookup(request, reference_code):
+    # ReservationSerializer reads ticket_type and ticket_type.event: join both in the one query
+    queryset = Reservation.objects.select_related('ticket_type__event')
+    try:
+        reservation = await queryset.aget(reference_code=reference_code)
+    except Reservation.DoesNotExist:
+        return JsonResponse({'error': 'Reservation not found'}, status=404)
+    return JsonResponse(ReservationSerializer(reservation).data)
@@ -0,0 +1,114 @@
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import Reservation
+from .signals import statuses_changed
+
+# Statuses that admit the guest at the door
+ADMITTED_STATUSES = ('confirmed', 'completed')
+
+
+class CheckInService:
+    """
+    Door check-in by reference code.
+
+    Each worker keeps an in-process map of reference code -> reservation id
+    per event, loaded in one query on the first scan and topped up on misses.
+    The map only saves lookups: the event, status, quantity and ticket type are
+    read from the locked rows, and a saved reservation drops its code from the
+    map. Admission is a conditional UPDATE from confirmed/completed to attended,
+    so a re-scan is a no-op.
+    """
+
+    _events = OrderedDict()
+    _lock = threading.Lock()
+
+    @staticmethod
+    def warm(event_id):
+        codes = dict(Reservation.objects.filter(ticket_type__event_id=event_id).values_list('reference_code', 'pk'))
+        with CheckInService._lock:
+            CheckInService._events[event_id] = codes
+            CheckInService._events.move_to_end(event_id)
+            while len(CheckInService._events) > settings.CHECKIN_CACHE_EVENTS:
+                CheckInService._events.popitem(last=False)
+        return codes
+
+    @staticmethod
+    def forget(reference_code):
+        """Drop a code from every warm map; the next scan of it reads the database again."""
+        with CheckInService._lock:
+            for codes in CheckInService._events.values():
+                codes.pop(reference_code, None)
+
+    @staticmethod
+    def _codes(event_id):
+        with CheckInService._lock:
+            codes = CheckInService._events.get(event_id)
+            if codes is not None:
+                CheckInService._events.move_to_end(event_id)
+                return codes
+        return CheckInService.warm(event_id)
+
+    @staticmethod
+    def _resolve(event_id, codes):
+        known = CheckInService._codes(event_id)
+        missing = [code for code in codes if code not in known]
+        if missing:
+            # Booked since the map was warmed: one query for all of them
+            known.update(Reservation.objects.filter(
+                ticket_type__event_id=event_id, reference_code__in=missing
+            ).values_list('reference_code', 'pk'))
+        return {code: known[code] for code in codes if code in known}
+
+    @staticmethod
+    def check_in(event_id, codes):
+        """
+        Admit every reference code in `codes` to event `event_id`.
+        Returns one result per code, in order: checked_in, already_checked_in,
+        not_admitted (with the current status) or not_found.
+        """
+        codes = [code.strip().upper() for code in codes]
+        found = CheckInService._resolve(event_id, codes)
+
+        with transaction.atomic():
+            # 1. Lock the scanned reservations so two doors cannot both admit one booking;
+            #    a reservation moved to another event since the map was warmed is not found
+            rows = Reservation.objects.select_for_update(of=('self',)).filter(
+                pk__in=found.values(), ticket_type__event_id=event_id
+            ).values_list('pk', 'status', 'quantity', 'ticket_type__name', 'reserved_at')
+            before = {pk: (status, quantity, ticket_type, reserved_at)
+                      for pk, status, quantity, ticket_type, reserved_at in rows}
+            # 2. The one UPDATE; repeating it changes nothing
+            admitted = [pk for pk, (status, _, _, _) in before.items() if status in ADMITTED_STATUSES]
+            Reservation.objects.filter(
+                pk__in=admitted, ticket_type__event_id=event_id, status__in=ADMITTED_STATUSES
+            ).update(status='attended')
+
+        if admitted:
+            statuses_changed.send(sender=Reservation, changes=[
+                (before[pk][3], before[pk][0], 'attended') for pk in admitted
+            ])
+
+        results = []
+        admitted = set(admitted)
+        for code in codes:
+            pk = found.get(code)
+            result = {'reference_code': code}
+            if pk not in before:
+                result['result'] = 'not_found'
+                results.append(result)
+                continue
+            status, quantity, ticket_type, _ = before[pk]
+            if pk in admitted:
+                admitted.discard(pk)
+                result.update(result='checked_in', quantity=quantity, ticket_type=ticket_type)
+            elif status == 'attended' or status in ADMITTED_STATUSES:
+                # Scanned earlier, or twice in this batch
+                result.update(result='already_checked_in', quantity=quantity, ticket_type=ticket_type)
+            else:
+                result.update(result='not_admitted', status=status)
+            results.append(result)
+        return results
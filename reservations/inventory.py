@@ -0,0 +1,137 @@
+import logging
+from collections import defaultdict
+
+from django.db import models, transaction
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from events.models import Event, SubEvent, TicketType
+
+logger = logging.getLogger(__name__)
+
+
+class InsufficientInventory(Exception):
+    """Raised when a hold would take an event, sub-event or ticket type past its limit."""
+
+
+class InventoryService:
+    """
+    Holds and releases ticket stock with conditional single-statement UPDATEs.
+
+    Each level (event, sub-event, ticket type) is only incremented when the new
+    total still fits its limit, so the database row lock taken by the UPDATE is
+    the only serialization point. Levels are always touched in the same order to
+    keep concurrent bookers from deadlocking each other.
+    """
+
+    @staticmethod
+    def _levels(ticket_type):
+        levels = [(Event, ticket_type.event_id, 'seats_reserved', 'capacity')]
+        if ticket_type.sub_event_id:
+            levels.append((SubEvent, ticket_type.sub_event_id, 'seats_reserved', 'capacity'))
+        levels.append((TicketType, ticket_type.pk, 'quantity_reserved', 'quantity_available'))
+        return levels
+
+    @staticmethod
+    def hold(ticket_type, quantity):
+        with transaction.atomic():
+            for model, pk, counter, limit in InventoryService._levels(ticket_type):
+                updated = model.objects.filter(
+                    pk=pk, **{f'{counter}__lte': F(limit) - quantity}
+                ).update(**{counter: F(counter) + quantity})
+                if not updated:
+                    # Leaving the atomic block undoes the levels already held
+                    raise InsufficientInventory(
+                        f'Not enough capacity on {model._meta.verbose_name} {pk}'
+                    )
+
+    @staticmethod
+    def _take_back(model, pk, counter, quantity):
+        updated = model.objects.filter(pk=pk, **{f'{counter}__gte': quantity}).update(
+            **{counter: F(counter) - quantity}
+        )
+        if not updated:
+            # More released than was ever held: the counter has drifted from the reservations
+            logger.warning('Releasing %d from %s %s %s would go negative; resetting it to 0 '
+                           '(run recount_inventory)', quantity, model._meta.verbose_name, pk, counter)
+            model.objects.filter(pk=pk).update(**{counter: 0})
+
+    @staticmethod
+    def release(ticket_type, quantity):
+        with transaction.atomic():
+            for model, pk, counter, _limit in InventoryService._levels(ticket_type):
+                InventoryService._take_back(model, pk, counter, quantity)
+
+    @staticmethod
+    def release_deleted(ticket_type):
+        """
+        Give the stock held through a ticket type that is being deleted back to its event and
+        sub-event; the delete cascades to its reservations without releasing them one by one.
+        """
+        from .models import Reservation
+
+        held = Reservation.objects.filter(
+            ticket_type=ticket_type, status__in=Reservation.HOLDING_STATUSES
+        ).aggregate(total=Sum('quantity'))['total']
+        if not held:
+            return
+        with transaction.atomic():
+            # The ticket type's own counter goes with its row
+            for model, pk, counter, _limit in InventoryService._levels(ticket_type)[:-1]:
+                InventoryService._take_back(model, pk, counter, held)
+
+    @staticmethod
+    def release_many(quantities):
+        """Return stock for many reservations at once; `quantities` maps ticket type id to tickets."""
+        quantities = {pk: quantity for pk, quantity in quantities.items() if quantity}
+        if not quantities:
+            return
+
+        events = defaultdict(int)
+        sub_events = defaultdict(int)
+        for row in TicketType.objects.filter(pk__in=quantities).values('pk', 'event_id', 'sub_event_id'):
+            quantity = quantities[row['pk']]
+            events[row['event_id']] += quantity
+            if row['sub_event_id']:
+                sub_events[row['sub_event_id']] += quantity
+
+        with transaction.atomic():
+            for model, counter, totals in (
+                (Event, 'seats_reserved', events),
+                (SubEvent, 'seats_reserved', sub_events),
+                (TicketType, 'quantity_reserved', quantities),
+            ):
+                for pk in sorted(totals):
+                    InventoryService._take_back(model, pk, counter, totals[pk])
+
+    @staticmethod
+    def recount(dry_run=False):
+        """
+        Reset every counter to the quantity actually held by reservations in HOLDING_STATUSES.
+        Rows are locked in hold order first, so bookings in flight finish (or wait) rather than
+        being counted twice or missed. Returns {level: rows whose counter changed}.
+        """
+        from .models import Reservation
+
+        def held(lookup):
+            return Coalesce(Subquery(
+                Reservation.objects.filter(
+                    **{lookup: OuterRef('pk')}, status__in=Reservation.HOLDING_STATUSES
+                ).order_by().values(lookup).annotate(total=Sum('quantity')).values('total'),
+                output_field=models.IntegerField(),
+            ), 0)
+
+        changed = {}
+        with transaction.atomic():
+            for model in (Event, SubEvent, TicketType):
+                list(model.objects.select_for_update().order_by('pk').values_list('pk', flat=True))
+            for model, counter, lookup in (
+                (Event, 'seats_reserved', 'ticket_type__event'),
+                (SubEvent, 'seats_reserved', 'ticket_type__sub_event'),
+                (TicketType, 'quantity_reserved', 'ticket_type'),
+            ):
+                drifted = model.objects.annotate(held=held(lookup)).exclude(**{counter: F('held')})
+                changed[model._meta.verbose_name] = drifted.count()
+                if not dry_run:
+                    model.objects.update(**{counter: held(lookup)})
+        return changed
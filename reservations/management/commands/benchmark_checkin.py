@@ -0,0 +1,101 @@
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from events.models import Event, TicketType
+from reservations.checkin import CheckInService
+from reservations.models import Reservation, generate_reservation_code
+from reservations.views import ReservationViewSet
+
+# Rows inserted per bulk_create while generating the data set
+INSERT_BATCH = 10000
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate N confirmed reservations for one event inside a transaction that is rolled back, '
+        'then admit them through the check-in endpoint: one scan per request, then again as a batch '
+        'of re-scans. Reports scans/s and the slowest single scan; fails under --min-scans-per-second.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10_000,
+                            help='Reservations to generate and scan')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Codes per request for the offline batch pass')
+        parser.add_argument('--min-scans-per-second', type=float, default=0,
+                            help='Fail when single scans are slower than this')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            staff, event_id, codes = self.generate(options['rows'])
+            single, slowest = self.scan_one_by_one(staff, event_id, codes)
+            batched = self.scan_in_batches(staff, event_id, codes, options['batch_size'])
+            # Nothing generated here outlives the benchmark
+            transaction.set_rollback(True)
+
+        self.stdout.write(
+            f'Single scans: {len(codes)} in {single:.2f}s, {len(codes) / single:.0f} scans/s, '
+            f'slowest {slowest * 1000:.1f}ms'
+        )
+        self.stdout.write(f'Batched re-scans: {len(codes)} in {batched:.2f}s, {len(codes) / batched:.0f} scans/s')
+        if len(codes) / single < options['min_scans_per_second']:
+            raise CommandError(f'Single scans ran under {options["min_scans_per_second"]} scans/s')
+
+    def generate(self, rows):
+        staff = get_user_model().objects.create_superuser(
+            email=f'checkin-benchmark-{time.time_ns()}@example.com', password=None, full_name='Check-in benchmark'
+        )
+        start = timezone.now() + timedelta(hours=1)
+        event = Event.objects.create(
+            title='Check-in benchmark', description='-', location='-', address='-', capacity=rows,
+            start_datetime=start, end_datetime=start + timedelta(hours=3), created_by=staff,
+        )
+        ticket_type = TicketType.objects.create(event=event, name='GA', price=100, quantity_available=rows)
+
+        codes = []
+        for offset in range(0, rows, INSERT_BATCH):
+            batch = [
+                Reservation(
+                    ticket_type=ticket_type, guest_email=f'guest{index}@example.com', quantity=1,
+                    reference_code=generate_reservation_code(), expires_at=start, status='confirmed',
+                    total_amount=Decimal('100.00'), amount_paid=Decimal('100.00'),
+                )
+                for index in range(offset, min(offset + INSERT_BATCH, rows))
+            ]
+            Reservation.objects.bulk_create(batch)
+            codes.extend(reservation.reference_code for reservation in batch)
+        return staff, event.pk, codes
+
+    def post(self, staff, body):
+        request = APIRequestFactory().post('/api/reservations/reservations/check-in/', body, format='json')
+        force_authenticate(request, staff)
+        return ReservationViewSet.as_view({'post': 'check_in'})(request)
+
+    def scan_one_by_one(self, staff, event_id, codes):
+        # The first scan warms this worker's code map, as it would at the door
+        CheckInService._events.pop(event_id, None)
+        slowest = 0
+        started = time.perf_counter()
+        for code in codes:
+            scanned = time.perf_counter()
+            response = self.post(staff, {'event': event_id, 'reference_code': code})
+            slowest = max(slowest, time.perf_counter() - scanned)
+            if response.data.get('result') != 'checked_in':
+                raise CommandError(f'{code} was not admitted: {response.data}')
+        return time.perf_counter() - started, slowest
+
+    def scan_in_batches(self, staff, event_id, codes, batch_size):
+        started = time.perf_counter()
+        for offset in range(0, len(codes), batch_size):
+            response = self.post(staff, {'event': event_id, 'codes': codes[offset:offset + batch_size]})
+            results = {result['result'] for result in response.data['results']}
+            if results != {'already_checked_in'}:
+                raise CommandError(f'Re-scans returned {results}')
+        return time.perf_counter() - started
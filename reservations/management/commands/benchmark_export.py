@@ -0,0 +1,97 @@
+import time
+import tracemalloc
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from events.models import Event, TicketType
+from reservations.models import Reservation, generate_reservation_code
+from reservations.views import ReservationViewSet
+
+# Rows inserted per bulk_create while generating the data set
+INSERT_BATCH = 10000
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate N reservations inside a transaction that is rolled back, stream them through '
+        'the reservations export endpoint, and fail if the peak Python memory traced while '
+        'streaming exceeds --max-peak-mb. Reports rows/s and bytes streamed.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000,
+                            help='Reservations to generate and export')
+        parser.add_argument('--type', choices=('csv', 'ndjson'), default='csv',
+                            help='Export format')
+        parser.add_argument('--max-peak-mb', type=float, default=16,
+                            help='Peak traced memory allowed while streaming the export')
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+        with transaction.atomic():
+            staff = self.generate(rows)
+            streamed, size, elapsed, peak = self.export(staff, options['type'])
+            # Nothing generated here outlives the benchmark
+            transaction.set_rollback(True)
+
+        peak_mb = peak / 1024 / 1024
+        self.stdout.write(
+            f'Exported {streamed} rows ({size / 1024 / 1024:.1f}MB {options["type"]}) in {elapsed:.1f}s, '
+            f'{streamed / elapsed:.0f} rows/s, peak traced memory {peak_mb:.1f}MB'
+        )
+        if streamed != rows:
+            raise CommandError(f'Expected {rows} rows, the export streamed {streamed}')
+        if peak_mb > options['max_peak_mb']:
+            raise CommandError(f'Peak memory {peak_mb:.1f}MB is over the {options["max_peak_mb"]}MB ceiling')
+        self.stdout.write(self.style.SUCCESS('Within the memory ceiling'))
+
+    def generate(self, rows):
+        staff = get_user_model().objects.create_superuser(
+            email=f'export-benchmark-{time.time_ns()}@example.com', password=None, full_name='Export benchmark'
+        )
+        start = timezone.now() + timedelta(days=30)
+        event = Event.objects.create(
+            title='Export benchmark', description='-', location='-', address='-', capacity=rows,
+            start_datetime=start, end_datetime=start + timedelta(hours=3), created_by=staff,
+        )
+        ticket_type = TicketType.objects.create(event=event, name='GA', price=100, quantity_available=rows)
+
+        expires_at = start - timedelta(days=1)
+        for offset in range(0, rows, INSERT_BATCH):
+            Reservation.objects.bulk_create([
+                Reservation(
+                    ticket_type=ticket_type, guest_email=f'guest{index}@example.com', quantity=1,
+                    reference_code=generate_reservation_code(), expires_at=expires_at,
+                    total_amount=Decimal('100.00'),
+                )
+                for index in range(offset, min(offset + INSERT_BATCH, rows))
+            ])
+        return staff
+
+    def export(self, staff, export_type):
+        request = APIRequestFactory().get('/api/reservations/reservations/export/', {'type': export_type})
+        force_authenticate(request, staff)
+        view = ReservationViewSet.as_view({'get': 'export'})
+
+        tracemalloc.start()
+        try:
+            started = time.perf_counter()
+            response = view(request)
+            lines = size = 0
+            for chunk in response.streaming_content:
+                lines += chunk.count(b'\n')
+                size += len(chunk)
+            elapsed = time.perf_counter() - started
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        # The CSV header is one more line than there are rows
+        streamed = lines - 1 if export_type == 'csv' else lines
+        return streamed, size, elapsed, peak
@@ -0,0 +1,57 @@
+import hashlib
+import os
+import time
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from reservations.models import PaymentProof
+from reservations.uploads import BLOB_PREFIX, blob_name, store_blob
+
+
+class Command(BaseCommand):
+    help = 'Move existing payment proof files to content-addressed storage and drop the duplicate copies'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report what would change without touching files or rows')
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        started = time.monotonic()
+        migrated = missing = 0
+        blobs = set()
+
+        # 1. Hash every legacy file once, however many rows point at it
+        legacy = PaymentProof.objects.exclude(file__startswith=BLOB_PREFIX).exclude(file='')
+        for name in legacy.values_list('file', flat=True).distinct().iterator():
+            if not default_storage.exists(name):
+                missing += 1
+                self.stderr.write(f'Missing file: {name}')
+                continue
+
+            sha256 = self.hash_file(name)
+            target = blob_name(sha256, os.path.splitext(name)[1].lower())
+            blobs.add(target)
+
+            if not dry_run:
+                # 2. Write the blob, repoint the rows, then retire the old copy
+                with default_storage.open(name, 'rb') as content:
+                    store_blob(target, content)
+                PaymentProof.objects.filter(file=name).update(file=target, sha256=sha256)
+                default_storage.delete(name)
+            migrated += 1
+
+        prefix = 'Would move' if dry_run else 'Moved'
+        self.stdout.write(
+            f'{prefix} {migrated} files into {len(blobs)} blobs '
+            f'({migrated - len(blobs)} duplicates, {missing} missing) '
+            f'in {time.monotonic() - started:.2f}s'
+        )
+
+    def hash_file(self, name):
+        digest = hashlib.sha256()
+        with default_storage.open(name, 'rb') as content:
+            for chunk in content.chunks():
+                digest.update(chunk)
+        return digest.hexdigest()
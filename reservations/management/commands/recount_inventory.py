@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from reservations.inventory import InventoryService
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute the event, sub-event and ticket type stock counters from the reservations '
+        'that currently hold tickets. Run once after deploying the counters, and any time a '
+        'release logs a negative counter.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report how many counters have drifted')
+
+    def handle(self, *args, **options):
+        changed = InventoryService.recount(dry_run=options['dry_run'])
+        verb = 'would change' if options['dry_run'] else 'changed'
+        for level, count in changed.items():
+            self.stdout.write(f'{level}: {count} counters {verb}')
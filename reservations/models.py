@@ -14,8 +14,12 @@ class Reservation(models.Model):
         ('completed', 'Completed'), # Fully Paid
         ('cancelled', 'Cancelled'),
         ('attended', 'Attended'),
+        ('expired', 'Expired'), # Unpaid past expires_at, tickets released
     ]
     
+    # Statuses that keep their tickets out of circulation
+    HOLDING_STATUSES = ('reserved', 'pending', 'confirmed', 'completed', 'attended')
+    
     user = models.ForeignKey('users.User', on_delete=models.CASCADE, null=True, blank=True)
     guest_email = models.EmailField()
     ticket_type = models.ForeignKey('events.TicketType', on_delete=models.CASCADE)
@@ -27,6 +31,27 @@ class Reservation(models.Model):
     total_amount = models.DecimalField(max_digits=10, decimal_places=2)
     amount_paid = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     
+    class Meta:
+        indexes = [
+            # Serves the expiry sweep: status='reserved' AND expires_at <= now
+            models.Index(fields=['status', 'expires_at']),
+            # Keyset pagination seeks on (reserved_at, id)
+            models.Index(fields=['reserved_at', 'id']),
+        ]
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # The status as loaded, so a later save knows which rollup row it leaves without a SELECT
+        if 'status' in field_names:
+            instance._loaded_status = values[field_names.index('status')]
+        return instance
+    
+    def refresh_from_db(self, using=None, fields=None):
+        super().refresh_from_db(using=using, fields=fields)
+        if fields is None or 'status' in fields:
+            self._loaded_status = self.status
+    
     def save(self, *args, **kwargs):
         if not self.expires_at:
             self.expires_at = timezone.now() + timezone.timedelta(hours=24)
@@ -49,6 +74,8 @@ class PaymentProof(models.Model):
     reservation = models.ForeignKey(Reservation, related_name='payment_proofs', on_delete=models.CASCADE)
     uploaded_by = models.ForeignKey('users.User', on_delete=models.SET_NULL, null=True, blank=True)
     file = models.FileField(upload_to='payment_proofs/')
+    # SHA-256 of the file contents; identical uploads share one stored blob
+    sha256 = models.CharField(max_length=64, blank=True, db_index=True, editable=False)
     uploaded_at = models.DateTimeField(auto_now_add=True)
     verification_status = models.CharField(max_length=20, choices=VERIFICATION_STATUS, default='pending')
     # New field to track declared payment amount
@@ -31,7 +31,8 @@ class ReservationSerializer(serializers.ModelSerializer):
         ticket_type = data.get('ticket_type')
         quantity = data.get('quantity', 1)
         
-        if ticket_type and quantity > ticket_type.quantity_available:
+        # Cheap early reject; InventoryService.hold is the authoritative check
+        if ticket_type and quantity > ticket_type.quantity_remaining:
             raise serializers.ValidationError('Not enough tickets available')
         
         return data
@@ -40,7 +41,8 @@ class PaymentProofSerializer(serializers.ModelSerializer):
     class Meta:
         model = PaymentProof
         fields = '__all__'
-        read_only_fields = ('uploaded_by', 'uploaded_at', 'verification_status')
+        # The file only arrives through PaymentProofUploadHandler, which checks and hashes it
+        read_only_fields = ('uploaded_by', 'uploaded_at', 'verification_status', 'file', 'sha256')
     
     def create(self, validated_data):
         if self.context['request'].user.is_authenticated:
@@ -1,30 +1,147 @@
-import uuid
-from icalendar import Calendar, Event as IcalEvent
-from datetime import datetime, timedelta
-import requests
+import logging
+import threading
+from contextlib import contextmanager
 from django.conf import settings
+from django.core import signing
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.http import HttpResponse
 from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.crypto import constant_time_compare
+from django.utils.http import http_date
 # Import NotificationLog to enable logging
 from analytics.models import NotificationLog
+from config import metrics
+
+logger = logging.getLogger(__name__)
 
 class CalendarService:
+    UID_DOMAIN = 'parliamentplating.com'
+    FEED_TOKEN_SALT = 'reservations.calendar-feed'
+    
     @staticmethod
-    def generate_ics_file(reservation):
+    def _calendar(name=None):
+        # icalendar is only needed for the ICS endpoints: import it on first use, not at worker boot
+        from icalendar import Calendar
+        
         cal = Calendar()
         cal.add('prodid', '-//Parliament of Plating//Calendar//EN')
         cal.add('version', '2.0')
+        if name:
+            cal.add('x-wr-calname', name)
+        return cal
+    
+    @staticmethod
+    def _entry(uid, summary, start, end, location='', description=''):
+        from icalendar import Event as IcalEvent
         
-        event = IcalEvent()
-        event.add('summary', reservation.ticket_type.event.title)
-        event.add('description', f'Reservation: {reservation.reference_code}')
-        event.add('dtstart', reservation.ticket_type.event.start_datetime)
-        event.add('dtend', reservation.ticket_type.event.end_datetime)
-        event.add('location', reservation.ticket_type.event.address)
-        event.add('uid', f'{reservation.reference_code}@parliamentplating.com')
+        entry = IcalEvent()
+        entry.add('summary', summary)
+        if description:
+            entry.add('description', description)
+        entry.add('dtstart', start)
+        entry.add('dtend', end)
+        entry.add('location', location)
+        entry.add('uid', f'{uid}@{CalendarService.UID_DOMAIN}')
+        return entry
+    
+    @staticmethod
+    def _add_event(cal, event, description=''):
+        """Add an event and every one of its sub-events (from the prefetch cache when present)."""
+        cal.add_component(CalendarService._entry(
+            f'event-{event.pk}', event.title, event.start_datetime, event.end_datetime,
+            event.address, description
+        ))
+        for sub_event in event.sub_events.all():
+            cal.add_component(CalendarService._entry(
+                f'sub-event-{sub_event.pk}', f'{event.title} - {sub_event.title}',
+                sub_event.start_datetime, sub_event.end_datetime, event.address
+            ))
+    
+    @staticmethod
+    def generate_ics_file(reservation):
+        # One lookup of the (select_related) event instead of one per field
+        event = reservation.ticket_type.event
+        cal = CalendarService._calendar()
+        cal.add_component(CalendarService._entry(
+            reservation.reference_code, event.title, event.start_datetime, event.end_datetime,
+            event.address, f'Reservation: {reservation.reference_code}'
+        ))
+        return cal.to_ical()
+    
+    @staticmethod
+    def event_feed(event):
+        """Subscribable feed for one event and its sub-events."""
+        cal = CalendarService._calendar(event.title)
+        CalendarService._add_event(cal, event)
+        return cal.to_ical()
+    
+    @staticmethod
+    def user_feed(reservations):
+        """
+        Subscribable feed of every event (and sub-event) the given reservations are for.
+        Reference codes stay out of it: they unlock the reservations themselves.
+        """
+        cal = CalendarService._calendar('My reservations')
+        events = {}
+        for reservation in reservations:
+            event = reservation.ticket_type.event
+            events.setdefault(event.pk, [event, 0])[1] += reservation.quantity
+        for event, tickets in events.values():
+            CalendarService._add_event(cal, event, f'Tickets: {tickets}')
+        return cal.to_ical()
+    
+    @staticmethod
+    def feed_token(user):
+        """
+        Signed, URL-safe token that lets a calendar client read one user's feed without logging in.
+        It expires after CALENDAR_FEED_TOKEN_MAX_AGE and dies with the user's calendar_feed_secret.
+        """
+        return signing.dumps([user.pk, user.calendar_feed_secret], salt=CalendarService.FEED_TOKEN_SALT)
+    
+    @staticmethod
+    def feed_user_id(token):
+        from users.models import User
         
-        cal.add_component(event)
+        try:
+            user_id, secret = signing.loads(
+                token, salt=CalendarService.FEED_TOKEN_SALT, max_age=settings.CALENDAR_FEED_TOKEN_MAX_AGE
+            )
+        except (signing.BadSignature, TypeError, ValueError):
+            return None
+        current = User.objects.filter(pk=user_id, is_active=True).values_list('calendar_feed_secret', flat=True).first()
+        if current is None or not constant_time_compare(secret, current):
+            return None
+        return user_id
+    
+    @staticmethod
+    def rotate_feed_token(user):
+        """Revoke every feed URL issued so far and return the token for the new one."""
+        from users.models import new_calendar_feed_secret
         
-        return cal.to_ical()
+        user.calendar_feed_secret = new_calendar_feed_secret()
+        user.save(update_fields=['calendar_feed_secret'])
+        return CalendarService.feed_token(user)
+    
+    @staticmethod
+    def feed_response(request, entry, filename, private=False):
+        """Serve cached feed bytes with an ETag so calendar clients can poll with If-None-Match."""
+        response = HttpResponse(entry['body'], content_type='text/calendar; charset=utf-8')
+        response['ETag'] = f'"{entry["digest"][:32]}"'
+        if entry['last_modified'] is not None:
+            response['Last-Modified'] = http_date(entry['last_modified'])
+        response['Content-Disposition'] = f'inline; filename="{filename}"'
+        if private:
+            patch_cache_control(response, private=True, no_cache=True)
+        else:
+            patch_cache_control(response, public=True, max_age=0, must_revalidate=True)
+        return get_conditional_response(
+            request,
+            etag=response['ETag'],
+            last_modified=entry['last_modified'],
+            response=response,
+        )
     
     @staticmethod
     def get_google_calendar_link(reservation):
@@ -56,29 +173,94 @@ class CalendarService:
         return f"{base_url}?{query_string}"
 
 class EmailService:
+    """
+    Renders notification emails and delivers them in batches.
+
+    Inside `EmailService.batch()` messages are queued and sent on exit (after the
+    surrounding transaction commits) over a single backend connection, and their
+    NotificationLog rows are written with one bulk insert. Outside a batch each
+    message is delivered on its own.
+    """
+    _local = threading.local()
+
     @staticmethod
-    def _log_notification(reservation, type_code, subject, content):
+    @contextmanager
+    def batch():
+        outbox = getattr(EmailService._local, 'outbox', None)
+        if outbox is not None:
+            # Nested batches join the outermost one
+            yield outbox
+            return
+        
+        outbox = []
+        EmailService._local.outbox = outbox
         try:
-            NotificationLog.objects.create(
-                user=reservation.user, # Can be None now
-                recipient_email=reservation.guest_email,
-                reservation=reservation,
-                type=type_code,
-                channel='email',
-                subject=subject,
-                content=content,
-                status='sent'
-            )
-        except Exception as e:
-            print(f"Error logging notification: {e}")
+            yield outbox
+        finally:
+            EmailService._local.outbox = None
+        transaction.on_commit(lambda: EmailService.deliver(outbox))
+
+    @staticmethod
+    def deliver(outbox):
+        """Send queued (reservation, type, message) entries over one connection and log each outcome."""
+        if not outbox:
+            return []
+        
+        connection = get_connection(fail_silently=False)
+        logs = []
+        try:
+            connection.open()
+        except Exception:
+            # Every message below will be logged as failed
+            logger.exception('Could not open email connection')
+        
+        try:
+            for reservation, type_code, message in outbox:
+                try:
+                    delivered = connection.send_messages([message])
+                except Exception:
+                    logger.exception('Failed to send %s email to %s', type_code, ', '.join(message.to))
+                    delivered = 0
+                
+                logs.append(NotificationLog(
+                    user_id=reservation.user_id, # Can be None now
+                    recipient_email=reservation.guest_email,
+                    reservation_id=reservation.pk,
+                    type=type_code,
+                    channel='email',
+                    subject=message.subject,
+                    content=message.body,
+                    status='sent' if delivered else 'failed'
+                ))
+        finally:
+            connection.close()
+        
+        for log in logs:
+            metrics.NOTIFICATIONS_SENT.labels(log.type, log.channel, log.status).inc()
+        
+        try:
+            NotificationLog.objects.bulk_create(logs)
+        except Exception:
+            logger.exception('Error logging notifications')
+        return logs
+
+    @staticmethod
+    def _queue(reservation, type_code, subject, content):
+        message = EmailMessage(subject, content, settings.DEFAULT_FROM_EMAIL, [reservation.guest_email])
+        entry = (reservation, type_code, message)
+        
+        outbox = getattr(EmailService._local, 'outbox', None)
+        if outbox is None:
+            EmailService.deliver([entry])
+        else:
+            outbox.append(entry)
 
     @staticmethod
     def send_reservation_confirmation(reservation):
         subject = f"Reservation Confirmed - {reservation.ticket_type.event.title}"
         content = f"Dear Guest,\n\nYour reservation ({reservation.reference_code}) has been confirmed."
-        print(f"Sending email to {reservation.guest_email}: {subject}")
         
-        EmailService._log_notification(
+        EmailService._queue(
             reservation, 'reservation_confirmation', subject, content
         )
         
@@ -86,9 +268,8 @@ class EmailService:
     def send_payment_reminder(reservation):
         subject = f"Payment Reminder - {reservation.ticket_type.event.title}"
         content = "Please complete your payment to secure your spot."
-        print(f"Sending email to {reservation.guest_email}: {subject}")
         
-        EmailService._log_notification(
+        EmailService._queue(
             reservation, 'payment_reminder', subject, content
         )
         
@@ -96,8 +277,7 @@ class EmailService:
     def send_payment_confirmation(reservation):
         subject = f"Payment Received - {reservation.ticket_type.event.title}"
         content = f"We have received your payment of R {reservation.amount_paid}."
-        print(f"Sending email to {reservation.guest_email}: {subject}")
         
-        EmailService._log_notification(
+        EmailService._queue(
             reservation, 'payment_received', subject, content
-        )
\ No newline at end of file
+        )
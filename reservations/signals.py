@@ -0,0 +1,36 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import Signal, receiver
+
+from events.models import TicketType
+from .inventory import InventoryService
+from .models import PaymentProof, Reservation
+from .uploads import delete_unreferenced
+
+# Sent with `changes`, a list of (reserved_at, old status, new status), after a set-based UPDATE
+# changes reservation statuses without going through Reservation.save (expiry sweeps, ledger
+# recalculation, ...); only rows whose status actually moved are listed
+statuses_changed = Signal()
+
+
+@receiver(post_delete, sender=PaymentProof)
+def release_proof_blob(sender, instance, **kwargs):
+    # The reference count is the number of rows naming the blob, checked once the delete is committed
+    name = instance.file.name
+    if name:
+        transaction.on_commit(lambda: delete_unreferenced(name))
+
+
+@receiver(pre_delete, sender=TicketType)
+def release_deleted_ticket_type(sender, instance, **kwargs):
+    # Deleting a ticket type (or the sub-event above it) drops its reservations by cascade,
+    # so the seats they held are handed back before the rows go
+    InventoryService.release_deleted(instance)
+
+
+@receiver(post_save, sender=Reservation)
+def forget_checkin_code(sender, instance, created, **kwargs):
+    # An edited reservation may have moved to another event's ticket type
+    if not created:
+        from .checkin import CheckInService
+        CheckInService.forget(instance.reference_code)
@@ -1,3 +1,435 @@
-from django.test import TestCase
+import hashlib
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.files.storage import default_storage
+from django.core import mail
+from django.core.management import call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import close_old_connections, connection
+from django.test import TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.utils import timezone
+from rest_framework.test import APIClient, APIRequestFactory
+
+from analytics.models import NotificationLog
+from events.models import Event, SubEvent, TicketType
+from users.models import User
+from .checkin import CheckInService
+from .inventory import InventoryService
+from .models import PaymentProof, Reservation
+from .views import ReservationViewSet
+from .uploads import save_payment_proof
+
+
+def make_event(capacity=5, **kwargs):
+    admin = User.objects.create_superuser(email=f'admin{User.objects.count()}@example.com',
+                                          password='pw12345678', full_name='Admin')
+    start = timezone.now() + timedelta(days=5)
+    event = Event.objects.create(
+        title=kwargs.pop('title', 'Gala'), description='Dinner', location='Cape Town', address='1 Main',
+        capacity=capacity, start_datetime=start, end_datetime=start + timedelta(hours=4),
+        published=True, created_by=admin,
+    )
+    ticket_type = TicketType.objects.create(event=event, name='GA', price=100, quantity_available=capacity)
+    return admin, event, ticket_type
+
+
+class ConcurrentBookingTests(TransactionTestCase):
+    """Many clients racing for the last seats: the counters must never let one more through."""
+
+    CLIENTS = 60
+
+    def test_no_oversell_under_concurrency(self):
+        _, event, ticket_type = make_event(capacity=5)
+        results = []
+        start = threading.Barrier(self.CLIENTS)
+
+        def book(index):
+            try:
+                start.wait()
+                response = APIClient().post('/api/reservations/reservations/', {
+                    'ticket_type': ticket_type.pk, 'quantity': 1, 'guest_email': f'guest{index}@example.com',
+                })
+                results.append(response.status_code)
+            finally:
+                close_old_connections()
+                connection.close()
+
+        threads = [threading.Thread(target=book, args=(index,)) for index in range(self.CLIENTS)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        sys.stderr.write(f'\n{self.CLIENTS} concurrent bookings on {connection.vendor} in {elapsed:.2f}s '
+                         f'({self.CLIENTS / elapsed:.0f} requests/s)\n')
+
+        event.refresh_from_db()
+        ticket_type.refresh_from_db()
+        self.assertEqual(sorted(set(results)), [201, 400], results)
+        self.assertEqual(results.count(201), 5, results)
+        self.assertEqual(Reservation.objects.filter(ticket_type=ticket_type).count(), 5)
+        self.assertEqual(event.seats_reserved, 5)
+        self.assertEqual(ticket_type.quantity_reserved, 5)
+
+
+class RecountTests(TestCase):
+    def test_recount_counts_existing_holds(self):
+        _, event, ticket_type = make_event(capacity=10)
+        sub_event = SubEvent.objects.create(event=event, title='Starter', start_datetime=event.start_datetime,
+                                            end_datetime=event.end_datetime, capacity=6)
+        seated = TicketType.objects.create(event=event, sub_event=sub_event, name='VIP', price=200,
+                                           quantity_available=4)
+        Reservation.objects.create(ticket_type=ticket_type, quantity=3, guest_email='a@example.com',
+                                   total_amount=300, status='reserved')
+        Reservation.objects.create(ticket_type=seated, quantity=2, guest_email='b@example.com',
+                                   total_amount=400, status='confirmed')
+        Reservation.objects.create(ticket_type=ticket_type, quantity=4, guest_email='c@example.com',
+                                   total_amount=400, status='expired')
+
+        changed = InventoryService.recount()
+
+        event.refresh_from_db()
+        sub_event.refresh_from_db()
+        ticket_type.refresh_from_db()
+        seated.refresh_from_db()
+        self.assertEqual((event.seats_reserved, sub_event.seats_reserved), (5, 2))
+        self.assertEqual((ticket_type.quantity_reserved, seated.quantity_reserved), (3, 2))
+        self.assertEqual(changed['ticket type'], 2)
+        self.assertEqual(Event.objects.with_availability().get(pk=event.pk).available_tickets, 5)
+        self.assertEqual(InventoryService.recount(), {'event': 0, 'sub event': 0, 'ticket type': 0})
+
+
+class ReservationChangeTests(TestCase):
+    def test_update_moves_the_hold_and_reprices(self):
+        admin, event, ticket_type = make_event(capacity=10)
+        vip = TicketType.objects.create(event=event, name='VIP', price=250, quantity_available=5)
+        client = APIClient()
+        client.force_authenticate(admin)
+        created = client.post('/api/reservations/reservations/', {'ticket_type': ticket_type.pk, 'quantity': 2})
+        self.assertEqual(created.status_code, 201, created.data)
+
+        response = client.patch(f'/api/reservations/reservations/{created.data["id"]}/',
+                                {'ticket_type': vip.pk, 'quantity': 3})
+
+        self.assertEqual(response.status_code, 200, response.data)
+        reservation = Reservation.objects.get(pk=created.data['id'])
+        self.assertEqual(reservation.total_amount, 750)
+        ticket_type.refresh_from_db()
+        vip.refresh_from_db()
+        event.refresh_from_db()
+        self.assertEqual((ticket_type.quantity_reserved, vip.quantity_reserved, event.seats_reserved), (0, 3, 3))
+
+    def test_cascading_deletes_release_parent_counters(self):
+        _, event, ticket_type = make_event(capacity=10)
+        sub_event = SubEvent.objects.create(event=event, title='Starter', start_datetime=event.start_datetime,
+                                            end_datetime=event.end_datetime, capacity=6)
+        seated = TicketType.objects.create(event=event, sub_event=sub_event, name='VIP', price=200,
+                                           quantity_available=4)
+        for held, quantity, reservation_status in ((ticket_type, 3, 'reserved'), (seated, 2, 'confirmed'),
+                                                   (seated, 1, 'expired')):
+            if reservation_status in Reservation.HOLDING_STATUSES:
+                InventoryService.hold(held, quantity)
+            Reservation.objects.create(ticket_type=held, quantity=quantity, guest_email='a@example.com',
+                                       total_amount=held.price * quantity, status=reservation_status)
+
+        sub_event.delete()
+        event.refresh_from_db()
+        self.assertEqual(event.seats_reserved, 3)
+
+        ticket_type.delete()
+        event.refresh_from_db()
+        self.assertEqual(event.seats_reserved, 0)
+        self.assertEqual(InventoryService.recount(), {'event': 0, 'sub event': 0, 'ticket type': 0})
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class PaymentProofUploadTests(TestCase):
+    def upload(self, reservation, body=b'%PDF-1.4 proof'):
+        return APIClient().post(
+            f'/api/reservations/reservations/{reservation.pk}/upload_payment_proof/'
+            f'?reference_code={reservation.reference_code}',
+            {'file': SimpleUploadedFile('proof.pdf', body, 'application/pdf'), 'amount': '100.00'},
+            format='multipart',
+        )
+
+    def test_upload_re_holds_an_expired_reservation(self):
+        _, event, ticket_type = make_event(capacity=1)
+        reservation = Reservation.objects.create(ticket_type=ticket_type, quantity=1, guest_email='a@example.com',
+                                                 total_amount=100, status='expired')
+
+        self.assertEqual(self.upload(reservation).status_code, 201)
+
+        reservation.refresh_from_db()
+        event.refresh_from_db()
+        self.assertEqual(reservation.status, 'pending')
+        self.assertEqual(event.seats_reserved, 1)
+
+    def test_upload_refused_when_the_expired_seats_were_resold(self):
+        _, event, ticket_type = make_event(capacity=1)
+        reservation = Reservation.objects.create(ticket_type=ticket_type, quantity=1, guest_email='a@example.com',
+                                                 total_amount=100, status='expired')
+        InventoryService.hold(ticket_type, 1)
+
+        self.assertEqual(self.upload(reservation).status_code, 400)
+
+        reservation.refresh_from_db()
+        self.assertEqual(reservation.status, 'expired')
+        self.assertFalse(reservation.payment_proofs.exists())
+
+    def test_generic_create_checks_and_hashes_the_file(self):
+        _, _, ticket_type = make_event()
+        reservation = Reservation.objects.create(ticket_type=ticket_type, quantity=1, guest_email='a@example.com',
+                                                 total_amount=100)
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user(email='guest@example.com', password='pw12345678',
+                                                           full_name='Guest'))
+
+        def create(body):
+            return client.post('/api/reservations/payment-proofs/', {
+                'reservation': reservation.pk, 'amount': '100.00',
+                'file': SimpleUploadedFile('x.pdf', body, 'application/pdf'),
+            }, format='multipart')
+
+        self.assertEqual(create(b'MZ\x90\x00 not a pdf').status_code, 400)
+        response = create(b'%PDF-1.4 proof')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data['sha256']), 64)
+        # The same bytes again hand back the proof under review instead of a second row
+        again = create(b'%PDF-1.4 proof')
+        self.assertEqual((again.status_code, again.data['id'], again.data['duplicate']), (200, response.data['id'], True))
+
+        proof = reservation.payment_proofs.get()
+        client.patch(f'/api/reservations/payment-proofs/{proof.pk}/', {
+            'file': SimpleUploadedFile('y.pdf', b'MZ\x90\x00', 'application/pdf'),
+        }, format='multipart')
+        self.assertEqual(PaymentProof.objects.get(pk=proof.pk).file.name, proof.file.name)
+
+
+class QueryBudgetTests(TestCase):
+    """The budgets in the viewset docstrings, held for pages with several events on them."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = None
+        for index in range(3):
+            admin, _, ticket_type = make_event(title=f'Gala {index}')
+            cls.admin = cls.admin or admin
+            reservation = Reservation.objects.create(ticket_type=ticket_type, quantity=1, total_amount=100,
+                                                     guest_email=f'guest{index}@example.com')
+            PaymentProof.objects.create(reservation=reservation, file='payment_proofs/x.pdf', amount=100)
+        cls.reservation = reservation
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_reservation_list_and_retrieve(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(len(self.client.get('/api/reservations/reservations/').data['results']), 3)
+        with self.assertNumQueries(2):
+            self.client.get('/api/reservations/reservations/?page=1')
+        with self.assertNumQueries(1):
+            self.client.get(f'/api/reservations/reservations/{self.reservation.pk}/')
+
+    def test_payment_proof_list_and_retrieve(self):
+        with self.assertNumQueries(2):
+            self.assertEqual(len(self.client.get('/api/reservations/payment-proofs/').data['results']), 3)
+        proof = PaymentProof.objects.first()
+        with self.assertNumQueries(1):
+            self.client.get(f'/api/reservations/payment-proofs/{proof.pk}/')
+
+
+class CalendarFeedTests(TestCase):
+    def setUp(self):
+        _, _, ticket_type = make_event()
+        self.user = User.objects.create_user(email='guest@example.com', password='pw12345678', full_name='Guest')
+        self.reservation = Reservation.objects.create(ticket_type=ticket_type, quantity=2, total_amount=200,
+                                                      user=self.user, guest_email='guest@example.com')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def feed_url(self, method='get'):
+        return getattr(self.client, method)('/api/reservations/reservations/calendar-feed-url/').data['url']
+
+    def test_feed_leaves_out_reference_codes(self):
+        response = APIClient().get(self.feed_url())
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn(self.reservation.reference_code, response.content.decode())
+        self.assertIn('Tickets: 2', response.content.decode())
+
+    def test_rotating_revokes_old_urls(self):
+        old = self.feed_url()
+        new = self.feed_url('post')
+        self.assertEqual(APIClient().get(old).status_code, 403)
+        self.assertEqual(APIClient().get(new).status_code, 200)
+
+    def test_tokens_expire(self):
+        url = self.feed_url()
+        with override_settings(CALENDAR_FEED_TOKEN_MAX_AGE=-1):
+            self.assertEqual(APIClient().get(url).status_code, 403)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class ProofBlobTests(TestCase):
+    def test_shared_blob_outlives_one_of_its_proofs(self):
+        _, _, ticket_type = make_event()
+        first, second = [
+            Reservation.objects.create(ticket_type=ticket_type, quantity=1, total_amount=100,
+                                       guest_email=f'guest{index}@example.com')
+            for index in range(2)
+        ]
+        upload = SimpleUploadedFile('proof.pdf', b'%PDF-1.4 shared', 'application/pdf')
+        upload.sha256, upload.extension = hashlib.sha256(b'%PDF-1.4 shared').hexdigest(), '.pdf'
+        proof, created = save_payment_proof(upload, first.pk, amount=100)
+        upload.seek(0)
+        other, _ = save_payment_proof(upload, second.pk, amount=100)
+        self.assertTrue(created)
+        self.assertEqual(proof.file.name, other.file.name)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            proof.delete()
+        self.assertTrue(default_storage.exists(other.file.name))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            other.delete()
+        self.assertFalse(default_storage.exists(other.file.name))
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), MAX_UPLOAD_SIZE=32 * 1024 * 1024)
+class LargeUploadMemoryTests(TestCase):
+    def test_large_proof_streams_through_bounded_memory(self):
+        _, _, ticket_type = make_event()
+        reservation = Reservation.objects.create(ticket_type=ticket_type, quantity=1, total_amount=100,
+                                                 guest_email='guest@example.com')
+        size = 24 * 1024 * 1024
+        body = b'%PDF-1.4\n' + b'0' * (size - 9)
+        # The multipart body is built before tracing starts: only the server side is measured
+        request = APIRequestFactory().post(
+            f'/api/reservations/reservations/{reservation.pk}/upload_payment_proof/'
+            f'?reference_code={reservation.reference_code}',
+            {'file': SimpleUploadedFile('proof.pdf', body, 'application/pdf'), 'amount': '100.00'},
+            format='multipart',
+        )
+        view = ReservationViewSet.as_view({'post': 'upload_payment_proof'})
+
+        tracemalloc.start()
+        try:
+            response = view(request, pk=reservation.pk)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+            # What the WSGI handler does at the end of a request: drops the moved temporary file
+            request.close()
+
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data['sha256'], hashlib.sha256(body).hexdigest())
+        # Chunks go to a temporary file and on into storage; the whole file is never held
+        self.assertLess(peak, 4 * 1024 * 1024, f'peak {peak / 1024 / 1024:.1f}MB for a {size // 1024 // 1024}MB upload')
+
+
+class ExportMemoryTests(TestCase):
+    def test_export_streams_in_bounded_memory(self):
+        # The full check is `manage.py benchmark_export` (1M rows by default); this keeps it runnable in CI
+        out = StringIO()
+        call_command('benchmark_export', rows=20000, max_peak_mb=4, stdout=out)
+        self.assertIn('Exported 20000 rows', out.getvalue())
+        self.assertFalse(Reservation.objects.exists())
+
+
+class CheckInTests(TestCase):
+    def setUp(self):
+        # The warm maps are per process and would outlive each test's rollback
+        CheckInService._events.clear()
+        self.admin, self.event, self.ticket_type = make_event(capacity=10)
+        self.reservation = Reservation.objects.create(ticket_type=self.ticket_type, quantity=2, total_amount=200,
+                                                      guest_email='guest@example.com', status='confirmed')
+
+    def scan(self, event, code):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        response = client.post('/api/reservations/reservations/check-in/',
+                               {'event': event.pk, 'reference_code': code}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data
+
+    def test_scan_admits_once(self):
+        self.assertEqual(self.scan(self.event, self.reservation.reference_code)['result'], 'checked_in')
+        again = self.scan(self.event, self.reservation.reference_code)
+        self.assertEqual((again['result'], again['quantity']), ('already_checked_in', 2))
+
+    def test_reservation_moved_to_another_event(self):
+        _, other, other_type = make_event(title='Other')
+        CheckInService.warm(self.event.pk)
+
+        # A set-based move leaves the warm map stale; the event filter still keeps the code out
+        Reservation.objects.filter(pk=self.reservation.pk).update(ticket_type=other_type)
+        self.assertEqual(self.scan(self.event, self.reservation.reference_code)['result'], 'not_found')
+        self.reservation.refresh_from_db()
+        self.assertEqual(self.reservation.status, 'confirmed')
+
+        # Saving the reservation drops its code, and the row read under the lock gives the new details
+        self.assertIn(self.reservation.reference_code, CheckInService._codes(self.event.pk))
+        self.reservation.quantity = 3
+        self.reservation.save()
+        self.assertNotIn(self.reservation.reference_code, CheckInService._codes(self.event.pk))
+        admitted = self.scan(other, self.reservation.reference_code)
+        self.assertEqual((admitted['result'], admitted['quantity']), ('checked_in', 3))
+
+    def test_scan_throughput_benchmark(self):
+        # The full run is `manage.py benchmark_checkin` (10k scans by default)
+        out = StringIO()
+        call_command('benchmark_checkin', rows=200, batch_size=50, stdout=out)
+        self.assertIn('Single scans: 200 in', out.getvalue())
+        self.assertIn('Batched re-scans: 200 in', out.getvalue())
+        self.assertFalse(Reservation.objects.filter(ticket_type__event__title='Check-in benchmark').exists())
+
+
+class ApprovalEmailTests(TestCase):
+    def setUp(self):
+        self.admin, _, ticket_type = make_event()
+        self.proofs = []
+        for index in range(3):
+            reservation = Reservation.objects.create(ticket_type=ticket_type, quantity=1, total_amount=100,
+                                                     guest_email=f'guest{index}@example.com', status='pending')
+            self.proofs.append(PaymentProof.objects.create(reservation=reservation, file='payment_proofs/x.pdf',
+                                                           amount=100))
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def approve(self, url, data=None):
+        """POST, then return (messages sent before commit, connections opened after it)."""
+        from reservations import services
+
+        with mock.patch.object(services, 'get_connection', wraps=services.get_connection) as get_connection:
+            with self.captureOnCommitCallbacks(execute=False) as callbacks:
+                self.assertEqual(self.client.post(url, data, format='json').status_code, 200)
+            sent_before_commit = len(mail.outbox)
+            for callback in callbacks:
+                callback()
+        return sent_before_commit, get_connection.call_count
+
+    def test_approve_sends_after_commit_in_one_batch(self):
+        sent_before_commit, connections = self.approve(
+            f'/api/reservations/payment-proofs/{self.proofs[0].pk}/approve/'
+        )
+        self.assertEqual(sent_before_commit, 0)
+        self.assertEqual(connections, 1)
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(list(NotificationLog.objects.values_list('status', flat=True)), ['sent', 'sent'])
+
+    def test_bulk_approve_sends_every_message_over_one_connection(self):
+        sent_before_commit, connections = self.approve(
+            '/api/reservations/payment-proofs/bulk-approve/', {'ids': [proof.pk for proof in self.proofs]}
+        )
+        self.assertEqual(sent_before_commit, 0)
+        self.assertEqual(connections, 1)
+        self.assertEqual(len(mail.outbox), 6)
+        self.assertEqual(NotificationLog.objects.filter(status='sent').count(), 6)
@@ -0,0 +1,212 @@
+import hashlib
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.files.uploadhandler import StopUpload, TemporaryFileUploadHandler
+from django.db import connection, transaction
+from django.http import QueryDict
+from django.utils.datastructures import MultiValueDict
+from rest_framework import status
+
+# Leading bytes of every accepted proof format
+SIGNATURES = [
+    (b'\xff\xd8\xff', 'image/jpeg', '.jpg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png', '.png'),
+    (b'%PDF-', 'application/pdf', '.pdf'),
+]
+SNIFF_LENGTH = max(len(magic) for magic, _, _ in SIGNATURES)
+
+# Proof files live under their hash, so one blob can back many PaymentProof rows
+BLOB_PREFIX = 'payment_proofs/sha256/'
+
+# Room for the multipart boundaries and the small form fields next to the file
+MULTIPART_OVERHEAD = 64 * 1024
+
+
+class UploadError(Exception):
+    def __init__(self, message, status_code=status.HTTP_400_BAD_REQUEST):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+def too_large():
+    return UploadError(
+        f'File too large. Maximum size: {settings.MAX_UPLOAD_SIZE / 1024 / 1024}MB',
+        status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    )
+
+
+def not_allowed():
+    return UploadError(
+        f'File type not allowed. Allowed types: {", ".join(settings.ALLOWED_FILE_TYPES)}'
+    )
+
+
+def sniff(head):
+    for magic, content_type, extension in SIGNATURES:
+        if head.startswith(magic) and content_type in settings.ALLOWED_FILE_TYPES:
+            return content_type, extension
+    return None
+
+
+class PaymentProofUploadHandler(TemporaryFileUploadHandler):
+    """
+    Streams a payment proof to a temporary file chunk by chunk, checking the
+    size and the magic bytes as the data arrives instead of after the fact.
+    The first problem found is kept on `error` and the upload is stopped.
+    """
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.max_size = settings.MAX_UPLOAD_SIZE
+        self.error = None
+        self.head = b''
+        self.detected = None
+        self.digest = None
+
+    @classmethod
+    def install(cls, request):
+        """Must run before request.data or request.FILES is first touched."""
+        django_request = getattr(request, '_request', request)
+        handler = cls(django_request)
+        django_request.upload_handlers = [handler]
+        return handler
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        # Refuse an oversize body before reading any of it
+        if content_length > self.max_size + MULTIPART_OVERHEAD:
+            self.error = too_large()
+            return QueryDict(encoding=encoding), MultiValueDict()
+        return None
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.head = b''
+        self.detected = None
+        self.digest = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        # 1. Size: stop as soon as the running total passes the limit
+        if start + len(raw_data) > self.max_size:
+            self.error = too_large()
+            raise StopUpload(connection_reset=True)
+
+        # 2. Type: decide from the first bytes, then stop sniffing
+        if self.detected is None:
+            self.head += raw_data[:SNIFF_LENGTH - len(self.head)]
+            if len(self.head) >= SNIFF_LENGTH:
+                self.detected = sniff(self.head)
+                if self.detected is None:
+                    self.error = not_allowed()
+                    raise StopUpload(connection_reset=True)
+
+        # 3. Content address: hash while the bytes pass through
+        self.digest.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        uploaded = super().file_complete(file_size)
+        if self.detected is None:
+            # Shorter than the longest signature: one last look at what arrived
+            self.detected = sniff(self.head)
+        if self.detected is None:
+            self.error = self.error or not_allowed()
+            uploaded.close()
+            return None
+        uploaded.content_type, uploaded.extension = self.detected
+        uploaded.sha256 = self.digest.hexdigest()
+        return uploaded
+
+    def validated(self, file):
+        """Return the streamed file, or raise UploadError with the reason it was refused."""
+        if self.error is not None:
+            raise self.error
+        if not file:
+            raise UploadError('No file provided')
+        return file
+
+
+def blob_name(sha256, extension):
+    """Content-addressed path, fanned out by the first two hex digits."""
+    return f'{BLOB_PREFIX}{sha256[:2]}/{sha256}{extension}'
+
+
+def lock_blob(sha256):
+    """
+    Hold the blob's lock until the current transaction ends. Reusing a blob and deleting an
+    unreferenced one both check first and act second; on PostgreSQL this transaction-scoped
+    advisory lock keeps the two from interleaving, so a new row never points at a deleted file.
+    """
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_xact_lock(hashtext(%s))', [f'payment_proof:{sha256}'])
+
+
+def store_blob(name, content):
+    """Write content under name unless an identical blob is already there."""
+    if default_storage.exists(name):
+        return name
+    saved = default_storage.save(name, content)
+    if saved != name:
+        # Lost a race with a concurrent upload of the same bytes: keep the first copy
+        default_storage.delete(saved)
+    return name
+
+
+def store_payment_proof(file):
+    """
+    Store an uploaded proof by its SHA-256 and return the storage name.
+    The temporary file is handed to storage as-is so it is copied in chunks, never read whole.
+    """
+    return store_blob(blob_name(file.sha256, file.extension), file)
+
+
+def receive_payment_proof(request, fields, prepare=None):
+    """
+    The one way a payment proof comes in, whichever endpoint receives it: stream and check
+    the upload, then save it with save_payment_proof.
+
+    `fields(data)` reads the rest of the form (only safe once the handler is installed) and
+    returns the PaymentProof fields, reservation_id included. `prepare` is passed on to
+    save_payment_proof. Both may raise UploadError to refuse the upload.
+    Returns (proof, created); raises UploadError.
+    """
+    handler = PaymentProofUploadHandler.install(request)
+    file = handler.validated(request.FILES.get('file'))
+    values = fields(request.data)
+    return save_payment_proof(file, values.pop('reservation_id'), prepare=prepare, **values)
+
+
+def save_payment_proof(file, reservation_id, prepare=None, **fields):
+    """
+    Store a checked upload and create its PaymentProof, unless the same bytes were already sent
+    for this reservation. `prepare(reservation_id)` runs in the same transaction just before a
+    new row is created. Returns (proof, created), the earlier proof when it is a duplicate.
+    """
+    from .models import PaymentProof
+
+    with transaction.atomic():
+        # Held until the row commits, so delete_unreferenced cannot remove the blob in between
+        lock_blob(file.sha256)
+        duplicate = PaymentProof.objects.filter(reservation_id=reservation_id, sha256=file.sha256).first()
+        if duplicate is not None:
+            return duplicate, False
+        if prepare is not None:
+            prepare(reservation_id)
+        proof = PaymentProof.objects.create(
+            reservation_id=reservation_id, file=store_payment_proof(file), sha256=file.sha256, **fields
+        )
+    return proof, True
+
+
+def delete_unreferenced(name):
+    """Remove a content-addressed blob once no PaymentProof points at it any more."""
+    from .models import PaymentProof
+
+    if not name.startswith(BLOB_PREFIX):
+        return
+    with transaction.atomic():
+        lock_blob(name.rsplit('/', 1)[-1].split('.', 1)[0])
+        if not PaymentProof.objects.filter(file=name).exists():
+            default_storage.delete(name)
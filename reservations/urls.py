@@ -1,12 +1,15 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from . import views
+from . import async_views, views
 
 router = DefaultRouter()
 router.register(r'reservations', views.ReservationViewSet, basename='reservation')
 router.register(r'payment-proofs', views.PaymentProofViewSet, basename='paymentproof')
 
 urlpatterns = [
+    # Async (ASGI) lookup by reference code
+    path('async/lookup/<str:reference_code>/', async_views.reservation_lookup, name='async-reservation-lookup'),
+
     path('', include(router.urls)),
     
     # Payment Proof endpoints
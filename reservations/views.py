@@ -1,11 +1,18 @@
-from rest_framework import viewsets, permissions, status
+from rest_framework import viewsets, permissions, status, serializers
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.renderers import JSONRenderer
 from django.http import HttpResponse
+from django.core.cache import cache
+from django.db.models import Prefetch, prefetch_related_objects
+from django.urls import reverse
+from django.utils.http import urlencode
 from django.utils import timezone
 from django.conf import settings
 from django.core.files.storage import default_storage
 from django.core.files.base import ContentFile
+from django.db import transaction
+import hashlib
 import os
 import uuid
 from decimal import Decimal
@@ -13,23 +20,46 @@ from decimal import Decimal
 from .models import Reservation, PaymentProof
 from .serializers import ReservationSerializer, PaymentProofSerializer
 from .services import CalendarService, EmailService
+from .inventory import InventoryService, InsufficientInventory
+from .checkin import CheckInService
+from .uploads import UploadError, receive_payment_proof
+from .signals import statuses_changed
+from payments import ledger
 from payments.models import Payment
+from payments.signals import payments_created
+from config.pagination import KeysetPagination
+from config.exports import filter_export, stream_export
+from config.renderers import ICalendarRenderer
+from events.cache import build_feed_entry, catalogue_version
+from events.models import SubEvent
+
+# Largest batch of offline scans accepted in one check-in request
+MAX_CHECKIN_BATCH = 1000
+
 
 class ReservationViewSet(viewsets.ModelViewSet):
+    """
+    Query budget: list 1 (one joined keyset page; 2 with ?page=), retrieve 1.
+    ReservationSerializer reads ticket_type and ticket_type.event, so both are joined up front.
+    """
     serializer_class = ReservationSerializer
     permission_classes = [permissions.AllowAny]
+    pagination_class = KeysetPagination
+    cursor_ordering = ('-reserved_at', '-id')
     
     def get_queryset(self):
+        queryset = Reservation.objects.select_related('ticket_type__event').order_by('-reserved_at')
+        
         reference_code = self.request.query_params.get('reference_code')
         if reference_code:
-            return Reservation.objects.filter(reference_code=reference_code)
+            return queryset.filter(reference_code=reference_code)
 
         if not self.request.user.is_authenticated:
             return Reservation.objects.none()
             
         if self.request.user.is_staff:
-            return Reservation.objects.all()
-        return Reservation.objects.filter(user=self.request.user)
+            return queryset
+        return queryset.filter(user=self.request.user)
     
     def perform_create(self, serializer):
         user = self.request.user
@@ -37,18 +67,105 @@ class ReservationViewSet(viewsets.ModelViewSet):
             user = None
             
         ticket_type = serializer.validated_data['ticket_type']
-        quantity = serializer.validated_data['quantity']
+        quantity = serializer.validated_data.get('quantity', 1)
         
         total_amount = ticket_type.price * quantity
         amount_paid = Decimal('0.00') # Initialize with 0
         expires_at = timezone.now() + timezone.timedelta(hours=24)
         
-        reservation = serializer.save(
-            user=user,
-            total_amount=total_amount,
-            amount_paid=amount_paid,
-            expires_at=expires_at
+        # Hold the stock and create the row together, so a failed insert gives the tickets back
+        with transaction.atomic():
+            try:
+                InventoryService.hold(ticket_type, quantity)
+            except InsufficientInventory:
+                raise serializers.ValidationError('Not enough tickets available')
+            
+            reservation = serializer.save(
+                user=user,
+                total_amount=total_amount,
+                amount_paid=amount_paid,
+                expires_at=expires_at
+            )
+    
+    def perform_update(self, serializer):
+        reservation = serializer.instance
+        ticket_type = serializer.validated_data.get('ticket_type', reservation.ticket_type)
+        quantity = serializer.validated_data.get('quantity', reservation.quantity)
+        changed = ticket_type.pk != reservation.ticket_type_id or quantity != reservation.quantity
+        
+        with transaction.atomic():
+            if changed and reservation.status in Reservation.HOLDING_STATUSES:
+                InventoryService.release(reservation.ticket_type, reservation.quantity)
+                try:
+                    InventoryService.hold(ticket_type, quantity)
+                except InsufficientInventory:
+                    raise serializers.ValidationError('Not enough tickets available')
+            if changed:
+                serializer.save(total_amount=ticket_type.price * quantity)
+            else:
+                serializer.save()
+    
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            if instance.status in Reservation.HOLDING_STATUSES:
+                InventoryService.release(instance.ticket_type, instance.quantity)
+            instance.delete()
+    
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """
+        Stream reservations as CSV or NDJSON (admin only).
+        Filters: `event`, `status` (comma-separated), `from`/`to` on reserved_at, `type` (csv/ndjson).
+        """
+        if not request.user.is_staff:
+            return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
+        
+        queryset = filter_export(
+            Reservation.objects.order_by('reserved_at', 'id'), request,
+            event_field='ticket_type__event_id', date_field='reserved_at'
         )
+        return stream_export(request, queryset, [
+            ('reference_code', 'reference_code'),
+            ('event', 'ticket_type__event__title'),
+            ('ticket_type', 'ticket_type__name'),
+            ('quantity', 'quantity'),
+            ('status', 'status'),
+            ('guest_email', 'guest_email'),
+            ('user_email', 'user__email'),
+            ('total_amount', 'total_amount'),
+            ('amount_paid', 'amount_paid'),
+            ('reserved_at', 'reserved_at'),
+            ('expires_at', 'expires_at'),
+        ], 'reservations')
+    
+    @action(detail=False, methods=['post'], url_path='check-in')
+    def check_in(self, request):
+        """
+        Door check-in (admin only).
+        Body: {"event": id, "reference_code": "..."} for one scan, or
+        {"event": id, "codes": [...]} for a batch queued while a device was offline.
+        """
+        if not request.user.is_staff:
+            return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
+        
+        try:
+            event_id = int(request.data.get('event'))
+        except (TypeError, ValueError):
+            return Response({'error': 'event is required'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        codes = request.data.get('codes')
+        if codes is None:
+            code = request.data.get('reference_code')
+            if not code:
+                return Response({'error': 'reference_code or codes is required'}, status=status.HTTP_400_BAD_REQUEST)
+            return Response(CheckInService.check_in(event_id, [str(code)])[0])
+        
+        if not isinstance(codes, list) or len(codes) > MAX_CHECKIN_BATCH:
+            return Response(
+                {'error': f'codes must be a list of at most {MAX_CHECKIN_BATCH} reference codes'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response({'results': CheckInService.check_in(event_id, [str(code) for code in codes])})
     
     @action(detail=True, methods=['get'])
     def calendar_links(self, request, pk=None):
@@ -68,44 +185,129 @@ class ReservationViewSet(viewsets.ModelViewSet):
         response['Content-Disposition'] = f'attachment; filename="reservation-{reservation.reference_code}.ics"'
         return response
     
+    @action(detail=False, methods=['get', 'post'], url_path='calendar-feed-url',
+            permission_classes=[permissions.IsAuthenticated])
+    def calendar_feed_url(self, request):
+        """
+        Personal feed URL to paste into a calendar app; it carries a signed token instead of a login.
+        POST issues a new URL and revokes every one handed out before it.
+        """
+        if request.method == 'POST':
+            token = CalendarService.rotate_feed_token(request.user)
+        else:
+            token = CalendarService.feed_token(request.user)
+        url = reverse('reservation-calendar-feed')
+        return Response({'url': request.build_absolute_uri(f'{url}?{urlencode({"token": token})}')})
+    
+    @action(detail=False, methods=['get'], url_path='calendar-feed', permission_classes=[permissions.AllowAny],
+            renderer_classes=[JSONRenderer, ICalendarRenderer])
+    def calendar_feed(self, request):
+        """ICS feed of every event (with sub-events) the token's user holds a reservation for."""
+        user_id = CalendarService.feed_user_id(request.query_params.get('token', ''))
+        if user_id is None:
+            return Response({'error': 'Invalid calendar token'}, status=status.HTTP_403_FORBIDDEN)
+        
+        # 1. One joined query; the rows double as the cache fingerprint
+        reservations = list(
+            Reservation.objects.filter(user_id=user_id, status__in=Reservation.HOLDING_STATUSES)
+            .select_related('ticket_type__event')
+            .order_by('ticket_type__event__start_datetime', 'pk')
+        )
+        fingerprint = [(r.pk, r.status, r.ticket_type.event_id) for r in reservations]
+        digest = hashlib.sha256(repr(fingerprint).encode()).hexdigest()
+        key = f'reservations:calendar:{catalogue_version()}:{user_id}:{digest}'
+        
+        # 2. Render (one more query for the sub-events) only when something changed
+        entry = cache.get(key)
+        if entry is None:
+            prefetch_related_objects(
+                [r.ticket_type.event for r in reservations],
+                Prefetch('sub_events', queryset=SubEvent.objects.order_by('start_datetime', 'pk'))
+            )
+            entry = build_feed_entry(CalendarService.user_feed(reservations), None)
+            cache.set(key, entry, settings.EVENT_CACHE_TIMEOUT)
+        return CalendarService.feed_response(request, entry, 'reservations.ics', private=True)
+    
     @action(detail=True, methods=['post'], permission_classes=[permissions.AllowAny])
     def upload_payment_proof(self, request, pk=None):
         reservation = self.get_object()
-        file = request.FILES.get('file')
-        amount = request.data.get('amount')
         
-        if not file:
-            return Response({'error': 'No file provided'}, status=status.HTTP_400_BAD_REQUEST)
-        if not amount:
-            return Response({'error': 'Payment amount is required'}, status=status.HTTP_400_BAD_REQUEST)
+        def fields(data):
+            if not data.get('amount'):
+                raise UploadError('Payment amount is required')
+            uploaded_by = request.user if request.user.is_authenticated else None
+            return {'reservation_id': reservation.pk, 'uploaded_by': uploaded_by, 'amount': data['amount']}
         
-        uploaded_by = request.user if request.user.is_authenticated else None
-
-        payment_proof = PaymentProof.objects.create(
-            reservation=reservation,
-            uploaded_by=uploaded_by,
-            file=file,
-            amount=amount
-        )
+        changes = []
         
-        reservation.status = 'pending'
-        reservation.save()
+        def prepare(reservation_id):
+            # Re-read under a row lock: the expiry job or a concurrent upload may have moved the
+            # status since get_object(), and it must not change between the check and the hold
+            locked = Reservation.objects.select_for_update().select_related('ticket_type').get(pk=reservation_id)
+            
+            # Expired reservations gave their tickets back; take them again before accepting payment
+            if locked.status == 'expired':
+                try:
+                    InventoryService.hold(locked.ticket_type, locked.quantity)
+                except InsufficientInventory:
+                    raise UploadError('Reservation has expired and the tickets are no longer available')
+            
+            # Only the status changes: a whole-row save would write back a stale amount_paid
+            # over concurrent ledger updates, and statuses payments already advanced are kept
+            if Reservation.objects.filter(pk=reservation_id, status__in=('reserved', 'expired')).update(
+                status='pending'
+            ):
+                changes.append((locked.reserved_at, locked.status, 'pending'))
+        
+        try:
+            payment_proof, created = receive_payment_proof(request, fields, prepare)
+        except UploadError as e:
+            return Response({'error': e.message}, status=e.status_code)
+        
+        # The same bytes already sent for this reservation: hand back the proof under review
+        if not created:
+            return Response({**PaymentProofSerializer(payment_proof).data, 'duplicate': True})
         
+        if changes:
+            statuses_changed.send(sender=Reservation, changes=changes)
         serializer = PaymentProofSerializer(payment_proof)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 
+# Largest number of proofs one bulk review request may touch
+MAX_BULK_REVIEW = 500
+
+
 class PaymentProofViewSet(viewsets.ModelViewSet):
+    """
+    Query budget: list 2 (COUNT + page), retrieve 1.
+    PaymentProofSerializer only reads foreign key ids, so no joins are needed.
+    """
     serializer_class = PaymentProofSerializer
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
+        queryset = PaymentProof.objects.order_by('-uploaded_at')
         if self.request.user.is_staff:
-            return PaymentProof.objects.filter(verification_status='pending') # Admin mostly cares about pending
-        return PaymentProof.objects.filter(uploaded_by=self.request.user)
+            return queryset.filter(verification_status='pending') # Admin mostly cares about pending
+        return queryset.filter(uploaded_by=self.request.user)
     
-    def perform_create(self, serializer):
-        serializer.save(uploaded_by=self.request.user)
+    def create(self, request, *args, **kwargs):
+        # Same upload path as upload_payment_proof; the serializer never takes the file itself
+        def fields(data):
+            serializer = self.get_serializer(data=data)
+            serializer.is_valid(raise_exception=True)
+            values = dict(serializer.validated_data)
+            values['reservation_id'] = values.pop('reservation').pk
+            return {**values, 'uploaded_by': request.user}
+        
+        try:
+            payment_proof, created = receive_payment_proof(request, fields)
+        except UploadError as e:
+            return Response({'error': e.message}, status=e.status_code)
+        if not created:
+            return Response({**self.get_serializer(payment_proof).data, 'duplicate': True})
+        return Response(self.get_serializer(payment_proof).data, status=status.HTTP_201_CREATED)
     
     @action(detail=True, methods=['post'])
     def approve(self, request, pk=None):
@@ -116,31 +318,34 @@ class PaymentProofViewSet(viewsets.ModelViewSet):
         payment_proof = self.get_object()
         reservation = payment_proof.reservation
         
-        # 1. Create actual Payment record
-        # This ACTION triggers the 'post_save' signal in payments/signals.py
-        # The signal automatically recalculates 'amount_paid' and updates 'status'
-        Payment.objects.create(
-            reservation=reservation,
-            amount=payment_proof.amount,
-            currency='ZAR',
-            status='completed',
-            payment_method='bank_transfer',
-            paid_at=timezone.now(),
-            transaction_reference=f"PROOF-{payment_proof.id}"
-        )
-        
-        # 2. Update Verification Status
-        payment_proof.verification_status = 'approved'
-        payment_proof.save()
-        
-        # 3. Refresh Reservation from DB
-        # We must refresh to get the calculations performed by the Signal
-        reservation.refresh_from_db()
-        
-        # 4. Send confirmation emails using the FRESH state
-        EmailService.send_payment_confirmation(reservation)
-        if reservation.status in ['confirmed', 'completed']:
-            EmailService.send_reservation_confirmation(reservation)
+        with transaction.atomic():
+            # 1. Create actual Payment record
+            # This ACTION triggers the 'post_save' signal in payments/signals.py
+            # The signal applies the amount to 'amount_paid' and updates 'status' in one UPDATE
+            Payment.objects.create(
+                reservation=reservation,
+                amount=payment_proof.amount,
+                currency='ZAR',
+                status='completed',
+                payment_method='bank_transfer',
+                paid_at=timezone.now(),
+                transaction_reference=f"PROOF-{payment_proof.id}"
+            )
+            
+            # 2. Update Verification Status
+            payment_proof.verification_status = 'approved'
+            payment_proof.save()
+            
+            # 3. Refresh Reservation from DB
+            # We must refresh to get the calculations performed by the Signal
+            reservation.refresh_from_db()
+            
+            # 4. Queue confirmation emails using the FRESH state; inside the transaction the batch
+            #    is only delivered (over one connection) once the approval has committed
+            with EmailService.batch():
+                EmailService.send_payment_confirmation(reservation)
+                if reservation.status in ['confirmed', 'completed']:
+                    EmailService.send_reservation_confirmation(reservation)
         
         return Response({'status': 'approved'})
     
@@ -154,10 +359,121 @@ class PaymentProofViewSet(viewsets.ModelViewSet):
         payment_proof.notes = request.data.get('notes', '')
         payment_proof.save()
         
-        # Revert reservation status to reserved if it was pending
-        reservation = payment_proof.reservation
-        if reservation.status == 'pending':
-            reservation.status = 'reserved'
-            reservation.save()
+        # Revert reservation status to reserved if it was pending (conditional UPDATE, amount_paid untouched)
+        reverted = Reservation.objects.filter(pk=payment_proof.reservation_id, status='pending').update(
+            status='reserved'
+        )
+        if reverted:
+            statuses_changed.send(sender=Reservation, changes=[
+                (payment_proof.reservation.reserved_at, 'pending', 'reserved')
+            ])
+        
+        return Response({'status': 'rejected'})
+    
+    @action(detail=False, methods=['post'], url_path='bulk-approve')
+    def bulk_approve(self, request):
+        """
+        Approve many payment proofs in one transaction (admin only).
+        Body: {"ids": [...]}. Returns one result per requested id.
+        """
+        if not request.user.is_staff:
+            return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
         
-        return Response({'status': 'rejected'})
\ No newline at end of file
+        ids = self.parse_ids(request)
+        results = {pk: {'id': pk, 'result': 'not_found'} for pk in ids}
+        now = timezone.now()
+        
+        with transaction.atomic():
+            # 1. Lock the proofs so a concurrent review cannot approve them twice
+            proofs = list(PaymentProof.objects.select_for_update().filter(pk__in=ids).order_by('pk'))
+            pending = []
+            for proof in proofs:
+                if proof.verification_status == 'pending':
+                    pending.append(proof)
+                else:
+                    results[proof.pk] = {'id': proof.pk, 'result': f'already_{proof.verification_status}'}
+            
+            # 2. One INSERT for every payment; bulk_create skips post_save, so the
+            #    ledger and the rollups are brought up to date explicitly below
+            payments = Payment.objects.bulk_create([
+                Payment(
+                    reservation_id=proof.reservation_id,
+                    amount=proof.amount,
+                    currency='ZAR',
+                    status='completed',
+                    payment_method='bank_transfer',
+                    paid_at=now,
+                    transaction_reference=f"PROOF-{proof.id}"
+                )
+                for proof in pending
+            ])
+            
+            # 3. One UPDATE for the proofs, two for every affected reservation balance
+            PaymentProof.objects.filter(pk__in=[proof.pk for proof in pending]).update(verification_status='approved')
+            reservation_ids = {proof.reservation_id for proof in pending}
+            ledger.recalculate_balances(reservation_ids)
+            payments_created.send(sender=Payment, payments=payments)
+            
+            # 4. One set of emails per reservation, using the recalculated state, delivered over
+            #    one connection after the transaction commits
+            with EmailService.batch():
+                for reservation in Reservation.objects.filter(pk__in=reservation_ids).select_related('ticket_type__event'):
+                    EmailService.send_payment_confirmation(reservation)
+                    if reservation.status in ['confirmed', 'completed']:
+                        EmailService.send_reservation_confirmation(reservation)
+        
+        for proof, payment in zip(pending, payments):
+            results[proof.pk] = {'id': proof.pk, 'result': 'approved', 'payment': payment.pk}
+        
+        return Response({'results': [results[pk] for pk in ids]})
+    
+    @action(detail=False, methods=['post'], url_path='bulk-reject')
+    def bulk_reject(self, request):
+        """
+        Reject many payment proofs in one transaction (admin only).
+        Body: {"ids": [...], "notes": "..."}. Returns one result per requested id.
+        """
+        if not request.user.is_staff:
+            return Response({'error': 'Permission denied'}, status=status.HTTP_403_FORBIDDEN)
+        
+        ids = self.parse_ids(request)
+        results = {pk: {'id': pk, 'result': 'not_found'} for pk in ids}
+        
+        with transaction.atomic():
+            proofs = list(PaymentProof.objects.select_for_update().filter(pk__in=ids).order_by('pk'))
+            pending = []
+            for proof in proofs:
+                if proof.verification_status == 'pending':
+                    pending.append(proof)
+                    results[proof.pk] = {'id': proof.pk, 'result': 'rejected'}
+                else:
+                    results[proof.pk] = {'id': proof.pk, 'result': f'already_{proof.verification_status}'}
+            
+            PaymentProof.objects.filter(pk__in=[proof.pk for proof in pending]).update(
+                verification_status='rejected',
+                notes=request.data.get('notes', '')
+            )
+            
+            # Revert reservation status to reserved if it was pending
+            reverted = dict(Reservation.objects.select_for_update().filter(
+                pk__in={proof.reservation_id for proof in pending}, status='pending'
+            ).values_list('pk', 'reserved_at'))
+            Reservation.objects.filter(pk__in=reverted).update(status='reserved')
+        
+        if reverted:
+            statuses_changed.send(sender=Reservation, changes=[
+                (reserved_at, 'pending', 'reserved') for reserved_at in reverted.values()
+            ])
+        return Response({'results': [results[pk] for pk in ids]})
+    
+    @staticmethod
+    def parse_ids(request):
+        ids = request.data.get('ids')
+        if not isinstance(ids, list) or not ids:
+            raise serializers.ValidationError({'ids': 'Expected a non-empty list of payment proof ids.'})
+        if len(ids) > MAX_BULK_REVIEW:
+            raise serializers.ValidationError({'ids': f'At most {MAX_BULK_REVIEW} proofs per request.'})
+        try:
+            return list(dict.fromkeys(int(pk) for pk in ids))
+        except (TypeError, ValueError):
+            raise serializers.ValidationError({'ids': 'Every id must be an integer.'})
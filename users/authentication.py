@@ -0,0 +1,67 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+# Columns kept in the cache; the password hash, feed secret and the rest stay in the database
+CACHED_FIELDS = ('id', 'email', 'full_name', 'role', 'is_active', 'is_staff', 'is_superuser', 'is_verified')
+
+
+def user_cache_key(user_id):
+    return f'users:auth-fields:{user_id}'
+
+
+def is_shared_cache():
+    # A per-process cache only hears about saves handled by its own worker, so a
+    # deactivated user would stay signed in on every other worker until the timeout
+    return not settings.CACHES['default']['BACKEND'].endswith('LocMemCache')
+
+
+def forget_user(user_id):
+    """Drop the cached copy so the next request reads the user from the database."""
+    cache.delete(user_cache_key(user_id))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that keeps the user's CACHED_FIELDS, plus a stamp of the
+    password hash for revoked-token checks, in the cache for
+    AUTH_USER_CACHE_TIMEOUT seconds, so authenticated requests skip the users
+    table. A hit becomes a User with every other column deferred: it can be
+    assigned to foreign keys, reading a deferred column loads it, and save()
+    writes only what was loaded or set. users.signals drops the entry whenever
+    the user is saved or deleted and on logout; the timeout bounds anything those
+    miss. Without a shared cache (REDIS_URL) every request reads the user as
+    JWTAuthentication does.
+    """
+
+    def get_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if user_id is None or not is_shared_cache():
+            return super().get_user(validated_token)
+
+        key = user_cache_key(user_id)
+        entry = cache.get(key)
+        if entry is None:
+            # Not found / inactive / revoked users raise here and are never cached
+            user = super().get_user(validated_token)
+            cache.set(key, {
+                'fields': {name: getattr(user, name) for name in CACHED_FIELDS},
+                'password_stamp': get_md5_hash_password(user.password),
+            }, settings.AUTH_USER_CACHE_TIMEOUT)
+            return user
+
+        fields = entry['fields']
+        if not fields['is_active']:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        if api_settings.CHECK_REVOKE_TOKEN and (
+            validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != entry['password_stamp']
+        ):
+            raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+
+        # from_db takes the loaded values in the model's column order
+        names = [field.attname for field in self.user_model._meta.concrete_fields if field.attname in fields]
+        return self.user_model.from_db(self.user_model.objects.db, names, [fields[name] for name in names])
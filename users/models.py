@@ -1,6 +1,12 @@
 from django.contrib.auth.models import AbstractUser, BaseUserManager # Import BaseUserManager
+import secrets
+
 from django.db import models
 
+def new_calendar_feed_secret():
+    return secrets.token_urlsafe(24)
+
+
 # --- New Custom Manager ---
 class CustomUserManager(BaseUserManager):
 
@@ -46,6 +52,8 @@ class User(AbstractUser):
     phone_number = models.CharField(max_length=20, null=True, blank=True)
     role = models.CharField(max_length=20, choices=ROLE_CHOICES, default='attendee')
     is_verified = models.BooleanField(default=False)
+    # Part of every calendar feed token; replacing it revokes the feed URLs handed out so far
+    calendar_feed_secret = models.CharField(max_length=64, default=new_calendar_feed_secret, editable=False)
     
     # Do not set username = None. It's needed for AbstractUser's internal logic.
     
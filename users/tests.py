@@ -1,3 +1,77 @@
-from django.test import TestCase
+import tempfile
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from reservations.models import Reservation
+from reservations.tests import make_event
+from .authentication import user_cache_key
+from .models import User
+
+SHARED_CACHE = {'default': {
+    'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': tempfile.mkdtemp(),
+}}
+
+
+class CachedJWTAuthenticationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='guest@example.com', password='pw12345678', full_name='Guest')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+
+    def get(self):
+        return self.client.get('/api/reservations/payment-proofs/')
+
+    def test_local_memory_cache_reads_the_user_every_time(self):
+        self.assertEqual(self.get().status_code, 200)
+        # Changed behind the signals' back, as another worker's save looks from here
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertEqual(self.get().status_code, 401)
+
+    @override_settings(CACHES=SHARED_CACHE)
+    def test_shared_cache_serves_the_user(self):
+        self.assertEqual(self.get().status_code, 200)
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertEqual(self.get().status_code, 200)
+
+        # Saves go through users.signals, which drop the cached copy on every worker
+        self.user.refresh_from_db()
+        self.user.save()
+        self.assertEqual(self.get().status_code, 401)
+        cache.clear()
+
+    @override_settings(CACHES=SHARED_CACHE)
+    def test_shared_cache_keeps_no_secrets(self):
+        self.assertEqual(self.get().status_code, 200)
+        entry = cache.get(user_cache_key(self.user.pk))
+        cache.clear()
+
+        self.assertNotIn('password', entry['fields'])
+        self.assertNotIn('calendar_feed_secret', entry['fields'])
+        self.assertNotIn(self.user.password, repr(entry))
+
+    @override_settings(CACHES=SHARED_CACHE)
+    def test_cached_user_can_book_and_save(self):
+        _, _, ticket_type = make_event()
+        self.assertEqual(self.get().status_code, 200)
+
+        # Served from the cache from here on
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.post('/api/reservations/reservations/',
+                                        {'ticket_type': ticket_type.pk, 'quantity': 1})
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertFalse([query for query in captured.captured_queries if User._meta.db_table in query['sql']])
+        reservation = Reservation.objects.get(pk=response.data['id'])
+        self.assertEqual((reservation.user_id, reservation.guest_email), (self.user.pk, 'guest@example.com'))
+
+        secret = self.user.calendar_feed_secret
+        self.assertEqual(self.client.post('/api/reservations/reservations/calendar-feed-url/').status_code, 200)
+        self.user.refresh_from_db()
+        self.assertNotEqual(self.user.calendar_feed_secret, secret)
+        self.assertTrue(self.user.check_password('pw12345678'))
+        self.assertEqual(self.user.full_name, 'Guest')
+        cache.clear()
@@ -1,8 +1,10 @@
 from rest_framework import status, permissions, viewsets
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
+from rest_framework_simplejwt.settings import api_settings
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import login
+from .authentication import forget_user
 from .models import User
 from .serializers import UserRegistrationSerializer, UserSerializer, LoginSerializer
 
@@ -47,6 +49,8 @@ def logout(request):
     try:
         refresh_token = request.data["refresh"]
         token = RefreshToken(refresh_token)
+        # Stop serving the cached user for this account's remaining access tokens
+        forget_user(token[api_settings.USER_ID_CLAIM])
         token.blacklist()
         return Response(status=status.HTTP_205_RESET_CONTENT)
     except Exception as e: